@@ -0,0 +1,538 @@
+"""
+Generate medias with faces at known places, and measure how faces are
+detected on them.
+
+Usage:
+    python -m benchmark.corpus generate OUTPUT [--resolutions R [R ...]]
+        [--faces N [N ...]] [--frames N [N ...]] [--animation-resolution R]
+        [--motion {pan,zoom,static}] [--face-scale RATIO] [--seed N]
+    python -m benchmark.corpus evaluate MANIFEST [--detection-width W]
+        [--output FILE]
+
+Faces of the test medias are cropped, then resized, flipped and lightened
+onto canvases, one face per cell of a grid. Stills are written for each
+resolution and face count, and animations of faces moving for each frame
+count. The manifest lists every media with the ground-truth box of each
+face on each frame, as (x, y, width, height), the box the Haar cascade finds
+on the source media scaled to where the face was drawn. Identical frames are
+merged in one by the GIF, longer, such as every frame of a static animation.
+
+`evaluate` detects faces on every media of a manifest and writes a CSV line
+per media, its time and recall, to be plotted against size, faces and frames.
+"""
+
+import argparse
+import csv
+import functools
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy
+from PIL import Image, ImageEnhance, ImageSequence
+
+from benchmark.detection_resolution import iou
+from mustachizer import PATH
+from mustachizer.tools.face_finder import FaceFinder
+from mustachizer.tools.gif_writer import GifWriter
+
+MEDIAS_DIRECTORY = PATH / "assets" / "tests_medias"
+
+# Test medias with a single face, cropped to draw faces
+SOURCE_MEDIAS = ("test1.jpg", "test2.jpg", "test3.jpg")
+
+# Version of the format of the manifest
+FORMAT_VERSION = 1
+
+RESOLUTIONS = {
+    "VGA": (640, 480),
+    "HD": (1280, 720),
+    "FHD": (1920, 1080),
+    "4K": (3840, 2160),
+    "8K": (7680, 4320),
+}
+
+MOTIONS = ("pan", "zoom", "static")
+
+# Duration of a frame of the animations, in milliseconds
+FRAME_DURATION = 40
+
+
+class FaceSource:
+    """
+    A face cropped from a test media, with a margin around its box.
+    """
+
+    # Margin around the face, proportional to its width
+    MARGIN = 1 / 3
+
+    def __init__(self, name: str, image: Image, box: tuple):
+        """
+        Crop the face of an image.
+
+        :param name: Name of the media the face comes from
+        :param image: RGB image of the media
+        :param box: Box of the face on the image, (x, y, width, height)
+        """
+        x, y, width, height = (int(value) for value in box)
+        margin = int(width * self.MARGIN)
+        left, top = max(x - margin, 0), max(y - margin, 0)
+        right = min(x + width + margin, image.width)
+        bottom = min(y + height + margin, image.height)
+        self.name = name
+        self.image = image.crop((left, top, right, bottom))
+        self.box = (x - left, y - top, width, height)
+
+    def render(self, width: float, flip: bool = False, brightness: float = 1.0):
+        """
+        Draw the face `width` pixels wide.
+
+        :param width: Width of the face box once drawn
+        :param flip: Whether the face is mirrored, defaults to False
+        :param brightness: Factor of the brightness of the face, defaults to 1.0
+
+        :return: The image of the face with its margin, and the box of the face
+            on it
+        """
+        scale = width / self.box[2]
+        image = self.image.resize(
+            (
+                max(round(self.image.width * scale), 1),
+                max(round(self.image.height * scale), 1),
+            ),
+            Image.BILINEAR,
+        )
+        x, y, box_width, box_height = (value * scale for value in self.box)
+        if flip:
+            image = image.transpose(Image.FLIP_LEFT_RIGHT)
+            x = image.width - x - box_width
+        if brightness != 1.0:
+            image = ImageEnhance.Brightness(image).enhance(brightness)
+        return image, (x, y, box_width, box_height)
+
+
+@functools.lru_cache(maxsize=None)
+def face_sources() -> tuple:
+    """
+    Faces of the test medias, the biggest one the Haar cascade finds on each.
+    """
+    face_finder = FaceFinder()
+    sources = []
+    for name in SOURCE_MEDIAS:
+        image = Image.open(MEDIAS_DIRECTORY / name).convert("RGB")
+        boxes = face_finder.detect_boxes(face_finder.to_cv2(numpy.array(image)))
+        box = max(boxes, key=lambda box: box[2] * box[3])
+        sources.append(FaceSource(name, image, box))
+    return tuple(sources)
+
+
+def parse_resolution(text: str) -> tuple:
+    """
+    Read a resolution, by name or as WIDTHxHEIGHT.
+    """
+    if text.upper() in RESOLUTIONS:
+        return RESOLUTIONS[text.upper()]
+    try:
+        width, height = (int(value) for value in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"'{text}' is not WIDTHxHEIGHT nor one of {', '.join(RESOLUTIONS)}"
+        ) from None
+    return width, height
+
+
+def grid(size: tuple, count: int) -> list:
+    """
+    Square cells of a grid of `count` cells covering an image, as (x, y, side).
+    """
+    if count == 0:
+        return []
+    width, height = size
+    columns = math.ceil(math.sqrt(count * width / height))
+    rows = math.ceil(count / columns)
+    side = min(width // columns, height // rows)
+    return [
+        (
+            (index % columns) * width // columns + (width // columns - side) // 2,
+            (index // columns) * height // rows + (height // rows - side) // 2,
+            side,
+        )
+        for index in range(count)
+    ]
+
+
+def background(size: tuple) -> Image:
+    """
+    Gradient the faces are drawn on.
+    """
+    width, height = size
+    horizontal = numpy.linspace(40, 200, width, dtype=numpy.uint8)
+    vertical = numpy.linspace(200, 60, height, dtype=numpy.uint8)
+    return Image.fromarray(
+        numpy.dstack(
+            [
+                numpy.tile(horizontal, (height, 1)),
+                numpy.tile(vertical[:, numpy.newaxis], (1, width)),
+                numpy.full((height, width), 128, dtype=numpy.uint8),
+            ]
+        )
+    )
+
+
+class Placement:
+    """
+    How a face is drawn in its cell, and how it moves from frame to frame.
+    """
+
+    def __init__(self, cell: tuple, source: FaceSource, rng: random.Random, scale):
+        """
+        Pick how a face is drawn.
+
+        :param cell: Cell of the face, (x, y, side)
+        :param source: Face drawn
+        :param rng: Source of the random choices
+        :param scale: Width of the face, proportional to the side of the cell
+        """
+        self.cell = cell
+        self.source = source
+        self.width = cell[2] * scale * rng.uniform(0.85, 1.0)
+        self.flip = rng.random() < 0.5
+        self.brightness = rng.uniform(0.8, 1.2)
+        self.velocity = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+        self.phase = rng.uniform(0, 2 * math.pi)
+
+    def at(self, frame: int, motion: str) -> tuple:
+        """
+        Width of the face and offset of its center from the center of its
+        cell, on a frame.
+        """
+        side = self.cell[2]
+        if motion == "zoom":
+            return self.width * (0.85 + 0.15 * math.sin(frame / 5 + self.phase)), 0, 0
+        if motion == "static":
+            return self.width, 0, 0
+
+        # Bouncing from side to side of the cell, a few pixels per frame
+        room = (side - self.width) / 2
+        speed = max(side / 50, 1)
+        offsets = []
+        for velocity in self.velocity:
+            if room <= 0:
+                offsets.append(0)
+                continue
+            position = (frame * velocity * speed) % (4 * room)
+            offsets.append(abs(position - 2 * room) - room)
+        return (self.width, *offsets)
+
+
+def render(size: tuple, placements: list, frame: int = 0, motion: str = "static"):
+    """
+    Draw faces on a canvas.
+
+    :return: The image, and the box of each face, rounded to pixels
+    """
+    image = background(size)
+    boxes = []
+    for placement in placements:
+        width, offset_x, offset_y = placement.at(frame, motion)
+        face, (x, y, box_width, box_height) = placement.source.render(
+            width, placement.flip, placement.brightness
+        )
+        cell_x, cell_y, side = placement.cell
+        center_x = cell_x + side / 2 + offset_x
+        center_y = cell_y + side / 2 + offset_y
+        left = round(center_x - x - box_width / 2)
+        top = round(center_y - y - box_height / 2)
+        image.paste(face, (left, top))
+        boxes.append(
+            [round(left + x), round(top + y), round(box_width), round(box_height)]
+        )
+    return image, boxes
+
+
+def place_faces(
+    size: tuple, count: int, rng: random.Random, scale: float = 0.5
+) -> list:
+    """
+    Pick where and how `count` faces are drawn on a canvas.
+    """
+    sources = face_sources()
+    return [
+        Placement(cell, rng.choice(sources), rng, scale) for cell in grid(size, count)
+    ]
+
+
+def still(size: tuple, count: int, seed: int = 0, scale: float = 0.5) -> tuple:
+    """
+    Draw an image of `count` faces.
+
+    :return: The image and the box of each face
+    """
+    return render(size, place_faces(size, count, random.Random(seed), scale))
+
+
+def animation(
+    size: tuple,
+    count: int,
+    frames: int,
+    motion: str = "pan",
+    seed: int = 0,
+    scale: float = 0.5,
+):
+    """
+    Draw the frames of an animation of `count` faces moving.
+
+    :return: Generator of each frame and the box of each face on it
+    """
+    placements = place_faces(size, count, random.Random(seed), scale)
+    for frame in range(frames):
+        yield render(size, placements, frame, motion)
+
+
+def encode_animation(frames, output) -> list:
+    """
+    Write the frames of an animation as a GIF.
+
+    :param frames: Frames and their boxes, as given by `animation`
+    :param output: Binary stream of the GIF
+
+    :return: The boxes of each frame
+    """
+    boxes = []
+    writer = None
+    for image, frame_boxes in frames:
+        if writer is None:
+            writer = GifWriter(output, image.size, loop=0)
+        writer.write(image, FRAME_DURATION)
+        boxes.append(frame_boxes)
+    writer.close()
+    return boxes
+
+
+def generate(
+    output: Path,
+    resolutions: list,
+    face_counts: list,
+    frame_counts: list,
+    animation_resolution: tuple,
+    motion: str = "pan",
+    scale: float = 0.5,
+    seed: int = 0,
+) -> dict:
+    """
+    Write the medias of a corpus and its manifest.
+
+    :return: The manifest
+    """
+    output = Path(output)
+    (output / "stills").mkdir(parents=True, exist_ok=True)
+    (output / "animations").mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "version": FORMAT_VERSION,
+        "seed": seed,
+        "face_scale": scale,
+        "sources": [
+            {"file": source.name, "box": [int(value) for value in source.box]}
+            for source in face_sources()
+        ],
+        "medias": [],
+    }
+
+    def add(file: str, size: tuple, count: int, boxes: list, motion: str = None):
+        manifest["medias"].append(
+            {
+                "file": file,
+                "width": size[0],
+                "height": size[1],
+                "faces": count,
+                "frames": len(boxes),
+                "motion": motion,
+                "boxes": boxes,
+            }
+        )
+        print(f"{file:<48} {len(boxes):>5} frame(s) {count:>4} face(s)", flush=True)
+
+    for index, size in enumerate(resolutions):
+        for count in face_counts:
+            file = f"stills/{size[0]}x{size[1]}-{count}faces.jpg"
+            image, boxes = still(size, count, seed + index, scale)
+            image.save(output / file, quality=90)
+            add(file, size, count, [boxes])
+
+    size = animation_resolution
+    for count in face_counts:
+        for frames in frame_counts:
+            file = f"animations/{size[0]}x{size[1]}-{count}faces-{frames}frames.gif"
+            with open(output / file, "wb") as gif:
+                boxes = encode_animation(
+                    animation(size, count, frames, motion, seed, scale), gif
+                )
+            add(file, size, count, boxes, motion)
+
+    with open(output / "manifest.json", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    print(f"{len(manifest['medias'])} medias written to '{output}'")
+    return manifest
+
+
+def evaluate(manifest_path: Path, detection_width: int = None, output=None) -> None:
+    """
+    Detect faces on every media of a manifest, writing a CSV line per media.
+
+    :param manifest_path: Path to the manifest
+    :param detection_width: Width medias are downscaled to before detecting
+        faces, defaults to full resolution
+    :param output: Text stream the CSV is written to, defaults to the standard
+        output
+    """
+    manifest_path = Path(manifest_path)
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("version") != FORMAT_VERSION:
+        raise SystemExit(f"'{manifest_path}' is not a manifest of this generator")
+
+    face_finder = FaceFinder(detection_width=detection_width)
+    writer = csv.writer(output or sys.stdout)
+    writer.writerow(
+        [
+            "file",
+            "width",
+            "height",
+            "pixels",
+            "faces",
+            "frames",
+            "decoded_frames",
+            "seconds",
+            "seconds_per_frame",
+            "recall",
+            "false_positives",
+        ]
+    )
+    for media in manifest["medias"]:
+        image = Image.open(manifest_path.parent / media["file"])
+        elapsed, expected, matched, found = 0.0, 0, 0, 0
+        index, decoded = 0, 0
+        for frame in ImageSequence.Iterator(image):
+            # Frames merged by the GIF last as long as all of them
+            truths = media["boxes"][index]
+            index += max(frame.info.get("duration", 0) // FRAME_DURATION, 1)
+            decoded += 1
+
+            pixels = numpy.array(frame.convert("RGB"))
+            start = time.perf_counter()
+            cv2_image, scale = face_finder.downscale(face_finder.to_cv2(pixels))
+            boxes = face_finder.detect_boxes(cv2_image) / scale
+            elapsed += time.perf_counter() - start
+
+            truths = numpy.array(truths, dtype=float)
+            hits = [any(iou(truth, box) > 0.5 for box in boxes) for truth in truths]
+            expected += len(truths)
+            matched += sum(hits)
+            found += len(boxes)
+
+        writer.writerow(
+            [
+                media["file"],
+                media["width"],
+                media["height"],
+                media["width"] * media["height"],
+                media["faces"],
+                media["frames"],
+                decoded,
+                f"{elapsed:.6f}",
+                f"{elapsed / decoded:.6f}",
+                f"{matched / expected:.3f}" if expected else "",
+                found - matched,
+            ]
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate medias with faces at known places"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser(
+        "generate", help="write the medias and their manifest"
+    )
+    generate_parser.add_argument("output", help="directory the corpus is written to")
+    generate_parser.add_argument(
+        "--resolutions",
+        type=parse_resolution,
+        nargs="+",
+        default=[RESOLUTIONS[name] for name in RESOLUTIONS],
+        help="resolutions of the stills, WIDTHxHEIGHT or one of "
+        f"{' '.join(RESOLUTIONS)} (default is every name)",
+    )
+    generate_parser.add_argument(
+        "--faces",
+        type=int,
+        nargs="+",
+        default=[0, 1, 4, 16],
+        help="numbers of faces of the medias (default is 0 1 4 16)",
+    )
+    generate_parser.add_argument(
+        "--frames",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="numbers of frames of the animations (default is 10 100 1000)",
+    )
+    generate_parser.add_argument(
+        "--animation-resolution",
+        type=parse_resolution,
+        default=RESOLUTIONS["VGA"],
+        help="resolution of the animations (default is VGA)",
+    )
+    generate_parser.add_argument(
+        "--motion",
+        choices=MOTIONS,
+        default="pan",
+        help="how faces move on animations (default is pan)",
+    )
+    generate_parser.add_argument(
+        "--face-scale",
+        type=float,
+        default=0.5,
+        help="width of the faces, proportional to their cell (default is 0.5)",
+    )
+    generate_parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the random choices"
+    )
+
+    evaluate_parser = commands.add_parser(
+        "evaluate", help="measure the detection of faces on a corpus"
+    )
+    evaluate_parser.add_argument("manifest", help="manifest of the corpus")
+    evaluate_parser.add_argument(
+        "--detection-width",
+        type=int,
+        default=None,
+        help="width medias are downscaled to before detecting faces "
+        "(default is full resolution)",
+    )
+    evaluate_parser.add_argument(
+        "--output", help="CSV file written (default is the standard output)"
+    )
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate(
+            args.output,
+            args.resolutions,
+            args.faces,
+            args.frames,
+            args.animation_resolution,
+            args.motion,
+            args.face_scale,
+            args.seed,
+        )
+    elif args.output:
+        with open(args.output, "w", newline="") as output:
+            evaluate(args.manifest, args.detection_width, output)
+    else:
+        evaluate(args.manifest, args.detection_width)
@@ -0,0 +1,120 @@
+"""
+Measure how the resolution faces are detected at trades speed for recall.
+
+Usage: python -m benchmark.detection_resolution [--runs N] [--widths W [W ...]]
+
+The recall of a width is the share of the faces found at full resolution that
+are also found at that width. When the landmarks model is available, the time
+to locate the faces in space is measured too.
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy
+from PIL import Image
+
+from mustachizer import PATH
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face_finder import FACE_MARKER_FILEPATH, FaceFinder
+
+MEDIAS_DIRECTORY = PATH / "assets" / "tests_medias"
+
+
+def iou(box: numpy.ndarray, other: numpy.ndarray) -> float:
+    """
+    Compute the intersection over union of two (x, y, width, height) boxes.
+    """
+    left, top = numpy.maximum(box[:2], other[:2])
+    right, bottom = numpy.minimum(box[:2] + box[2:], other[:2] + other[2:])
+    intersection = max(right - left, 0) * max(bottom - top, 0)
+    union = box[2] * box[3] + other[2] * other[3] - intersection
+    return intersection / union
+
+
+def detect(face_finder: FaceFinder, pixels: numpy.ndarray) -> numpy.ndarray:
+    """
+    Detect the faces of an image, boxes given in its coordinates.
+    """
+    cv2_image, scale = face_finder.downscale(face_finder.to_cv2(pixels))
+    return face_finder.detect_boxes(cv2_image) / scale
+
+
+def measure(function, runs: int) -> float:
+    """
+    Run a function several times and return its median wall time, in seconds.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(runs: int, widths: list) -> None:
+    locating = FACE_MARKER_FILEPATH.exists()
+    medias = sorted(MEDIAS_DIRECTORY.iterdir())
+    images = {}
+    for media in medias:
+        # First frame only for gifs
+        images[media.name] = Image.open(media).convert("RGBA")
+
+    references = {
+        name: detect(FaceFinder(), numpy.array(image)) for name, image in images.items()
+    }
+
+    header = f"{'Width':>6} {'Detect':>10} {'Faces':>6} {'Recall':>7}"
+    if locating:
+        header += f" {'Pipeline':>10}"
+    print(header)
+    for width in widths:
+        face_finder = FaceFinder(detection_width=width)
+        detecting, found, matched = 0.0, 0, 0
+        pipeline = 0.0
+        for name, image in images.items():
+            pixels = numpy.array(image)
+            detecting += measure(lambda: detect(face_finder, pixels), runs)
+            boxes = detect(face_finder, pixels)
+            found += len(boxes)
+            matched += sum(
+                any(iou(reference, box) > 0.5 for box in boxes)
+                for reference in references[name]
+            )
+            if locating:
+                camera = Camera(image)
+                pipeline += measure(lambda: face_finder.find_faces(image, camera), runs)
+
+        expected = sum(len(boxes) for boxes in references.values())
+        recall = matched / expected if expected else 1.0
+        line = f"{width or 'full':>6} {detecting * 1000:>7.1f} ms {found:>6} {recall:>7.0%}"
+        if locating:
+            line += f" {pipeline * 1000:>7.1f} ms"
+        print(line)
+
+    if not locating:
+        print(f"Landmarks model not found at '{FACE_MARKER_FILEPATH}', only detection")
+    print(f"Medias: {', '.join(images)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark face detection at several resolutions"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="how many times each media is processed (default is 5)",
+    )
+    parser.add_argument(
+        "--widths",
+        type=int,
+        nargs="+",
+        default=[0, 2048, 1024, 640, 480],
+        help="widths medias are downscaled to, 0 for full resolution "
+        "(default is 0 2048 1024 640 480)",
+    )
+    args = parser.parse_args()
+    main(runs=args.runs, widths=args.widths)
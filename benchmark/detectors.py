@@ -0,0 +1,99 @@
+"""
+Compare the backends detecting faces on the test medias.
+
+Usage: python -m benchmark.detectors [--runs N] [--detectors NAME [NAME ...]]
+                                     [--detection-width WIDTH]
+
+Any face found on "test_no_face.jpg" is counted as a false positive. Backends
+whose model is not downloaded are skipped.
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy
+from PIL import Image
+
+from mustachizer import PATH
+from mustachizer.tools.face_detectors import DETECTORS
+from mustachizer.tools.face_finder import FaceFinder
+
+MEDIAS_DIRECTORY = PATH / "assets" / "tests_medias"
+NO_FACE_MEDIAS = ["test_no_face.jpg"]
+
+
+def measure(face_finder: FaceFinder, pixels: numpy.ndarray, runs: int) -> tuple:
+    """
+    Detect the faces of an image several times.
+
+    :return: The median wall time in seconds and the number of faces found
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        cv2_image, _ = face_finder.downscale(face_finder.to_cv2(pixels))
+        boxes = face_finder.detect_boxes(cv2_image)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(boxes)
+
+
+def main(runs: int, detectors: list, detection_width: int = None) -> None:
+    # First frame only for gifs
+    images = {
+        media.name: numpy.array(Image.open(media).convert("RGBA"))
+        for media in sorted(MEDIAS_DIRECTORY.iterdir())
+    }
+
+    print(f"{'Detector':>8} {'Latency':>10} {'Faces':>6} {'False':>6}  Per media")
+    for name in detectors:
+        face_finder = FaceFinder(detector=name, detection_width=detection_width)
+        try:
+            face_finder.detector.load()
+        except FileNotFoundError as error:
+            print(f"{name:>8} skipped: {error}")
+            continue
+
+        # Warm up, the first inference of a network is slower
+        face_finder.detect_boxes(face_finder.to_cv2(images[NO_FACE_MEDIAS[0]]))
+
+        latency, faces, false_positives = 0.0, 0, 0
+        details = []
+        for media, pixels in images.items():
+            timing, found = measure(face_finder, pixels, runs)
+            latency += timing
+            if media in NO_FACE_MEDIAS:
+                false_positives += found
+            else:
+                faces += found
+            details.append(f"{media}={found}")
+
+        print(
+            f"{name:>8} {latency * 1000:>7.1f} ms {faces:>6} {false_positives:>6}  "
+            f"{' '.join(details)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the face detectors")
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="how many times each media is processed (default is 5)",
+    )
+    parser.add_argument(
+        "--detectors",
+        nargs="+",
+        choices=DETECTORS,
+        default=list(DETECTORS),
+        help="backends compared (default is all of them)",
+    )
+    parser.add_argument(
+        "--detection-width",
+        type=int,
+        default=None,
+        help="width medias are downscaled to (default is full resolution)",
+    )
+    args = parser.parse_args()
+    main(runs=args.runs, detectors=args.detectors, detection_width=args.detection_width)
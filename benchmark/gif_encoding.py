@@ -0,0 +1,120 @@
+"""
+Compare the streaming GIF writer to saving every frame at once with Pillow.
+
+Usage: python -m benchmark.gif_encoding [--frames N] [--width W] [FILES ...]
+
+Each encoding runs in its own process so that its peak memory can be read.
+Without files, a synthetic animation of a ball bouncing over a static
+background is encoded.
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import time
+
+import numpy
+from PIL import Image, ImageDraw, ImageSequence
+
+from mustachizer.tools.gif_writer import GifWriter
+
+
+def synthetic_frames(count: int, width: int):
+    """
+    Generate frames of a ball bouncing over a gradient, with their durations.
+    """
+    height = width * 9 // 16
+    gradient = numpy.linspace(0, 255, width, dtype=numpy.uint8)
+    background = numpy.dstack(
+        [
+            numpy.tile(gradient, (height, 1)),
+            numpy.tile(gradient[::-1], (height, 1)),
+            numpy.full((height, width), 128, dtype=numpy.uint8),
+        ]
+    )
+    radius = height // 10
+    for index in range(count):
+        frame = Image.fromarray(background)
+        x = radius + (index * 7) % (width - 2 * radius)
+        y = radius + abs(
+            (index * 5) % (2 * (height - 2 * radius)) - height + 2 * radius
+        )
+        ImageDraw.Draw(frame).ellipse(
+            (x - radius, y - radius, x + radius, y + radius), fill=(200, 30, 30)
+        )
+        yield frame.convert("RGBA"), 40
+
+
+def file_frames(filepath: str):
+    image = Image.open(filepath)
+    for frame in ImageSequence.Iterator(image):
+        yield frame.convert("RGBA"), frame.info.get("duration", 0)
+
+
+def encode(mode: str, source: tuple) -> tuple:
+    """
+    Encode frames, in a child process.
+
+    :return: Wall time in seconds, size of the GIF and peak memory in MiB
+    """
+    frames = (
+        synthetic_frames(*source[1:]) if source[0] is None else file_frames(source[0])
+    )
+    output = io.BytesIO()
+    start = time.perf_counter()
+    if mode == "pillow":
+        # Former path, every frame kept until Pillow saves them all
+        frames = list(frames)
+        images = [frame for frame, _ in frames]
+        images[0].save(
+            output,
+            format="GIF",
+            save_all=True,
+            append_images=images[1:],
+            duration=[duration for _, duration in frames],
+            loop=0,
+        )
+    else:
+        first, duration = next(frames)
+        with GifWriter(output, first.size, loop=0) as writer:
+            writer.write(first, duration)
+            for frame, duration in frames:
+                writer.write(frame, duration)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, len(output.getvalue()), peak
+
+
+def main(files: list, frames: int, width: int) -> None:
+    sources = [(file,) for file in files] or [(None, frames, width)]
+    context = multiprocessing.get_context("spawn")
+    print(f"{'Source':>24} {'Encoder':>8} {'Time':>10} {'Size':>10} {'Peak':>10}")
+    for source in sources:
+        label = source[0] or f"synthetic {frames}x{width}"
+        for mode in ("pillow", "writer"):
+            with context.Pool(1) as pool:
+                elapsed, size, peak = pool.apply(encode, (mode, source))
+            print(
+                f"{label[-24:]:>24} {mode:>8} {elapsed * 1000:>7.0f} ms "
+                f"{size / 1024:>7.0f} KiB {peak:>6.0f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the GIF encoding")
+    parser.add_argument("files", nargs="*", help="GIFs re-encoded")
+    parser.add_argument(
+        "--frames",
+        type=int,
+        default=200,
+        help="number of frames of the synthetic animation (default is 200)",
+    )
+    parser.add_argument(
+        "--width",
+        type=int,
+        default=1280,
+        help="width of the synthetic animation (default is 1280)",
+    )
+    args = parser.parse_args()
+    main(files=args.files, frames=args.frames, width=args.width)
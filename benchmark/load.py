@@ -0,0 +1,802 @@
+"""
+Load the bots with mentions through local stand-ins of the Twitter and
+Discord APIs, and measure how many they keep up with.
+
+Usage:
+    python -m benchmark.load twitter [--rate PER_MINUTE] [--mentions N]
+        [--medias FILE [FILE ...]] [--replies RATIO] [--stream FILE]
+        [--speed FACTOR] [--latency SECONDS] [--poll-interval SECONDS]
+        [--workers N] [--drain SECONDS] [--output FILE]
+    python -m benchmark.load discord [--rate PER_MINUTE] [--mentions N]
+        [--medias FILE [FILE ...]] [--stream FILE] [--speed FACTOR]
+        [--latency SECONDS] [--workers N] [--drain SECONDS] [--output FILE]
+
+The Twitter bot runs against a fake API served on localhost, with the
+mentions timeline, statuses lookup, media download, simple and chunked media
+upload and status update, each answering after `--latency` seconds. Mentions
+are posted on the timeline at a steady rate, or at the times of a recorded
+stream, and the bot finds them by polling as it does on Twitter. The Discord
+bot is given the messages in its event loop, their attachments downloaded
+from the same local server, and replies through a stand-in channel.
+
+The report gives the throughput, the p50, p95 and p99 latency from a mention
+being posted to its reply, and the depth of the queues sampled along the
+run: mentions posted and not replied to yet, and for the Twitter bot medias
+waiting for each stage. Mentions still not replied to `--drain` seconds
+after the last one was posted are lost.
+
+A stream is a JSON lines file of mentions, such as
+`{"at": 1.5, "medias": ["cat.jpg"], "reply": true}`: seconds since the start,
+paths of the medias relative to the file, and whether the mention is a reply
+to the tweet holding the medias rather than that tweet.
+"""
+
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import itertools
+import json
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import urlopen
+
+from requests.adapters import HTTPAdapter
+from tweepy import API, OAuthHandler
+
+from mustachizer import PATH
+from mustachizer.logging import ConfigureLogger
+from mustachizer.twitter.tweepy_wrapper import TweepyWrapper
+from mustachizer.twitter.twitter_bot import BotTwitter
+
+MEDIAS_DIRECTORY = PATH / "assets" / "tests_medias"
+
+# Medias mentions hold by default
+DEFAULT_MEDIAS = ("test1.jpg", "test2.jpg", "group1.png", "face2.gif")
+
+# The timeline gives the creation of tweets to the second, mentions posted
+# before the bot started would be taken as old ones
+START_DELAY = 1.0
+
+# Id of the bot, and of the tweets of mentions by their number
+BOT_ID = 1
+MENTION_IDS = 1000
+REPLIED_IDS = 500000
+
+TWITTER_DATETIME_FORMAT = "%a %b %d %H:%M:%S +0000 %Y"
+
+VIDEO_SUFFIXES = {".mp4", ".mov", ".webm", ".mkv"}
+
+logger = logging.getLogger("stachlog")
+
+
+class Mention:
+    """
+    A mention posted during a load test.
+    """
+
+    def __init__(self, number: int, at: float, medias: list, reply: bool = False):
+        """
+        Construct the mention.
+
+        :param number: Position of the mention in the stream
+        :param at: Seconds after the start it is posted at
+        :param medias: Paths of its medias
+        :param reply: Whether the mention is a reply to the tweet holding the
+            medias, defaults to False
+        """
+        self.number = number
+        self.at = at
+        self.medias = medias
+        self.reply = reply
+
+
+def synthetic_stream(
+    count: int, rate: float, medias: list, replies: float = 0.0, seed: int = 0
+) -> list:
+    """
+    Mentions posted at a steady rate, each with one of the medias in turn.
+
+    :param count: Number of mentions
+    :param rate: Mentions per minute
+    :param medias: Paths of the medias
+    :param replies: Share of the mentions replying to the tweet holding the
+        media, defaults to 0.0
+    :param seed: Seed of the choice of the replies, defaults to 0
+    """
+    rng = random.Random(seed)
+    cycle = itertools.cycle(medias)
+    return [
+        Mention(number, number * 60 / rate, [next(cycle)], rng.random() < replies)
+        for number in range(count)
+    ]
+
+
+def load_stream(filepath: Path, speed: float = 1.0) -> list:
+    """
+    Read a recorded stream of mentions, `speed` times faster.
+    """
+    mentions = []
+    with open(filepath) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            mentions.append(
+                Mention(
+                    len(mentions),
+                    record["at"] / speed,
+                    [filepath.parent / media for media in record["medias"]],
+                    record.get("reply", False),
+                )
+            )
+    return sorted(mentions, key=lambda mention: mention.at)
+
+
+def twitter_media_type(filepath: Path) -> str:
+    if filepath.suffix.lower() == ".gif":
+        return "animated_gif"
+    if filepath.suffix.lower() in VIDEO_SUFFIXES:
+        return "video"
+    return "photo"
+
+
+class FakeApi:
+    """
+    Local stand-in of the endpoints of the Twitter API the bot calls, and of
+    the servers medias are downloaded from.
+    """
+
+    def __init__(self, mentions: list, latency: float = 0.0):
+        """
+        Construct the API, mentions are posted from `start`.
+
+        :param mentions: Mentions posted, in the order of their time
+        :param latency: Seconds each request takes to be answered, defaults
+            to 0.0
+        """
+        self.mentions = mentions
+        self.latency = latency
+        self.files = sorted({media for mention in mentions for media in mention.medias})
+        self.started = None
+        self.replies = {}
+        self.uploads = 0
+        self.requests = 0
+        self._posting = False
+        self._created = None
+        self._lock = threading.Lock()
+        self._media_ids = itertools.count(1)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _ApiHandler)
+        self._server.daemon_threads = True
+        self._server.api = self
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address
+        return f"{host}:{port}"
+
+    def start(self) -> None:
+        """
+        Start serving and posting the mentions.
+        """
+        self.started = time.perf_counter()
+        self._created = datetime.now(timezone.utc)
+        self._posting = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop_posting(self) -> None:
+        """
+        Show an empty timeline from now on, the bot waiting for mentions.
+        """
+        self._posting = False
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def posted_at(self, mention: Mention) -> float:
+        """
+        Time the mention is posted at, from `time.perf_counter`.
+        """
+        return self.started + mention.at
+
+    def posted(self) -> list:
+        """
+        Mentions posted so far.
+        """
+        if not self._posting:
+            return []
+        elapsed = time.perf_counter() - self.started
+        return [mention for mention in self.mentions if mention.at <= elapsed]
+
+    def media_json(self, mention: Mention) -> list:
+        medias = []
+        for filepath in mention.medias:
+            url = f"http://{self.address}/media/{self.files.index(filepath)}"
+            media = {"type": twitter_media_type(filepath), "media_url_https": url}
+            if media["type"] != "photo":
+                media["video_info"] = {
+                    "variants": [{"content_type": "video/mp4", "url": url}]
+                }
+            medias.append(media)
+        return medias
+
+    def mention_json(self, mention: Mention) -> dict:
+        created_at = self._created + timedelta(seconds=mention.at)
+        tweet = {
+            "id": MENTION_IDS + mention.number,
+            "id_str": str(MENTION_IDS + mention.number),
+            "created_at": created_at.strftime(TWITTER_DATETIME_FORMAT),
+            "text": "@StacheBot",
+            "entities": {},
+            "in_reply_to_status_id_str": None,
+            "in_reply_to_user_id_str": None,
+        }
+        if mention.reply:
+            tweet["in_reply_to_status_id_str"] = str(REPLIED_IDS + mention.number)
+            tweet["in_reply_to_user_id_str"] = str(BOT_ID + 1)
+        else:
+            medias = self.media_json(mention)
+            tweet["entities"] = {"media": medias}
+            tweet["extended_entities"] = {"media": medias}
+        return tweet
+
+    def replied_json(self, mention: Mention) -> dict:
+        medias = self.media_json(mention)
+        return {
+            "id": REPLIED_IDS + mention.number,
+            "id_str": str(REPLIED_IDS + mention.number),
+            "text": "",
+            "entities": {"media": medias},
+            "extended_entities": {"media": medias},
+        }
+
+    def upload(self, fields: dict) -> dict:
+        """
+        Answer an upload, simple or chunked.
+        """
+        command = fields.get("command", "")
+        if command == "APPEND":
+            return None
+        if command == "FINALIZE":
+            media_id = int(fields["media_id"])
+        else:
+            media_id = next(self._media_ids)
+        if command != "INIT":
+            with self._lock:
+                self.uploads += 1
+        return {"media_id": media_id, "media_id_string": str(media_id)}
+
+    def reply(self, status_id: str, media_ids: str) -> dict:
+        """
+        Record the reply to a mention.
+        """
+        number = int(status_id) - MENTION_IDS
+        medias = len(media_ids.split(",")) if media_ids else 0
+        with self._lock:
+            self.replies.setdefault(number, (time.perf_counter(), medias))
+        return {"id": 0, "id_str": "0", "text": ""}
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        api = self.server.api
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path.startswith("/media/"):
+            filepath = api.files[int(url.path.rsplit("/", 1)[1])]
+            self._answer(filepath.read_bytes(), "application/octet-stream")
+        elif url.path == "/1.1/account/verify_credentials.json":
+            self._answer_json(
+                {
+                    "id": BOT_ID,
+                    "id_str": str(BOT_ID),
+                    "name": "StacheBot",
+                    "screen_name": "StacheBot",
+                }
+            )
+        elif url.path == "/1.1/statuses/mentions_timeline.json":
+            # Latest mentions first, as many as asked for
+            posted = api.posted()[::-1][: int(query.get("count", 20))]
+            self._answer_json([api.mention_json(mention) for mention in posted])
+        elif url.path == "/1.1/statuses/lookup.json":
+            numbers = [int(id_) - REPLIED_IDS for id_ in query["id"].split(",")]
+            self._answer_json([api.replied_json(api.mentions[n]) for n in numbers])
+        else:
+            self._answer(b"", status=404)
+
+    def do_POST(self):
+        api = self.server.api
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if url.path == "/1.1/media/upload.json":
+            answer = api.upload(self._fields(body))
+            if answer is None:
+                self._answer(b"", status=204)
+            else:
+                self._answer_json(answer)
+        elif url.path == "/1.1/statuses/update.json":
+            self._answer_json(
+                api.reply(query["in_reply_to_status_id"], query.get("media_ids", ""))
+            )
+        else:
+            self._answer(b"", status=404)
+
+    def _fields(self, body: bytes) -> dict:
+        """
+        Text fields of a form, url-encoded or multipart.
+        """
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename() is None:
+                fields[name] = part.get_payload(decode=True).decode()
+        return fields
+
+    def _answer_json(self, payload) -> None:
+        self._answer(json.dumps(payload).encode(), "application/json")
+
+    def _answer(self, body: bytes, content_type: str = None, status: int = 200):
+        api = self.server.api
+        with api._lock:
+            api.requests += 1
+        time.sleep(api.latency)
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _PlainHTTPAdapter(HTTPAdapter):
+    """
+    Sends the requests of tweepy, always over https, in plain http.
+    """
+
+    def send(self, request, **kwargs):
+        request.url = "http" + request.url[len("https") :]
+        return super().send(request, **kwargs)
+
+
+class LocalTweepyWrapper(TweepyWrapper):
+    """
+    Tweepy wrapper talking to the fake API, without credentials.
+    """
+
+    def __init__(self, address: str, poll_interval: float = 12):
+        self.address = address
+        super().__init__(poll_interval=poll_interval)
+
+    def load_token(self) -> None:
+        self.token = dict.fromkeys(TweepyWrapper.TOKEN_REQUIREMENT, "load")
+
+    def connect(self) -> None:
+        auth = OAuthHandler(self.token["API_KEY"], self.token["API_SECRET_KEY"])
+        auth.set_access_token(
+            self.token["ACCESS_TOKEN"], self.token["ACCESS_TOKEN_SECRET"]
+        )
+        self.api = API(auth, host=self.address, upload_host=self.address)
+        self.api.session.mount(f"https://{self.address}/", _PlainHTTPAdapter())
+        self.info = self.api.verify_credentials()._json
+
+
+class LoadedBotTwitter(BotTwitter):
+    """
+    Twitter bot whose pipeline of the current mentions can be looked at.
+    """
+
+    pipeline = None
+
+    def create_pipeline(self):
+        self.pipeline = super().create_pipeline()
+        return self.pipeline
+
+
+class Sampler:
+    """
+    Samples the depth of queues at regular intervals, on a thread.
+    """
+
+    def __init__(self, sample, interval: float = 0.1):
+        """
+        Construct the sampler, started by `start`.
+
+        :param sample: Called with nothing, returns the depth of each queue by
+            name
+        :param interval: Seconds between two samples, defaults to 0.1
+        """
+        self.sample = sample
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            self.samples.append(
+                {"time": time.perf_counter() - start, "depths": self.sample()}
+            )
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    if len(values) == 1:
+        cuts = values * 99
+    else:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+        "max": max(values),
+        "mean": statistics.fmean(values),
+    }
+
+
+def report(mentions: list, replies: dict, posted_at, samples: list) -> dict:
+    """
+    Sum up a load test.
+
+    :param mentions: Mentions posted
+    :param replies: Time of the reply and number of medias in it, by number
+        of mention
+    :param posted_at: Called with a mention, returns the time it was posted at
+    :param samples: Depths of the queues along the run
+    """
+    latencies = [
+        replies[mention.number][0] - posted_at(mention)
+        for mention in mentions
+        if mention.number in replies
+    ]
+    duration = 0.0
+    if replies:
+        first = min(posted_at(mention) for mention in mentions)
+        duration = max(replied for replied, _ in replies.values()) - first
+    names = sorted({name for sample in samples for name in sample["depths"]})
+    return {
+        "mentions": len(mentions),
+        "replied": len(replies),
+        "with_medias": sum(1 for _, medias in replies.values() if medias),
+        "lost": len(mentions) - len(replies),
+        "duration": duration,
+        "throughput": len(replies) * 60 / duration if duration else 0.0,
+        "latency": percentiles(latencies),
+        "depths": {
+            name: {
+                "mean": statistics.fmean(
+                    sample["depths"].get(name, 0) for sample in samples
+                ),
+                "max": max(sample["depths"].get(name, 0) for sample in samples),
+            }
+            for name in names
+        },
+        "latencies": latencies,
+        "samples": samples,
+    }
+
+
+def _wait_for_replies(mentions: list, replies: dict, started: float, drain: float):
+    deadline = started + max(mention.at for mention in mentions) + drain
+    while len(replies) < len(mentions) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+
+
+def run_twitter(
+    mentions: list,
+    latency: float = 0.0,
+    poll_interval: float = 12,
+    workers: int = 1,
+    drain: float = 60,
+) -> dict:
+    """
+    Post mentions on the fake Twitter API while the bot replies to them.
+    """
+    api = FakeApi(mentions, latency)
+    bot = LoadedBotTwitter(
+        workers=workers,
+        tweepy_wrapper=LocalTweepyWrapper(api.address, poll_interval),
+    )
+    for mention in mentions:
+        mention.at += START_DELAY
+
+    def sample():
+        depths = {"backlog": len(api.posted()) - len(api.replies)}
+        if bot.pipeline is not None:
+            depths.update(bot.pipeline.depths())
+        return depths
+
+    sampler = Sampler(sample)
+    api.start()
+    sampler.start()
+    threading.Thread(target=bot.run, daemon=True).start()
+    try:
+        _wait_for_replies(mentions, api.replies, api.started, drain)
+    finally:
+        sampler.stop()
+        api.stop_posting()
+        bot.close()
+    result = report(mentions, dict(api.replies), api.posted_at, sampler.samples)
+    result["requests"] = api.requests
+    result["uploads"] = api.uploads
+    return result
+
+
+class _User:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class _Attachment:
+    """
+    Stand-in of `discord.Attachment`, downloaded from the fake API.
+    """
+
+    def __init__(self, url: str, filepath: Path):
+        self.url = url
+        self.filename = filepath.name
+        suffix = filepath.suffix.lower().lstrip(".")
+        if suffix in {"jpg", "jpeg", "png", "gif"}:
+            self.content_type = f"image/{'jpeg' if suffix == 'jpg' else suffix}"
+        else:
+            self.content_type = f"video/{suffix}"
+
+    async def save(self, buffer) -> int:
+        data = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: urlopen(self.url).read()
+        )
+        buffer.write(data)
+        buffer.seek(0)
+        return len(data)
+
+
+class _Channel:
+    """
+    Stand-in of the channel of a mention, recording the reply to it.
+    """
+
+    def __init__(self, number: int, replies: dict):
+        self.number = number
+        self.replies = replies
+
+    async def send(self, content: str, files: list = None, reference=None):
+        self.replies.setdefault(self.number, (time.perf_counter(), len(files or [])))
+
+
+class _Message:
+    """
+    Stand-in of `discord.Message` mentioning the bot.
+    """
+
+    def __init__(self, number: int, bot_user, attachments: list, channel):
+        self.author = _User(f"user{number}")
+        self.mentions = [bot_user]
+        self.attachments = attachments
+        self.reference = None
+        self.channel = channel
+
+
+async def _deliver(bot, message: _Message) -> None:
+    # Failing events are logged, as discord.py does
+    try:
+        await bot.on_message(message)
+    except Exception as error:
+        logger.exception(f"Message not handled: {error}")
+
+
+def run_discord(
+    mentions: list, latency: float = 0.0, workers: int = 1, drain: float = 60
+) -> dict:
+    """
+    Give the Discord bot the mentions in its event loop while it replies to
+    them.
+    """
+    # Imported here, only needed for this bot
+    from mustachizer.discord.discord_bot import DiscordBot
+
+    class InjectedDiscordBot(DiscordBot):
+        user = _User("StacheBot")
+
+    api = FakeApi(mentions, latency)
+    bot = InjectedDiscordBot(workers=workers, timeout=drain)
+    replies = {}
+    for mention in mentions:
+        mention.at += START_DELAY
+
+    async def inject():
+        api.start()
+        tasks = set()
+        for mention in mentions:
+            await asyncio.sleep(max(api.posted_at(mention) - time.perf_counter(), 0))
+            attachments = [
+                _Attachment(media["media_url_https"], filepath)
+                for media, filepath in zip(api.media_json(mention), mention.medias)
+            ]
+            channel = _Channel(mention.number, replies)
+            message = _Message(mention.number, bot.user, attachments, channel)
+            tasks.add(asyncio.create_task(_deliver(bot, message)))
+        await asyncio.wait(tasks, timeout=drain)
+        await bot.close()
+
+    sampler = Sampler(lambda: {"backlog": len(api.posted()) - len(replies)})
+    sampler.start()
+    try:
+        asyncio.run(inject())
+    finally:
+        sampler.stop()
+        api.close()
+    result = report(mentions, dict(replies), api.posted_at, sampler.samples)
+    result["requests"] = api.requests
+    return result
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    return f"{seconds:.2f} s"
+
+
+def print_report(result: dict) -> None:
+    print(f"Mentions   : {result['mentions']}")
+    print(
+        f"Replied    : {result['replied']} "
+        f"({result['with_medias']} with medias, {result['lost']} lost)"
+    )
+    print(f"Duration   : {result['duration']:.1f} s")
+    print(f"Throughput : {result['throughput']:.1f} mentions per minute")
+    latency = result["latency"]
+    if latency:
+        print(
+            "Latency    : "
+            + ", ".join(
+                f"{name} {_format_seconds(latency[name])}"
+                for name in ["p50", "p95", "p99", "max"]
+            )
+        )
+    for name, depth in result["depths"].items():
+        print(f"Queue      : {name} mean {depth['mean']:.1f}, max {depth['max']}")
+
+
+def main(args: argparse.Namespace) -> int:
+    ConfigureLogger(console_level=args.log_level)
+    if args.stream is not None:
+        mentions = load_stream(Path(args.stream), args.speed)
+    else:
+        medias = [Path(media) for media in args.medias]
+        mentions = synthetic_stream(args.mentions, args.rate, medias, args.replies)
+    if not mentions:
+        print("No mention to post")
+        return 1
+
+    if args.bot == "twitter":
+        result = run_twitter(
+            mentions, args.latency, args.poll_interval, args.workers, args.drain
+        )
+    else:
+        result = run_discord(mentions, args.latency, args.workers, args.drain)
+
+    print_report(result)
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=1)
+        print(f"Results written to '{args.output}'")
+    return 0
+
+
+def _add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=30,
+        help="mentions posted per minute (default is 30)",
+    )
+    parser.add_argument(
+        "--mentions",
+        type=int,
+        default=20,
+        help="number of mentions posted (default is 20)",
+    )
+    parser.add_argument(
+        "--medias",
+        nargs="+",
+        default=[str(MEDIAS_DIRECTORY / name) for name in DEFAULT_MEDIAS],
+        help="medias of the mentions, in turn (default is some test medias)",
+    )
+    parser.add_argument(
+        "--stream",
+        help="JSON lines file of recorded mentions, replayed instead of mentions "
+        "at a steady rate",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="how many times faster the stream is replayed (default is 1)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds each request to the fake API takes (default is 0)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes mustachizing medias (default is 1)",
+    )
+    parser.add_argument(
+        "--drain",
+        type=float,
+        default=60,
+        help="seconds after the last mention before the ones not replied to "
+        "are lost (default is 60)",
+    )
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument(
+        "--log-level",
+        default="WARNING",
+        help="console log level of the bot (default is WARNING)",
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load the bots with mentions through local stand-ins of "
+        "their APIs"
+    )
+    commands = parser.add_subparsers(dest="bot", required=True)
+
+    twitter_parser = commands.add_parser("twitter", help="load the Twitter bot")
+    _add_arguments(twitter_parser)
+    twitter_parser.add_argument(
+        "--replies",
+        type=float,
+        default=0.0,
+        help="share of the mentions replying to the tweet with the medias "
+        "(default is 0)",
+    )
+    twitter_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=12,
+        help="seconds between two looks for new mentions (default is 12)",
+    )
+
+    discord_parser = commands.add_parser("discord", help="load the Discord bot")
+    _add_arguments(discord_parser)
+    discord_parser.set_defaults(replies=0.0)
+
+    sys.exit(main(parser.parse_args()))
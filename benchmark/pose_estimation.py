@@ -0,0 +1,99 @@
+"""
+Compare the batched pose estimation to OpenCV face by face.
+
+Usage: python -m benchmark.pose_estimation [--runs N] [--faces N [N ...]]
+"""
+
+import argparse
+import statistics
+import time
+
+import cv2
+import numpy
+from PIL import Image
+
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face_finder import FaceFinder
+from mustachizer.tools.pose_estimator import estimate_poses, project_points
+
+
+def generate(count: int, camera: Camera) -> numpy.ndarray:
+    """
+    Generate the landmarks of faces seen with a few pixels of noise.
+    """
+    rng = numpy.random.default_rng(0)
+    rotations = numpy.column_stack(
+        [
+            numpy.pi + rng.normal(0, 0.3, count),
+            rng.normal(0, 0.4, count),
+            rng.normal(0, 0.3, count),
+        ]
+    )
+    translations = numpy.column_stack(
+        [
+            rng.uniform(-800, 800, count),
+            rng.uniform(-400, 400, count),
+            rng.uniform(1500, 6000, count),
+        ]
+    )
+    points = project_points(
+        FaceFinder.FACE_3D_POINTS, rotations, translations, camera.matrix
+    )
+    return points + rng.normal(0, 2, points.shape)
+
+
+def measure(function, runs: int) -> float:
+    """
+    Run a function several times and return its median wall time, in seconds.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(runs: int, faces: list) -> None:
+    camera = Camera(Image.new("RGB", (1920, 1080)))
+    print(f"{'Faces':>6} {'OpenCV':>10} {'Batched':>10}")
+    for count in faces:
+        image_points = generate(count, camera)
+        opencv = measure(
+            lambda: [
+                cv2.solvePnP(
+                    FaceFinder.FACE_3D_POINTS,
+                    points,
+                    camera.matrix,
+                    camera.distortion,
+                )
+                for points in image_points
+            ],
+            runs,
+        )
+        batched = measure(
+            lambda: estimate_poses(
+                FaceFinder.FACE_3D_POINTS, image_points, camera, batch_min_size=1
+            ),
+            runs,
+        )
+        print(f"{count:>6} {opencv * 1000:>7.2f} ms {batched * 1000:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pose estimation")
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=20,
+        help="how many times the poses are estimated (default is 20)",
+    )
+    parser.add_argument(
+        "--faces",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16, 64, 256],
+        help="numbers of faces compared (default is 1 4 16 64 256)",
+    )
+    args = parser.parse_args()
+    main(runs=args.runs, faces=args.faces)
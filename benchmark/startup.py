@@ -0,0 +1,67 @@
+"""
+Measure how long the CLI takes to start.
+
+Usage: python -m benchmark.startup [--runs N] [--max SECONDS]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from mustachizer import PATH
+
+COMMAND = [sys.executable, "mustachizer.py", "--list-mustaches", "--no-banner"]
+
+
+def measure(runs: int) -> list:
+    """
+    Run the command several times and return its wall times, in seconds.
+
+    :param runs: how many times the command is run
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            COMMAND,
+            cwd=PATH,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(runs: int, maximum: float = None) -> int:
+    timings = measure(runs)
+    median = statistics.median(timings)
+    print(f"Command : {' '.join(COMMAND[1:])}")
+    print(f"Runs    : {runs}")
+    print(f"Min     : {min(timings) * 1000:.1f} ms")
+    print(f"Median  : {median * 1000:.1f} ms")
+    print(f"Max     : {max(timings) * 1000:.1f} ms")
+
+    if maximum is not None and median > maximum:
+        print(f"Regression: median startup is above {maximum * 1000:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CLI startup time")
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=10,
+        help="how many times the CLI is started (default is 10)",
+    )
+    parser.add_argument(
+        "--max",
+        dest="maximum",
+        type=float,
+        default=None,
+        help="fail if the median startup time is above, in seconds",
+    )
+    args = parser.parse_args()
+    sys.exit(main(runs=args.runs, maximum=args.maximum))
@@ -0,0 +1,514 @@
+"""
+Benchmark each stage of a mustachization and compare runs to a baseline.
+
+Usage:
+    python -m benchmark.suite run [--runs N] [--filter PATTERN] [--output FILE]
+        [--compare BASELINE]
+    python -m benchmark.suite compare BASELINE RESULTS [--threshold RATIO]
+        [--alpha P]
+    python -m benchmark.suite list
+
+Cases run on the medias of `assets/tests_medias` and on synthetic inputs at
+several resolutions, face counts and frame counts, drawn as the synthetic
+corpus of `benchmark.corpus` is. Results are written as JSON with every timing, so
+that a later run can be compared to them: a case regressed when its median
+is slower by more than the threshold and a one-sided Mann-Whitney U test
+finds its timings significantly slower. Cases locating faces need the
+landmarks model and are skipped without it.
+"""
+
+import argparse
+import fnmatch
+import io
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import cv2
+import numpy
+from PIL import Image
+
+from benchmark import corpus
+from benchmark.gif_encoding import synthetic_frames
+from mustachizer import PATH
+from mustachizer.errors import NoFaceFoundError
+from mustachizer.mustache import Mustache
+from mustachizer.mustache_applicator import MustacheApplicator
+from mustachizer.mustache_placer import MustachePlacer
+from mustachizer.mustache_type import MustacheType
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face import FaceBatch
+from mustachizer.tools.face_finder import FACE_MARKER_FILEPATH, FaceFinder
+from mustachizer.tools.gif_writer import GifWriter
+
+MEDIAS_DIRECTORY = PATH / "assets" / "tests_medias"
+
+# Version of the format of the results
+FORMAT_VERSION = 1
+
+# Synthetic inputs
+RESOLUTIONS = ((640, 360), (1280, 720), (1920, 1080))
+FACE_COUNTS = (1, 4, 16)
+FRAME_COUNTS = (10, 50)
+
+# Options of the applicator, as the bots run with --track-faces and
+# --detection-width 1024
+APPLICATOR_OPTIONS = {"tracking": True, "detection_width": 1024}
+
+# A timing lasts at least this long, fast functions being looped
+MIN_TIMING = 0.01
+
+
+class Case:
+    """
+    A function benchmarked, with what it runs on.
+    """
+
+    def __init__(self, name: str, prepare, needs_model: bool = False):
+        """
+        Construct the case.
+
+        :param name: Name of the case, its stage then its input
+        :param prepare: Called once before the timings, returns the function
+            timed
+        :param needs_model: Whether the landmarks model is needed, defaults to
+            False
+        """
+        self.name = name
+        self.prepare = prepare
+        self.needs_model = needs_model
+
+
+def synthetic_faces(camera: Camera, boxes: list) -> FaceBatch:
+    """
+    Faces looking at the camera, in the boxes of the faces of a synthetic image.
+    """
+    focal = camera.matrix[0, 0]
+    translations = []
+    for x, y, width, height in boxes:
+        depth = focal * Mustache.FACE_WIDTH / width
+        translations.append(
+            [
+                (x + width / 2 - camera.matrix[0, 2]) * depth / focal,
+                (y + height / 2 - camera.matrix[1, 2]) * depth / focal,
+                depth,
+            ]
+        )
+    rotations = numpy.tile([numpy.pi, 0.2, 0.0], (len(boxes), 1))
+    return FaceBatch(numpy.array(boxes), rotations, numpy.array(translations))
+
+
+def media_cases() -> list:
+    """
+    Cases on the medias of the tests, their first frame for gifs.
+    """
+    cases = []
+    for filepath in sorted(MEDIAS_DIRECTORY.iterdir()):
+
+        def prepare_detect(filepath=filepath):
+            face_finder = FaceFinder(**_finder_options())
+            pixels = numpy.array(Image.open(filepath).convert("RGBA"))
+            return lambda: face_finder.detect_boxes(
+                face_finder.downscale(face_finder.to_cv2(pixels))[0]
+            )
+
+        def prepare_find(filepath=filepath):
+            face_finder = FaceFinder(**_finder_options())
+            face_finder.load_models()
+            image = Image.open(filepath).convert("RGBA")
+            camera = Camera(image)
+            return lambda: face_finder.find_faces(image, camera)
+
+        def prepare_mustachize(filepath=filepath):
+            applicator = MustacheApplicator(**APPLICATOR_OPTIONS)
+            applicator.face_finder.load_models()
+            data = filepath.read_bytes()
+            return lambda: _mustachize(applicator, data)
+
+        cases.append(Case(f"detect/{filepath.name}", prepare_detect))
+        cases.append(Case(f"find_faces/{filepath.name}", prepare_find, True))
+        cases.append(Case(f"mustachize/{filepath.name}", prepare_mustachize, True))
+    return cases
+
+
+def synthetic_cases() -> list:
+    """
+    Cases on synthetic inputs, at several resolutions, face and frame counts.
+    """
+    cases = []
+    for width, height in RESOLUTIONS:
+        for count in FACE_COUNTS:
+            label = f"{width}x{height}-{count}faces"
+
+            def prepare_detect(size=(width, height), count=count):
+                face_finder = FaceFinder(**_finder_options())
+                pixels = numpy.array(corpus.still(size, count)[0])
+                return lambda: face_finder.detect_boxes(
+                    face_finder.downscale(face_finder.to_cv2(pixels))[0]
+                )
+
+            def prepare_find(size=(width, height), count=count):
+                face_finder = FaceFinder(**_finder_options())
+                face_finder.load_models()
+                image = corpus.still(size, count)[0].convert("RGBA")
+                camera = Camera(image)
+                return lambda: face_finder.find_faces(image, camera)
+
+            def prepare_projections(size=(width, height), count=count):
+                face_finder = FaceFinder()
+                face_finder.load_models()
+                image, boxes = corpus.still(size, count)
+                camera = Camera(image)
+                cv2_image = face_finder.to_cv2(numpy.array(image))
+                boxes = numpy.array(boxes)
+                return lambda: face_finder._compute_face_projections(
+                    cv2_image, camera, boxes
+                )
+
+            def prepare_place(size=(width, height), count=count):
+                placer = MustachePlacer()
+                image, boxes = corpus.still(size, count)
+                frame = image.convert("RGBA")
+                camera = Camera(frame)
+                faces = synthetic_faces(camera, boxes)
+                mustaches = [MustacheType.BAMBINO.value] * count
+                return lambda: placer.place_mustaches(
+                    frame.copy(), camera, faces, mustaches
+                )
+
+            cases.append(Case(f"detect/{label}", prepare_detect))
+            cases.append(Case(f"find_faces/{label}", prepare_find, True))
+            cases.append(Case(f"projections/{label}", prepare_projections, True))
+            cases.append(Case(f"place/{label}", prepare_place))
+
+        for frames in FRAME_COUNTS:
+            label = f"{width}x{height}-{frames}frames"
+
+            def prepare_encode(width=width, frames=frames):
+                images = list(synthetic_frames(frames, width))
+                return lambda: _encode(images)
+
+            def prepare_mustachize(size=(width, height), frames=frames):
+                applicator = MustacheApplicator(**APPLICATOR_OPTIONS)
+                applicator.face_finder.load_models()
+                data = _animation(size, frames, 1)
+                return lambda: _mustachize(applicator, data)
+
+            cases.append(Case(f"gif_encode/{label}", prepare_encode))
+            cases.append(Case(f"mustachize/{label}", prepare_mustachize, True))
+    return cases
+
+
+def mustache_cases() -> list:
+    """
+    Cases building each mustache and its sprites.
+    """
+    cases = []
+    for mustache_type in MustacheType:
+        source = mustache_type.value
+
+        def prepare(source=source):
+            arguments = {
+                "name": source.name,
+                "image_path": source._image_path,
+                "proportional_width": source._proportional_width,
+                "anchor": source.anchor,
+                "max_size": source.sizes_list[-1],
+            }
+            return lambda: Mustache(**arguments).sprite
+
+        cases.append(Case(f"mustache/{mustache_type.name}", prepare))
+    return cases
+
+
+def _finder_options() -> dict:
+    return {"detection_width": APPLICATOR_OPTIONS["detection_width"]}
+
+
+def _mustachize(applicator: MustacheApplicator, data: bytes) -> None:
+    # Medias without faces are measured all the same
+    try:
+        applicator.mustachize(io.BytesIO(data), mustache_name="BAMBINO")
+    except NoFaceFoundError:
+        pass
+
+
+def _encode(images: list) -> None:
+    output = io.BytesIO()
+    first, duration = images[0]
+    with GifWriter(output, first.size, loop=0) as writer:
+        for frame, duration in images:
+            writer.write(frame, duration)
+
+
+def _animation(size: tuple, frames: int, count: int) -> bytes:
+    """
+    Encode a synthetic animation of faces moving across their cells.
+    """
+    output = io.BytesIO()
+    corpus.encode_animation(corpus.animation(size, count, frames), output)
+    return output.getvalue()
+
+
+def all_cases() -> list:
+    return mustache_cases() + media_cases() + synthetic_cases()
+
+
+def time_case(function, runs: int) -> tuple:
+    """
+    Time a function, looped enough for each timing to last `MIN_TIMING`.
+
+    :return: The number of loops of a timing and the timings of a loop, in
+        seconds
+    """
+    # Warm up, caches and lazy loads, and count the loops
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    loops = max(1, math.ceil(MIN_TIMING / elapsed)) if elapsed > 0 else 1000
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        timings.append((time.perf_counter() - start) / loops)
+    return loops, timings
+
+
+def environment() -> dict:
+    """
+    What the results depend on besides the code.
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "opencv": cv2.__version__,
+        "numpy": numpy.__version__,
+        "pillow": Image.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+    }
+
+
+def run(runs: int, patterns: list = None) -> dict:
+    """
+    Run the cases whose name matches one of the patterns, every case without.
+
+    :return: The results, as written in JSON
+    """
+    locating = FACE_MARKER_FILEPATH.exists()
+    results = {
+        "version": FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "runs": runs,
+        "cases": {},
+    }
+    skipped = 0
+    for case in all_cases():
+        if patterns and not any(
+            fnmatch.fnmatch(case.name, pattern) for pattern in patterns
+        ):
+            continue
+        if case.needs_model and not locating:
+            skipped += 1
+            continue
+        loops, timings = time_case(case.prepare(), runs)
+        results["cases"][case.name] = {
+            "loops": loops,
+            "timings": timings,
+            "median": statistics.median(timings),
+            "min": min(timings),
+            "stdev": statistics.stdev(timings) if runs > 1 else 0.0,
+        }
+        print(
+            f"{case.name:<44} {_format_duration(statistics.median(timings)):>10}",
+            flush=True,
+        )
+    if skipped:
+        print(
+            f"{skipped} case(s) skipped, landmarks model not found at "
+            f"'{FACE_MARKER_FILEPATH}'"
+        )
+    return results
+
+
+def mann_whitney(sample: list, other: list) -> float:
+    """
+    One-sided Mann-Whitney U test, with the normal approximation corrected for
+    ties.
+
+    :return: The p-value of values of `sample` being greater than values of
+        `other`
+    """
+    values = sorted([(value, 0) for value in sample] + [(value, 1) for value in other])
+    count = len(values)
+    rank_sum, ties, index = 0.0, 0.0, 0
+    while index < count:
+        end = index
+        while end + 1 < count and values[end + 1][0] == values[index][0]:
+            end += 1
+        # Tied values share the mean of their ranks
+        rank = (index + end) / 2 + 1
+        tied = end - index + 1
+        rank_sum += rank * sum(1 for _, group in values[index : end + 1] if group == 0)
+        ties += tied**3 - tied
+        index = end + 1
+
+    size, other_size = len(sample), len(other)
+    u = rank_sum - size * (size + 1) / 2
+    mean = size * other_size / 2
+    variance = size * other_size / 12 * ((count + 1) - ties / (count * (count - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline: dict, results: dict, threshold: float, alpha: float) -> int:
+    """
+    Print how each case changed since the baseline.
+
+    :return: The number of regressions
+    """
+    if baseline["environment"] != results["environment"]:
+        print("Warning: results were not measured in the same environment")
+        for key, value in baseline["environment"].items():
+            if results["environment"].get(key) != value:
+                print(f"  {key}: {value} -> {results['environment'].get(key)}")
+
+    print(
+        f"{'Case':<44} {'Baseline':>10} {'Current':>10} {'Change':>8} "
+        f"{'p-value':>8}  Verdict"
+    )
+    regressions = 0
+    for name, current in results["cases"].items():
+        reference = baseline["cases"].get(name)
+        if reference is None:
+            print(f"{name:<44} {'':>10} {_format_duration(current['median']):>10}  new")
+            continue
+        change = current["median"] / reference["median"] - 1
+        slower = mann_whitney(current["timings"], reference["timings"])
+        faster = mann_whitney(reference["timings"], current["timings"])
+        if change > threshold and slower < alpha:
+            verdict, p_value = "REGRESSION", slower
+            regressions += 1
+        elif change < -threshold and faster < alpha:
+            verdict, p_value = "improvement", faster
+        else:
+            verdict, p_value = "", min(slower, faster)
+        print(
+            f"{name:<44} {_format_duration(reference['median']):>10} "
+            f"{_format_duration(current['median']):>10} {change:>+8.1%} "
+            f"{p_value:>8.3f}  {verdict}"
+        )
+    for name in baseline["cases"]:
+        if name not in results["cases"]:
+            print(f"{name:<44} {'':>10} {'':>10}  not run")
+
+    print(f"{regressions} regression(s), threshold {threshold:.0%}, alpha {alpha}")
+    return regressions
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def load(filepath: Path) -> dict:
+    with open(filepath) as file:
+        results = json.load(file)
+    if results.get("version") != FORMAT_VERSION:
+        raise SystemExit(f"'{filepath}' is not in the format of this suite")
+    return results
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.command == "list":
+        locating = FACE_MARKER_FILEPATH.exists()
+        for case in all_cases():
+            skipped = case.needs_model and not locating
+            print(f"{case.name}{' (needs the landmarks model)' if skipped else ''}")
+        return 0
+
+    if args.command == "compare":
+        regressions = compare(
+            load(args.baseline), load(args.results), args.threshold, args.alpha
+        )
+        return 1 if regressions else 0
+
+    results = run(args.runs, args.filter)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=1)
+    print(f"Results written to '{args.output}'")
+    if args.compare:
+        regressions = compare(load(args.compare), results, args.threshold, args.alpha)
+        return 1 if regressions else 0
+    return 0
+
+
+def _add_comparison_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="relative slowdown of the median below which a case did not regress "
+        "(default is 0.05)",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.01,
+        help="p-value below which a slowdown is significant (default is 0.01)",
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the stages of a mustachization"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the cases and save the results")
+    run_parser.add_argument(
+        "--runs",
+        type=int,
+        default=10,
+        help="how many times each case is timed (default is 10)",
+    )
+    run_parser.add_argument(
+        "--filter",
+        nargs="+",
+        help="glob patterns of the names of the cases run, such as 'detect/*' "
+        "(default is every case)",
+    )
+    run_parser.add_argument(
+        "--output",
+        default="benchmark_results.json",
+        help="JSON file the results are written to "
+        "(default is benchmark_results.json)",
+    )
+    run_parser.add_argument(
+        "--compare", help="baseline the results are compared to once written"
+    )
+    _add_comparison_arguments(run_parser)
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare results to a baseline"
+    )
+    compare_parser.add_argument("baseline", help="JSON file of the baseline")
+    compare_parser.add_argument("results", help="JSON file of the results")
+    _add_comparison_arguments(compare_parser)
+
+    commands.add_parser("list", help="list the cases")
+
+    sys.exit(main(parser.parse_args()))
@@ -1,18 +1,146 @@
+import argparse
+import signal
+
 from mustachizer import PATH
-from mustachizer.discord import DiscordBot
+from mustachizer.discord.discord_bot import DiscordBot
 from mustachizer.logging import ConfigureLogger
+from mustachizer.metrics import create_metrics
+from mustachizer.profiling import create_profiler
+from mustachizer.tools.face_detectors import DETECTORS
 
 # Create logger at the correct level
 ConfigureLogger(log_file="discord_bot", console_level="INFO")
 
 
-def main():
+def main(
+    detector: str = "haar",
+    tracking: bool = False,
+    detection_width: int = None,
+    workers: int = 1,
+    timeout: float = 60,
+    metrics_file: str = None,
+    metrics_port: int = None,
+    profile: str = None,
+    profile_directory: str = "profiles",
+    profile_per_request: bool = False,
+    profile_memory: bool = False,
+    profile_paused: bool = False,
+):
     token = None
     with open(PATH / "mustachizer" / "discord" / ".token") as token_file:
         token = token_file.read()
-    bot = DiscordBot()
-    bot.run(token)
+    metrics = create_metrics(file=metrics_file, port=metrics_port)
+    profiler = create_profiler(
+        mode=profile,
+        directory=profile_directory,
+        per_request=profile_per_request,
+        memory=profile_memory,
+        paused=profile_paused,
+    )
+    if profiler.enabled and hasattr(signal, "SIGUSR1"):
+        profiler.toggle_on_signal(signal.SIGUSR1)
+    bot = DiscordBot(
+        detector=detector,
+        tracking=tracking,
+        detection_width=detection_width,
+        workers=workers,
+        timeout=timeout,
+        metrics=metrics,
+        profiler=profiler,
+    )
+    try:
+        bot.run(token)
+    finally:
+        metrics.close()
+        profiler.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Discord's StachBot")
+    parser.add_argument(
+        "--detector",
+        choices=DETECTORS,
+        default="haar",
+        help='choose the backend finding faces (default is "haar")',
+    )
+    parser.add_argument(
+        "--track-faces",
+        dest="tracking",
+        action="store_true",
+        help="follow faces from frame to frame of gifs instead of detecting "
+        "them on every frame",
+    )
+    parser.add_argument(
+        "--detection-width",
+        metavar="WIDTH",
+        type=int,
+        help="downscale wider medias to find faces faster, mustaches are still "
+        "placed at full resolution (default is full resolution)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes mustachizing medias, 0 for one per CPU "
+        "(default is 1)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="seconds after which a media is given up on (default is 60)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="append the time spent in each stage of every media to this JSON "
+        "lines file",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve histograms of the time spent in each stage for Prometheus "
+        "on this port",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "sampling"],
+        help="profile each media mustachized with cProfile, or sample the stacks "
+        "of the bot for flamegraphs",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help='directory the profiles are written in (default is "profiles/")',
+    )
+    parser.add_argument(
+        "--profile-per-request",
+        action="store_true",
+        help="write a cProfile file per media instead of one per process",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="report the peak memory of each media and where it was allocated, "
+        "with tracemalloc",
+    )
+    parser.add_argument(
+        "--profile-paused",
+        action="store_true",
+        help="wait for SIGUSR1 to start profiling, each SIGUSR1 pausing or "
+        "resuming it",
+    )
+    args = parser.parse_args()
+    main(
+        detector=args.detector,
+        tracking=args.tracking,
+        detection_width=args.detection_width,
+        workers=args.workers,
+        timeout=args.timeout,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port,
+        profile=args.profile,
+        profile_directory=args.profile_dir,
+        profile_per_request=args.profile_per_request,
+        profile_memory=args.profile_memory,
+        profile_paused=args.profile_paused,
+    )
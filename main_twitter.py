@@ -1,6 +1,11 @@
+import argparse
 import logging
+import signal
 
 from mustachizer.logging import ConfigureLogger
+from mustachizer.metrics import create_metrics
+from mustachizer.profiling import create_profiler
+from mustachizer.tools.face_detectors import DETECTORS
 from mustachizer.twitter.twitter_bot import BotTwitter
 
 # Create logger at the correct level
@@ -8,16 +13,154 @@ ConfigureLogger(log_file="twitter_bot", console_level="DEBUG")
 logger = logging.getLogger("stachlog")
 
 
-def main():
-    twitter_bot = BotTwitter()
+def main(
+    detector: str = "haar",
+    tracking: bool = False,
+    detection_width: int = None,
+    workers: int = 1,
+    download_workers: int = 4,
+    upload_workers: int = 2,
+    max_queued: int = 8,
+    metrics_file: str = None,
+    metrics_port: int = None,
+    profile: str = None,
+    profile_directory: str = "profiles",
+    profile_per_request: bool = False,
+    profile_memory: bool = False,
+    profile_paused: bool = False,
+):
+    metrics = create_metrics(file=metrics_file, port=metrics_port)
+    profiler = create_profiler(
+        mode=profile,
+        directory=profile_directory,
+        per_request=profile_per_request,
+        memory=profile_memory,
+        paused=profile_paused,
+    )
+    if profiler.enabled and hasattr(signal, "SIGUSR1"):
+        profiler.toggle_on_signal(signal.SIGUSR1)
+    twitter_bot = BotTwitter(
+        detector=detector,
+        tracking=tracking,
+        detection_width=detection_width,
+        workers=workers,
+        download_workers=download_workers,
+        upload_workers=upload_workers,
+        max_queued=max_queued,
+        metrics=metrics,
+        profiler=profiler,
+    )
     logger.info("StachBot started")
     try:
         twitter_bot.run()
     except (SystemExit, KeyboardInterrupt):
         pass
     finally:
+        twitter_bot.close()
+        metrics.close()
+        profiler.close()
         logger.info("StachBot stopped")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Twitter's StachBot")
+    parser.add_argument(
+        "--detector",
+        choices=DETECTORS,
+        default="haar",
+        help='choose the backend finding faces (default is "haar")',
+    )
+    parser.add_argument(
+        "--track-faces",
+        dest="tracking",
+        action="store_true",
+        help="follow faces from frame to frame of gifs instead of detecting "
+        "them on every frame",
+    )
+    parser.add_argument(
+        "--detection-width",
+        metavar="WIDTH",
+        type=int,
+        help="downscale wider medias to find faces faster, mustaches are still "
+        "placed at full resolution (default is full resolution)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes mustachizing medias, 0 for one per CPU (default is 1)",
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="number of medias downloaded at once (default is 4)",
+    )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=2,
+        help="number of medias uploaded at once (default is 2)",
+    )
+    parser.add_argument(
+        "--max-queued",
+        type=int,
+        default=8,
+        help="number of medias waiting for each step (default is 8)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="append the time spent in each stage of every media to this JSON "
+        "lines file",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve histograms of the time spent in each stage for Prometheus "
+        "on this port",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "sampling"],
+        help="profile each media mustachized with cProfile, or sample the stacks "
+        "of the bot for flamegraphs",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help='directory the profiles are written in (default is "profiles/")',
+    )
+    parser.add_argument(
+        "--profile-per-request",
+        action="store_true",
+        help="write a cProfile file per media instead of one per process",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="report the peak memory of each media and where it was allocated, "
+        "with tracemalloc",
+    )
+    parser.add_argument(
+        "--profile-paused",
+        action="store_true",
+        help="wait for SIGUSR1 to start profiling, each SIGUSR1 pausing or "
+        "resuming it",
+    )
+    args = parser.parse_args()
+    main(
+        detector=args.detector,
+        tracking=args.tracking,
+        detection_width=args.detection_width,
+        workers=args.workers,
+        download_workers=args.download_workers,
+        upload_workers=args.upload_workers,
+        max_queued=args.max_queued,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port,
+        profile=args.profile,
+        profile_directory=args.profile_dir,
+        profile_per_request=args.profile_per_request,
+        profile_memory=args.profile_memory,
+        profile_paused=args.profile_paused,
+    )
@@ -1,15 +1,14 @@
 import argparse
-import io
+import itertools
 import logging
 import os
 import sys
 from pathlib import Path
 
 from mustachizer import PATH
-from mustachizer.errors import ImageIncorrectError, NoFaceFoundError
 from mustachizer.logging import LOGGING_LEVEL_LIST, ConfigureLogger
-from mustachizer.mustache_applicator import MustacheApplicator
 from mustachizer.mustache_type import MustacheType
+from mustachizer.tools.detector_names import DETECTOR_NAMES
 from mustachizer.utilities import FORMATS_SUPPORTED
 
 MUSTACHES_LIST = MustacheType.get_names()
@@ -34,58 +33,95 @@ def main(
     mustache_name: str = "RANDOM",
     mustache_size: str = "realist",
     showing: bool = False,
+    jobs: int = 1,
+    ordered: bool = True,
+    max_pending: int = 0,
+    tracking: bool = False,
+    detection_width: int = None,
+    detector: str = "haar",
+    input_directory: Path = None,
+    recursive: bool = False,
+    patterns: list = None,
+    manifest: Path = None,
+    log_level: str = "",
+    profile: str = None,
+    profile_directory: Path = Path("profiles"),
+    profile_per_request: bool = False,
+    profile_memory: bool = False,
 ):
-    mustachizer = MustacheApplicator(debug=False)
+    # Imported here so that listing options does not pay for loading OpenCV
+    from mustachizer.batch_processor import (
+        BatchProcessor,
+        iter_directory,
+        iter_manifest,
+    )
+    from mustachizer.profiling import create_profiler
+
+    profiler = create_profiler(
+        mode=profile,
+        directory=profile_directory,
+        per_request=profile_per_request,
+        memory=profile_memory,
+    )
+
+    processor = BatchProcessor(
+        jobs=jobs,
+        ordered=ordered,
+        max_pending=max_pending,
+        log_level=log_level,
+        debug=False,
+        tracking=tracking,
+        detection_width=detection_width,
+        detector=detector,
+        profiler=profiler,
+    )
 
     logger.info("Mustachizer start")
 
-    for file in files:
-        file = Path(file).resolve()
-
-        logger.info(f"Processing file {file}")
-
-        if not file.is_file():
-            logger.error("File not found")
-            continue
-
-        if file.suffix.replace(".", "").upper() not in FORMATS_SUPPORTED:
-            logger.error(f"Extension '{file.suffix}' is not supported")
-            continue
-
-        # Load file
-        logger.info("Load media")
-        buffer = None
-        with open(file, "rb") as image_file:
-            buffer = io.BytesIO(image_file.read())
-
-        # Put mustaches on file
-        try:
-            image = mustachizer.mustachize(
-                image_buffer=buffer,
-                mustache_name=mustache_name,
-                mustache_size=mustache_size,
-            )
-        except NoFaceFoundError as error:
-            logger.error(f"{error}")
-            continue
-        except ImageIncorrectError as error:
-            logger.error(f"{error}")
-            continue
-
-        # Create output directory if it doesn't exist yet
-        output_location.mkdir(parents=True, exist_ok=True)
-
-        # Save file
-        filepath = output_location / f"{file.stem}_mustachized{file.suffix}"
-        logger.info(f"New media saved {filepath}")
-        with open(filepath, "wb") as save_file:
-            save_file.write(image.read())
-
-        # Display mustachize file
-        if showing:
-            show_media(filepath=filepath)
-    else:
-        logger.info("Mustachizer stop")
+    # Files are streamed from the sources, never listed all at once
+    sources = [files]
+    if input_directory:
+        sources.append(iter_directory(input_directory, recursive, patterns))
+    if manifest:
+        sources.append(iter_manifest(manifest))
+
+    results = processor.process(
+        files=(Path(file).resolve() for file in itertools.chain(*sources)),
+        mustache_name=mustache_name,
+        mustache_size=mustache_size,
+    )
+    try:
+        for result in results:
+            file = result["file"]
+
+            if result["error"]:
+                logger.error(f"{file.name}: {result['error']}")
+                continue
+
+            # Keep the tree of the input directory
+            output_directory = output_location
+            if input_directory:
+                try:
+                    output_directory /= file.parent.relative_to(input_directory)
+                except ValueError:  # File is not from the input directory
+                    pass
+
+            # Create output directory if it doesn't exist yet
+            output_directory.mkdir(parents=True, exist_ok=True)
+
+            # Save file
+            filepath = output_directory / f"{file.stem}_mustachized{file.suffix}"
+            logger.info(f"New media saved {filepath}")
+            with open(filepath, "wb") as save_file:
+                save_file.write(result["buffer"])
+
+            # Display mustachize file
+            if showing:
+                show_media(filepath=filepath)
+        else:
+            logger.info("Mustachizer stop")
+    finally:
+        profiler.close()
 
 
 if __name__ == "__main__":
@@ -130,6 +166,68 @@ if __name__ == "__main__":
         default="RANDOM",
         help='choose mustache type (default is "RANDOM")',
     )
+    stach.add_argument(
+        "--track-faces",
+        dest="tracking",
+        action="store_true",
+        default=False,
+        help="follow faces from frame to frame of gifs instead of detecting "
+        "them on every frame",
+    )
+    stach.add_argument(
+        "--detection-width",
+        metavar="WIDTH",
+        dest="detection_width",
+        type=int,
+        default=None,
+        help="downscale wider medias to find faces faster, mustaches are still "
+        "placed at full resolution (default is full resolution)",
+    )
+    stach.add_argument(
+        "--detector",
+        dest="detector",
+        choices=DETECTOR_NAMES,
+        default="haar",
+        help="choose the backend finding faces, dnn ones need their model in "
+        '"models/dnn/" (default is "haar")',
+    )
+    # ~~~~~~~~~~~~~~~~~~~ INPUTS SETTINGS ~~~~~~~~~~~~~~~~~~#
+    inputs = parser.add_argument_group(
+        "Inputs parameters",
+        description="",
+    )
+    inputs.add_argument(
+        "--input-dir",
+        dest="input_directory",
+        type=Path,
+        default=None,
+        help="mustachize the medias of a directory",
+    )
+    inputs.add_argument(
+        "--recursive",
+        dest="recursive",
+        action="store_true",
+        default=False,
+        help="mustachize the medias of the sub-directories too",
+    )
+    inputs.add_argument(
+        "--glob",
+        metavar="PATTERN",
+        dest="patterns",
+        type=str,
+        action="append",
+        default=None,
+        help="only mustachize the medias of the directory whose name matches "
+        "(default is every supported format)",
+    )
+    inputs.add_argument(
+        "--manifest",
+        dest="manifest",
+        type=Path,
+        default=None,
+        help='mustachize the medias listed in a file, one per line ("-" for '
+        "standard input)",
+    )
     # ~~~~~~~~~~~~~~~~~ SCRIPT'S SETTINGS ~~~~~~~~~~~~~~~~~#
     settings = parser.add_argument_group(
         "Settings",
@@ -165,6 +263,61 @@ if __name__ == "__main__":
         default=PATH / "output",
         help='choose output location (default is "output/")',
     )
+    settings.add_argument(
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="number of processes mustachizing in parallel, 0 for one per CPU "
+        "(default is 1)",
+    )
+    settings.add_argument(
+        "--order",
+        dest="order",
+        type=str,
+        choices=["input", "completion"],
+        default="input",
+        help="save medias in the order of the input or as soon as they are "
+        'mustachized (default is "input")',
+    )
+    settings.add_argument(
+        "--max-in-flight",
+        dest="max_pending",
+        type=int,
+        default=0,
+        help="number of medias being mustachized or waiting to be saved, 0 for "
+        "twice the number of processes (default is 0)",
+    )
+    settings.add_argument(
+        "--profile",
+        dest="profile",
+        choices=["cprofile", "sampling"],
+        default=None,
+        help="profile each media with cProfile, or sample the stacks of the "
+        "script for flamegraphs",
+    )
+    settings.add_argument(
+        "--profile-dir",
+        dest="profile_directory",
+        type=Path,
+        default=Path("profiles"),
+        help='choose where profiles are written (default is "profiles/")',
+    )
+    settings.add_argument(
+        "--profile-per-request",
+        dest="profile_per_request",
+        action="store_true",
+        default=False,
+        help="write a cProfile file per media instead of one per process",
+    )
+    settings.add_argument(
+        "--profile-memory",
+        dest="profile_memory",
+        action="store_true",
+        default=False,
+        help="report the peak memory of each media and where it was allocated, "
+        "with tracemalloc",
+    )
     settings.add_argument(
         "--log",
         type=str.upper,
@@ -187,9 +340,12 @@ if __name__ == "__main__":
         print("Available mustaches are :", end="\n - ")
         print(*MUSTACHES_LIST, sep="\n - ", end="\n" * 2)
 
-    if not args.paths:
+    if not (args.paths or args.input_directory or args.manifest):
         parser.error("Please indicate at least one media to mustachize.")
 
+    if args.input_directory and not args.input_directory.is_dir():
+        parser.error(f"'{args.input_directory}' is not a directory.")
+
     # Create logger at the correct level
     ConfigureLogger(console_level=args.log)
     logger = logging.getLogger("stachlog")
@@ -220,4 +376,19 @@ if __name__ == "__main__":
         mustache_size=args.size,
         output_location=output_location.resolve(),
         showing=args.showing,
+        jobs=args.jobs,
+        ordered=args.order == "input",
+        max_pending=args.max_pending,
+        tracking=args.tracking,
+        detection_width=args.detection_width,
+        detector=args.detector,
+        input_directory=args.input_directory and args.input_directory.resolve(),
+        recursive=args.recursive,
+        patterns=args.patterns,
+        manifest=args.manifest,
+        log_level=args.log,
+        profile=args.profile,
+        profile_directory=args.profile_directory,
+        profile_per_request=args.profile_per_request,
+        profile_memory=args.profile_memory,
     )
@@ -0,0 +1,156 @@
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from mustachizer.batch_processor import _initialize_worker, _mustachize_data_in_worker
+from mustachizer.cache import ResultCache
+from mustachizer.errors import MustachizeTimeoutError, NoFaceFoundError
+from mustachizer.metrics import Metrics
+from mustachizer.profiling import Profiler
+
+logger = logging.getLogger("stachlog")
+
+
+class AsyncMustacheApplicator:
+    """
+    Place mustaches from asyncio code without blocking the event loop.
+
+    Medias are mustachized on a pool of processes, each with its own
+    applicator. Mustachized medias are cached in the current process.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        max_concurrency: int = 0,
+        timeout: float = None,
+        cache: ResultCache = None,
+        log_level: str = "",
+        metrics: Metrics = None,
+        profiler: Profiler = None,
+        **options,
+    ):
+        """
+        Construct the applicator, processes are started with the first media.
+
+        :param workers: Number of processes, 0 for one per CPU, defaults to 1
+        :param max_concurrency: Number of medias being mustachized at once,
+            others waiting for their turn, 0 for the number of processes,
+            defaults to 0
+        :param timeout: Seconds after which a media is given up on, defaults to
+            waiting as long as needed
+        :param cache: Where mustachized medias are cached, defaults to no cache
+        :param log_level: Console log level of the processes, defaults to the
+            logging configuration they inherit
+        :param metrics: Where the time spent mustachizing medias is measured,
+            measurements being sent back from the processes, defaults to
+            measuring nothing
+        :param profiler: Where each mustachization is profiled, in the
+            processes, defaults to profiling nothing
+        :param options: Keyword arguments of the applicator of each process
+        """
+        self.workers = workers if workers > 0 else os.cpu_count()
+        self.max_concurrency = max_concurrency if max_concurrency > 0 else self.workers
+        self.timeout = timeout
+        self.cache = cache
+        self.video_format = options.get("video_format", "GIF")
+        self.output_options = options
+        self._semaphore = None
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_initialize_worker,
+            initargs=(
+                log_level,
+                {
+                    **options,
+                    "metrics": metrics and metrics.for_workers(),
+                    "profiler": profiler and profiler.for_workers(),
+                },
+            ),
+        )
+
+    async def mustachize_async(
+        self,
+        image_buffer: io.BytesIO,
+        mustache_name: str = "RANDOM",
+        mustache_size: str = "realist",
+        seed: int = None,
+        timeout: float = None,
+    ) -> io.BytesIO:
+        """
+        Place mustaches on an image.
+
+        A media given up on keeps its process busy until it is mustachized,
+        processes can't be interrupted.
+
+        :param image_buffer: The buffer containing the image
+        :param mustache_name: Name of the mustache
+        :param mustache_size: Size of the mustache
+        :param seed: Seed of the random mustaches, defaults to a random one or,
+            when results are cached, to one derived from the image
+        :param timeout: Seconds after which the media is given up on, waiting
+            for its turn included, defaults to the timeout of the applicator
+
+        :raises NoFaceFoundError: No face has been found on the image
+        :raises ImageIncorrectError: The provided image is not in the correct format
+        :raises MustachizeTimeoutError: The image took too long to mustachize
+
+        :return: The modified image
+        """
+        data = image_buffer.read()
+        key = None
+        if self.cache is not None:
+            key, seed = ResultCache.media_key(
+                data,
+                mustache_name,
+                mustache_size,
+                seed,
+                self.video_format,
+                self.output_options,
+            )
+            cached = self.cache.lookup(key)
+            if cached is not None:
+                return io.BytesIO(cached)
+
+        # Created here to belong to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            result = await asyncio.wait_for(
+                self._run(data, mustache_name, mustache_size, seed), timeout
+            )
+        except asyncio.TimeoutError as error:
+            raise MustachizeTimeoutError(
+                f"Media not mustachized after {timeout} second(s)"
+            ) from error
+        except NoFaceFoundError as error:
+            if key is not None:
+                self.cache.store(key, error)
+            raise
+
+        if key is not None:
+            self.cache.store(key, result)
+        return io.BytesIO(result)
+
+    async def _run(
+        self, data: bytes, mustache_name: str, mustache_size: str, seed: int
+    ) -> bytes:
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                _mustachize_data_in_worker,
+                data,
+                mustache_name,
+                mustache_size,
+                seed,
+            )
+
+    def close(self) -> None:
+        """
+        Stop the processes, medias being mustachized are given up on.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,234 @@
+import fnmatch
+import io
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from mustachizer.errors import ImageIncorrectError, NoFaceFoundError
+from mustachizer.logging import ConfigureLogger
+from mustachizer.mustache_applicator import MustacheApplicator
+from mustachizer.utilities import FORMATS_SUPPORTED
+
+logger = logging.getLogger("stachlog")
+
+# Applicator of the current worker process
+_applicator = None
+
+
+def iter_directory(directory: Path, recursive: bool = False, patterns: list = None):
+    """
+    Yield the files of a directory, without listing it all beforehand.
+
+    :param directory: path to the directory
+    :param recursive: whether files of sub-directories are yielded too
+    :param patterns: glob patterns the file names must match one of, defaults
+        to the names with a supported extension
+    """
+    directories = [Path(directory)]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if recursive:
+                        directories.append(Path(entry.path))
+                    continue
+                if patterns:
+                    matching = any(
+                        fnmatch.fnmatch(entry.name, pattern) for pattern in patterns
+                    )
+                else:
+                    extension = os.path.splitext(entry.name)[1]
+                    matching = extension[1:].upper() in FORMATS_SUPPORTED
+                if matching:
+                    yield Path(entry.path)
+
+
+def iter_manifest(manifest: Path):
+    """
+    Yield the files listed in a manifest, one path per line.
+
+    Empty lines and lines starting with '#' are ignored.
+
+    :param manifest: path to the manifest, '-' to read it from standard input
+    """
+    if str(manifest) == "-":
+        lines = sys.stdin
+    else:
+        lines = open(manifest)
+    try:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield Path(line)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def _initialize_worker(log_level: str, options: dict) -> None:
+    """
+    Build the applicator of a worker process, models included.
+    """
+    global _applicator
+    if log_level:
+        ConfigureLogger(console_level=log_level)
+    _applicator = MustacheApplicator(**options)
+    _applicator.face_finder.load_models()
+
+
+def _mustachize_in_worker(file: Path, mustache_name: str, mustache_size: str) -> dict:
+    return mustachize_file(_applicator, file, mustache_name, mustache_size)
+
+
+def _mustachize_data_in_worker(
+    data: bytes, mustache_name: str, mustache_size: str, seed: int
+) -> bytes:
+    image = _applicator.mustachize(
+        io.BytesIO(data),
+        mustache_name=mustache_name,
+        mustache_size=mustache_size,
+        seed=seed,
+    )
+    return image.getvalue()
+
+
+def mustachize_file(
+    applicator: MustacheApplicator,
+    file: Path,
+    mustache_name: str = "RANDOM",
+    mustache_size: str = "realist",
+) -> dict:
+    """
+    Put mustaches on a file.
+
+    :param applicator: applicator placing the mustaches
+    :param file: path to the file
+    :param mustache_name: name of the mustache
+    :param mustache_size: size of the mustache
+
+    :return: dict containing the file, the mustachized media and, if the file
+        could not be mustachized, the error message
+    """
+    result = {"file": file, "buffer": None, "error": None}
+
+    logger.info(f"Processing file {file}")
+
+    if not file.is_file():
+        result["error"] = "File not found"
+        return result
+
+    if file.suffix.replace(".", "").upper() not in FORMATS_SUPPORTED:
+        result["error"] = f"Extension '{file.suffix}' is not supported"
+        return result
+
+    # Put mustaches on file, read as it is decoded
+    logger.info("Load media")
+    with open(file, "rb") as image_file:
+        try:
+            image = applicator.mustachize(
+                image_buffer=image_file,
+                mustache_name=mustache_name,
+                mustache_size=mustache_size,
+            )
+        except (NoFaceFoundError, ImageIncorrectError) as error:
+            result["error"] = f"{error}"
+            return result
+        # A file failing does not stop the others
+        except Exception as error:
+            logger.exception(f"{file} not mustachized: {error}")
+            result["error"] = f"{type(error).__name__}: {error}"
+            return result
+
+    result["buffer"] = image.getvalue()
+    return result
+
+
+class BatchProcessor:
+    """
+    Mustachize many files, on a pool of processes if asked.
+    """
+
+    def __init__(
+        self,
+        jobs: int = 1,
+        ordered: bool = True,
+        max_pending: int = 0,
+        log_level: str = "",
+        **options,
+    ):
+        """
+        Construct the processor.
+
+        :param jobs: Number of processes, 0 for one per CPU, 1 to stay in the
+            current process, defaults to 1
+        :param ordered: Whether results come in the order of the files or as
+            soon as they are ready, defaults to True
+        :param max_pending: Number of files submitted to the processes and not
+            consumed yet, 0 for twice the number of processes, defaults to 0
+        :param log_level: Console log level of the worker processes, defaults
+            to the logging configuration they inherit
+        :param options: Keyword arguments of the applicator of each process
+        """
+        self.jobs = jobs if jobs > 0 else os.cpu_count()
+        self.ordered = ordered
+        self.max_pending = max_pending if max_pending > 0 else 2 * self.jobs
+        self.options = options
+        self.log_level = log_level
+
+    def process(
+        self,
+        files,
+        mustache_name: str = "RANDOM",
+        mustache_size: str = "realist",
+    ):
+        """
+        Put mustaches on files.
+
+        :param files: iterable of paths to the files, consumed as results are
+        :param mustache_name: name of the mustache
+        :param mustache_size: size of the mustache
+
+        :return: generator of the results of `mustachize_file`
+        """
+        if self.jobs == 1:
+            applicator = MustacheApplicator(**self.options)
+            for file in files:
+                yield mustachize_file(applicator, file, mustache_name, mustache_size)
+            return
+
+        # Files are submitted as results are consumed, a few ahead of the workers
+        options = self.options
+        if options.get("profiler") is not None:
+            options = {**options, "profiler": options["profiler"].for_workers()}
+        with ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=_initialize_worker,
+            initargs=(self.log_level, options),
+        ) as executor:
+            pending = deque()
+            for file in files:
+                pending.append(
+                    executor.submit(
+                        _mustachize_in_worker, file, mustache_name, mustache_size
+                    )
+                )
+                if len(pending) >= self.max_pending:
+                    yield from self._collect(pending)
+            while pending:
+                yield from self._collect(pending)
+
+    def _collect(self, pending: deque):
+        """
+        Wait for the next result(s) and remove them from the pending futures.
+        """
+        if self.ordered:
+            yield pending.popleft().result()
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in [future for future in pending if future in done]:
+            pending.remove(future)
+            yield future.result()
@@ -0,0 +1,341 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy
+
+from mustachizer.errors import NoFaceFoundError
+from mustachizer.tools.video_reader import is_video
+
+logger = logging.getLogger("stachlog")
+
+# Bumped when medias are mustachized differently with the same options, so that
+# the entries left on disk are not served anymore
+FORMAT_VERSION = 2
+
+# Options of the applicators changing the medias they mustachize, with their
+# defaults
+OUTPUT_OPTIONS = {
+    "debug": False,
+    "tracking": False,
+    "detection_width": None,
+    "detector": "haar",
+}
+
+
+class LRUCache:
+    """
+    In-memory cache evicting the least recently used entries above a size.
+    """
+
+    def __init__(self, max_size: int, sizeof=len):
+        """
+        Construct the cache.
+
+        :param max_size: Total size of the entries above which they are evicted.
+        :param sizeof: Function giving the size of an entry, defaults to len.
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Get an entry, None if it is not cached.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key: str, value) -> None:
+        """
+        Cache an entry, unless it is bigger than the cache itself.
+        """
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.max_size:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self) -> None:
+        """
+        Evict every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+
+class FaceCache(LRUCache):
+    """
+    In-memory cache of the faces found on frames, addressed by their pixels.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        Construct the cache.
+
+        :param max_entries: Number of frames above which they are evicted,
+            defaults to 4096
+        """
+        super().__init__(max_size=max_entries, sizeof=lambda faces: 1)
+
+    @staticmethod
+    def key(pixels) -> str:
+        """
+        Compute the key of a frame.
+
+        :param pixels: Array of the pixels of the frame.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{pixels.shape}:{pixels.dtype}".encode())
+        digest.update(numpy.ascontiguousarray(pixels).data)
+        return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    On-disk cache of bytes evicting the least recently used files above a size.
+    """
+
+    SUFFIX = ".cache"
+
+    def __init__(self, directory: Path, max_size: int):
+        """
+        Construct the cache, taking over the entries already in the directory.
+
+        :param directory: Where the entries are stored.
+        :param max_size: Total size of the files above which they are evicted.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Least recently used first
+        files = sorted(
+            self.directory.glob(f"*{DiskCache.SUFFIX}"),
+            key=lambda file: file.stat().st_mtime,
+        )
+        self._entries = OrderedDict()
+        for file in files:
+            self._entries[file.stem] = file.stat().st_size
+            self.size += self._entries[file.stem]
+        self._evict()
+
+    def _filepath(self, key: str) -> Path:
+        return self.directory / f"{key}{DiskCache.SUFFIX}"
+
+    def _evict(self) -> None:
+        while self.size > self.max_size:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            self._filepath(key).unlink(missing_ok=True)
+
+    def get(self, key: str):
+        """
+        Get an entry, None if it is not cached.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                data = self._filepath(key).read_bytes()
+            except OSError:  # Removed from the outside
+                self.size -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            os.utime(self._filepath(key))
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Cache an entry, unless it is bigger than the cache itself.
+        """
+        if len(data) > self.max_size:
+            return
+
+        # Written aside then moved, so that a reader never sees half a file
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as file:
+            file.write(data)
+        os.replace(file.name, self._filepath(key))
+
+        with self._lock:
+            self.size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self.size += len(data)
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResultCache:
+    """
+    Cache of mustachized medias, in memory and optionally on disk.
+
+    Medias are addressed by the hash of their content and the parameters of
+    the mustachization. An empty result stands for a media without face.
+    """
+
+    def __init__(
+        self,
+        memory_size: int = 128 * 2**20,
+        directory: Path = None,
+        disk_size: int = 2**30,
+    ):
+        """
+        Construct the cache.
+
+        :param memory_size: Size of the in-memory tier in bytes, defaults to 128 MiB
+        :param directory: Where the on-disk tier is stored, defaults to no disk tier
+        :param disk_size: Size of the on-disk tier in bytes, defaults to 1 GiB
+        """
+        self.memory = LRUCache(max_size=memory_size)
+        self.disk = DiskCache(directory, disk_size) if directory else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def key(digest: str, mustache_name: str, mustache_size: str, seed: int) -> str:
+        """
+        Compute the key of a mustachized media.
+
+        :param digest: Hash of the original media.
+        """
+        parameters = f"{FORMAT_VERSION}:{digest}:{mustache_name}:{mustache_size}:{seed}"
+        return hashlib.sha256(parameters.encode()).hexdigest()
+
+    @classmethod
+    def media_key(
+        cls,
+        data: bytes,
+        mustache_name: str,
+        mustache_size: str,
+        seed: int = None,
+        video_format: str = "GIF",
+        options: dict = None,
+    ) -> tuple:
+        """
+        Compute the key of a media once mustachized.
+
+        :param data: Content of the original media.
+        :param seed: Seed of the random mustaches, defaults to one derived from
+            the media
+        :param video_format: Format videos are written in, defaults to "GIF"
+        :param options: Keyword arguments of the applicator, those in
+            `OUTPUT_OPTIONS` being part of the key, defaults to their defaults
+
+        :return: The key, and the seed
+        """
+        digest = cls.hash(data)
+        if seed is None:
+            seed = int(digest[:16], 16)
+        if video_format != "GIF" and is_video(data[:12]):
+            digest = f"{digest}:{video_format}"
+        options = options or {}
+        for name, default in OUTPUT_OPTIONS.items():
+            digest = f"{digest}:{name}={options.get(name, default)}"
+        return cls.key(digest, mustache_name, mustache_size, seed), seed
+
+    def get(self, key: str):
+        """
+        Get a mustachized media, None if it is not cached.
+        """
+        data = self.memory.get(key)
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self.memory.put(key, data)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Cache a mustachized media.
+        """
+        self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+
+    def lookup(self, key: str):
+        """
+        Get a mustachized media, None if it is not cached, medias without face
+        being cached too.
+
+        :raises NoFaceFoundError: No face was found on the media
+        """
+        data = self.get(key)
+        if data is not None:
+            logger.info("Mustachized media found in cache")
+            if not data:
+                raise NoFaceFoundError("No face found in media.")
+        return data
+
+    def store(self, key: str, result) -> None:
+        """
+        Cache the outcome of a mustachization, for `lookup`.
+
+        :param result: The mustachized media, or the exception raised while
+            mustachizing it, only medias without face being cached then
+        """
+        if isinstance(result, NoFaceFoundError):
+            self.put(key, b"")
+        elif not isinstance(result, Exception):
+            self.put(key, result)
+
+    @property
+    def stats(self) -> dict:
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory.hits,
+            "memory_entries": len(self.memory),
+            "memory_size": self.memory.size,
+        }
+        if self.disk is not None:
+            stats.update(
+                disk_hits=self.disk.hits,
+                disk_entries=len(self.disk),
+                disk_size=self.disk.size,
+            )
+        return stats
@@ -1,10 +1,19 @@
+import asyncio
 import io
 import logging
+from pathlib import Path
 
 import discord
 
-from mustachizer.errors import NoFaceFoundError
-from mustachizer.mustache_applicator import MustacheApplicator
+from mustachizer.async_applicator import AsyncMustacheApplicator
+from mustachizer.cache import ResultCache
+from mustachizer.errors import (
+    ImageIncorrectError,
+    MustachizeTimeoutError,
+    NoFaceFoundError,
+)
+from mustachizer.metrics import Metrics
+from mustachizer.profiling import Profiler
 from mustachizer.utilities.sentence_provider import SentenceProvider
 
 logger = logging.getLogger("stachlog")
@@ -15,14 +24,50 @@ class DiscordBot(discord.Client):
     The Discord Bot.
     """
 
-    def __init__(self, debug: bool = False):
+    def __init__(
+        self,
+        debug: bool = False,
+        cache_directory: Path = None,
+        detector: str = "haar",
+        tracking: bool = False,
+        detection_width: int = None,
+        workers: int = 1,
+        timeout: float = 60,
+        metrics: Metrics = None,
+        profiler: Profiler = None,
+    ):
         """
         Construct discord's StacheBot.
 
         :param debug: Whether it should print stuffs, defaults to False
+        :param cache_directory: Where mustachized medias are cached on disk,
+            defaults to caching them in memory only
+        :param detector: Name of the backend detecting faces, defaults to "haar"
+        :param tracking: Whether faces of animations are followed from frame to
+            frame rather than detected on each of them, defaults to False
+        :param detection_width: Width wider medias are downscaled to before
+            detecting faces, defaults to detecting them at full resolution
+        :param workers: Number of processes mustachizing medias, 0 for one per
+            CPU, defaults to 1
+        :param timeout: Seconds after which a media is given up on, defaults
+            to 60
+        :param metrics: Where the time spent mustachizing medias is measured,
+            defaults to measuring nothing
+        :param profiler: Where each mustachization is profiled, in the processes
+            mustachizing medias, defaults to profiling nothing
         """
-        super().__init__()
-        self.__mustachizer = MustacheApplicator(debug)
+        super().__init__(intents=discord.Intents.default())
+        self.__mustachizer = AsyncMustacheApplicator(
+            workers=workers,
+            timeout=timeout,
+            cache=ResultCache(directory=cache_directory),
+            debug=debug,
+            tracking=tracking,
+            detection_width=detection_width,
+            detector=detector,
+            metrics=metrics,
+            profiler=profiler,
+        )
         self.__sentence_provider = SentenceProvider()
 
     async def on_ready(self):
@@ -34,7 +79,7 @@ class DiscordBot(discord.Client):
 
             # A user tagged the bot
             if self.user in message.mentions:
-                logger.info(message.reference.resolved.embeds[0].url)
+                logger.info(f"Mentioned by {message.author}")
 
                 mustachized_images = []
 
@@ -61,20 +106,33 @@ class DiscordBot(discord.Client):
                 else:
                     await message.channel.send("No image or no face found.")
 
+    async def close(self):
+        await super().close()
+        self.__mustachizer.close()
+
     async def mustachize_attachments(self, message: discord.Message):
-        mustachized_images = []
-        for attachment in message.attachments:
-            if attachment.content_type.startswith("image/"):
-                buffer = io.BytesIO()
-                await attachment.save(buffer)
-                try:
-                    mustachized_image = self.__mustachizer.mustachize(buffer)
-                    mustachized_images.append(
-                        discord.File(
-                            mustachized_image,
-                            filename=attachment.filename,
-                        )
-                    )
-                except NoFaceFoundError:
-                    pass
-        return mustachized_images
+        # Attachments of a message are mustachized at the same time, those
+        # failing left out
+        mustachized_images = await asyncio.gather(
+            *(
+                self.mustachize_attachment(attachment)
+                for attachment in message.attachments
+                if attachment.content_type.startswith("image/")
+            )
+        )
+        return [image for image in mustachized_images if image is not None]
+
+    async def mustachize_attachment(self, attachment: discord.Attachment):
+        buffer = io.BytesIO()
+        await attachment.save(buffer)
+        try:
+            mustachized_image = await self.__mustachizer.mustachize_async(buffer)
+        except NoFaceFoundError:
+            return None
+        except (ImageIncorrectError, MustachizeTimeoutError) as error:
+            logger.warning(f"{attachment.filename}: {error}")
+            return None
+        except Exception as error:
+            logger.exception(f"{attachment.filename} not mustachized: {error}")
+            return None
+        return discord.File(mustachized_image, filename=attachment.filename)
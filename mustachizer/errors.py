@@ -8,3 +8,7 @@ class NoFaceFoundError(MustachizeError):
 
 class ImageIncorrectError(MustachizeError):
     pass
+
+
+class MustachizeTimeoutError(MustachizeError):
+    pass
@@ -0,0 +1,529 @@
+import bisect
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mustachizer.errors import NoFaceFoundError
+
+logger = logging.getLogger("stachlog")
+
+# Stages of the mustachization of a media, in the order they come
+STAGES = (
+    "decode",
+    "convert",
+    "deduplicate",
+    "detect",
+    "fit",
+    "pose",
+    "composite",
+    "encode",
+)
+
+# Buckets of the histograms, by what they count
+SECONDS_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+FRAMES_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+FACES_BUCKETS = (0, 1, 2, 3, 5, 10, 20)
+PIXELS_BUCKETS = (65536, 262144, 1048576, 2097152, 4194304, 8388608, 16777216)
+
+# Measurement of the media being mustachized by each thread, and how many
+# threads are measuring one, for stages to be skipped at once when none is
+_current = threading.local()
+_measuring = 0
+_measuring_lock = threading.Lock()
+
+# Given when nothing is measured, so that stages cost next to nothing
+_NOT_MEASURED = nullcontext()
+
+
+class _StageTimer:
+    """
+    Adds the wall and CPU time spent in a block to a stage of a measurement.
+    """
+
+    __slots__ = ("measurement", "name", "wall", "cpu")
+
+    def __init__(self, measurement, name: str):
+        self.measurement = measurement
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.measurement.add(
+            self.name,
+            time.perf_counter() - self.wall,
+            time.thread_time() - self.cpu,
+        )
+
+
+class Measurement:
+    """
+    Time spent in each stage of the mustachization of a media, and what the
+    media is like.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.format = None
+        self.width = None
+        self.height = None
+        self.frames = None
+        self.faces = None
+        self.outcome = None
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def add(self, name: str, wall: float, cpu: float) -> None:
+        """
+        Add time spent in a stage, stages being entered once per frame or more.
+
+        :param name: Name of the stage, one of `STAGES`
+        :param wall: Seconds spent
+        :param cpu: Seconds of CPU used by the thread
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {"wall": 0.0, "cpu": 0.0, "calls": 0}
+        stage["wall"] += wall
+        stage["cpu"] += cpu
+        stage["calls"] += 1
+
+    def to_dict(self) -> dict:
+        """
+        Measurement as given to the sinks, ready to be written in JSON.
+        """
+        return {
+            "timestamp": time.time(),
+            "outcome": self.outcome,
+            "format": self.format,
+            "width": self.width,
+            "height": self.height,
+            "frames": self.frames,
+            "faces": self.faces,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "stages": self.stages,
+        }
+
+
+def stage(name: str):
+    """
+    Time a stage of the media being mustachized by the current thread.
+
+    :param name: Name of the stage, one of `STAGES`
+
+    :return: Context manager timing the block, doing nothing when the media is
+        not measured
+    """
+    if not _measuring:
+        return _NOT_MEASURED
+    measurement = getattr(_current, "measurement", None)
+    if measurement is None:
+        return _NOT_MEASURED
+    return _StageTimer(measurement, name)
+
+
+def describe(
+    format_: str = None,
+    size: tuple = None,
+    frames: int = None,
+    faces: int = None,
+) -> None:
+    """
+    Tell what the media being mustachized by the current thread is like,
+    nothing is done when it is not measured.
+
+    :param format_: Format of the media
+    :param size: Width and height of the media
+    :param frames: Number of frames of the media
+    :param faces: Most faces found on a single frame
+    """
+    measurement = getattr(_current, "measurement", None)
+    if measurement is None:
+        return
+    if format_ is not None:
+        measurement.format = format_
+    if size is not None:
+        measurement.width, measurement.height = size
+    if frames is not None:
+        measurement.frames = frames
+    if faces is not None:
+        measurement.faces = faces
+
+
+class MetricsSink:
+    """
+    Where measurements of mustachized medias are sent.
+    """
+
+    def record(self, measurement: dict) -> None:
+        """
+        Receive the measurement of a media, as given by `Measurement.to_dict`.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Release what the sink holds, no measurement is received afterwards.
+        """
+
+
+class Histogram:
+    """
+    Counts of observations falling in cumulative buckets, as Prometheus has
+    them.
+    """
+
+    def __init__(self, buckets: tuple):
+        """
+        Construct the histogram.
+
+        :param buckets: Upper bounds of the buckets, in increasing order
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list:
+        """
+        Number of observations up to each bound, the last one for +Inf.
+        """
+        total, counts = 0, []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Keeps histograms of the measurements, in the text format Prometheus
+    scrapes.
+    """
+
+    # Name, help and buckets of each histogram
+    HISTOGRAMS = {
+        "stage_wall_seconds": ("Wall time of a stage for a media", SECONDS_BUCKETS),
+        "stage_cpu_seconds": ("CPU time of a stage for a media", SECONDS_BUCKETS),
+        "media_wall_seconds": ("Wall time to mustachize a media", SECONDS_BUCKETS),
+        "media_cpu_seconds": ("CPU time to mustachize a media", SECONDS_BUCKETS),
+        "media_frames": ("Number of frames of a media", FRAMES_BUCKETS),
+        "media_faces": ("Most faces found on a frame of a media", FACES_BUCKETS),
+        "media_pixels": ("Number of pixels of a frame of a media", PIXELS_BUCKETS),
+    }
+
+    def __init__(self, namespace: str = "mustachizer"):
+        """
+        Construct the sink.
+
+        :param namespace: Prefix of the names of the metrics, defaults to
+            "mustachizer"
+        """
+        self.namespace = namespace
+        self._histograms = {name: {} for name in self.HISTOGRAMS}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _observe(self, name: str, labels: tuple, value) -> None:
+        if value is None:
+            return
+        histograms = self._histograms[name]
+        histogram = histograms.get(labels)
+        if histogram is None:
+            histogram = histograms[labels] = Histogram(self.HISTOGRAMS[name][1])
+        histogram.observe(value)
+
+    def record(self, measurement: dict) -> None:
+        outcome = (("outcome", measurement["outcome"]),)
+        pixels = None
+        if measurement["width"] is not None:
+            pixels = measurement["width"] * measurement["height"]
+        with self._lock:
+            for name, stage in measurement["stages"].items():
+                labels = (("stage", name),)
+                self._observe("stage_wall_seconds", labels, stage["wall"])
+                self._observe("stage_cpu_seconds", labels, stage["cpu"])
+            self._observe("media_wall_seconds", outcome, measurement["wall"])
+            self._observe("media_cpu_seconds", outcome, measurement["cpu"])
+            self._observe("media_frames", (), measurement["frames"])
+            self._observe("media_faces", (), measurement["faces"])
+            self._observe("media_pixels", (), pixels)
+
+    def render(self) -> str:
+        """
+        Histograms in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, histograms in self._histograms.items():
+                metric = f"{self.namespace}_{name}"
+                lines.append(f"# HELP {metric} {self.HISTOGRAMS[name][0]}")
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, histogram in sorted(histograms.items()):
+                    bounds = [f"{bound}" for bound in histogram.buckets] + ["+Inf"]
+                    counts = histogram.cumulative_counts()
+                    for bound, count in zip(bounds, counts):
+                        bucket_labels = _format_labels(labels + (("le", bound),))
+                        lines.append(f"{metric}_bucket{bucket_labels} {count}")
+                    lines.append(
+                        f"{metric}_sum{_format_labels(labels)} {histogram.sum}"
+                    )
+                    lines.append(
+                        f"{metric}_count{_format_labels(labels)} {histogram.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, address: str = "") -> ThreadingHTTPServer:
+        """
+        Serve the histograms over HTTP for Prometheus to scrape, from a thread.
+
+        :param port: Port to listen on, 0 for any free port
+        :param address: Address to listen on, defaults to every interface
+
+        :return: The server, stopped by `close`
+        """
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", f"{len(body)}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((address, port), Handler)
+        threading.Thread(
+            target=self._server.serve_forever, name="metrics", daemon=True
+        ).start()
+        logger.info(f"Metrics served on port {self._server.server_address[1]}")
+        return self._server
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return f"{{{pairs}}}"
+
+
+class JsonLinesSink(MetricsSink):
+    """
+    Writes each measurement on a line of a file, as JSON.
+    """
+
+    def __init__(self, file):
+        """
+        Construct the sink.
+
+        :param file: Path to the file, appended to, or a text stream
+        """
+        self._owned = not hasattr(file, "write")
+        self._file = open(file, "a") if self._owned else file
+        self._lock = threading.Lock()
+
+    def record(self, measurement: dict) -> None:
+        line = json.dumps(measurement, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._owned:
+            self._file.close()
+
+
+class _QueueSink(MetricsSink):
+    """
+    Sends measurements to the process the sink was created in.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def record(self, measurement: dict) -> None:
+        self.queue.put(measurement)
+
+
+class Metrics:
+    """
+    Measures the mustachization of medias and sends the measurements to sinks.
+
+    Without sinks nothing is measured, stages being timed only while a media
+    is measured.
+    """
+
+    def __init__(self, sinks: list = None):
+        """
+        Construct the metrics.
+
+        :param sinks: Where the measurements are sent, defaults to measuring
+            nothing
+        """
+        self.sinks = list(sinks or [])
+        self._queue = None
+        self._forwarder = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def measure(self):
+        """
+        Measure the mustachization of a media by the current thread.
+
+        :return: Context manager giving the measurement, sent to the sinks once
+            the block is left, None when nothing is measured
+        """
+        if not self.sinks:
+            return _NOT_MEASURED
+        return _Measuring(self)
+
+    def record(self, measurement: dict) -> None:
+        """
+        Send a measurement to the sinks, a failing sink is only logged.
+        """
+        for sink in self.sinks:
+            try:
+                sink.record(measurement)
+            except Exception as error:
+                logger.exception(f"Metrics sink failed: {error}")
+
+    def for_workers(self):
+        """
+        Metrics for the applicators of worker processes, their measurements
+        being sent back to the sinks of this process.
+
+        Given to the processes as they are created, as in the arguments of
+        their initializer.
+
+        :return: The metrics, None when nothing is measured
+        """
+        if not self.sinks:
+            return None
+        if self._queue is None:
+            self._queue = multiprocessing.Queue()
+            self._forwarder = threading.Thread(
+                target=self._forward, name="metrics-forwarder", daemon=True
+            )
+            self._forwarder.start()
+        return Metrics([_QueueSink(self._queue)])
+
+    def _forward(self) -> None:
+        while True:
+            measurement = self._queue.get()
+            if measurement is None:
+                return
+            self.record(measurement)
+
+    def close(self) -> None:
+        """
+        Record the measurements sent by workers so far and close the sinks.
+        """
+        if self._forwarder is not None:
+            self._queue.put(None)
+            self._forwarder.join()
+            self._queue.close()
+            self._forwarder = self._queue = None
+        for sink in self.sinks:
+            sink.close()
+
+
+class _Measuring:
+    """
+    Makes a measurement the one of the current thread while a media is
+    mustachized.
+    """
+
+    __slots__ = ("metrics", "measurement", "previous", "wall", "cpu")
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def __enter__(self) -> Measurement:
+        global _measuring
+        with _measuring_lock:
+            _measuring += 1
+        self.measurement = Measurement()
+        self.previous = getattr(_current, "measurement", None)
+        _current.measurement = self.measurement
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self.measurement
+
+    def __exit__(self, exception_type, exception, traceback):
+        global _measuring
+        measurement = self.measurement
+        measurement.wall = time.perf_counter() - self.wall
+        measurement.cpu = time.thread_time() - self.cpu
+        _current.measurement = self.previous
+        with _measuring_lock:
+            _measuring -= 1
+        if exception_type is None:
+            measurement.outcome = "mustachized"
+        elif issubclass(exception_type, NoFaceFoundError):
+            measurement.outcome = "no_face"
+        else:
+            measurement.outcome = "error"
+        self.metrics.record(measurement.to_dict())
+
+
+def create_metrics(file=None, port: int = None) -> Metrics:
+    """
+    Build the metrics of a bot from its command line options.
+
+    :param file: Path to the JSON lines file measurements are appended to,
+        defaults to no file
+    :param port: Port histograms are served on for Prometheus, defaults to not
+        serving them
+
+    :return: The metrics, measuring nothing without file or port
+    """
+    sinks = []
+    if file:
+        sinks.append(JsonLinesSink(file))
+    if port is not None:
+        sink = PrometheusSink()
+        sink.serve(port)
+        sinks.append(sink)
+    return Metrics(sinks)
@@ -10,6 +10,7 @@ class Mustache:
     """
 
     FACE_WIDTH = 500
+    MIN_SPRITE_WIDTH = 16
 
     def __init__(
         self,
@@ -29,11 +30,14 @@ class Mustache:
         :param max_size: By how much one can multiply the initial size to the maximum.
         """
         self.name = name
-        self._image = Image.open(image_path).convert("RGBA")
+
+        # Image and sprites are loaded on first use
+        self._image_path = image_path
+        self._image = None
+        self._sprites = None
+        self._mustache_aspect_ratio = None
 
         # Ratio
-        mustache_width, mustache_height = self.image.size
-        self._mustache_aspect_ratio = mustache_width / mustache_height
         self._proportional_width = proportional_width
 
         # Sizes
@@ -43,12 +47,75 @@ class Mustache:
         # Anchor
         self.anchor = anchor
 
+    def _load(self):
+        """
+        Load the image of the mustache and build its sprites, once.
+        """
+        if self._sprites is not None:
+            return
+        self._image = Image.open(self._image_path).convert("RGBA")
+
+        # Sprites, flipped to match the face space, from biggest to smallest
+        sprite = np.array(self._image.transpose(Image.FLIP_TOP_BOTTOM))
+        sprites = [sprite]
+        while sprite.shape[1] // 2 >= Mustache.MIN_SPRITE_WIDTH:
+            sprite = self._downscale(sprite)
+            sprites.append(sprite)
+        for sprite in sprites:
+            sprite.setflags(write=False)
+
+        mustache_width, mustache_height = self._image.size
+        self._mustache_aspect_ratio = mustache_width / mustache_height
+        self._sprites = sprites
+
+    @staticmethod
+    def _downscale(sprite: np.ndarray) -> np.ndarray:
+        """
+        Halve the size of a RGBA sprite.
+
+        Colors are averaged weighted by their opacity, so that the color of
+        transparent pixels does not bleed on the edges of the mustache.
+        """
+        height, width = sprite.shape[0] // 2 * 2, sprite.shape[1] // 2 * 2
+        pixels = sprite[:height, :width].astype(np.float32)
+        pixels[..., :3] *= pixels[..., 3:]
+        pixels = pixels.reshape(height // 2, 2, width // 2, 2, 4).mean(axis=(1, 3))
+        alpha = pixels[..., 3:]
+        pixels[..., :3] /= np.where(alpha > 0, alpha, 1)
+        return np.rint(pixels).astype(np.uint8)
+
+    def get_sprite(self, width: float, height: float) -> np.ndarray:
+        """
+        Get the smallest sprite at least as big as the size it will be drawn at.
+
+        :param width: Width of the mustache once drawn, in pixels.
+        :param height: Height of the mustache once drawn, in pixels.
+
+        :return: Read-only RGBA array, flipped upside down.
+        """
+        self._load()
+        for sprite in reversed(self._sprites):
+            if sprite.shape[1] >= width and sprite.shape[0] >= height:
+                return sprite
+        return self._sprites[0]
+
+    @property
+    def sprite(self) -> np.ndarray:
+        self._load()
+        return self._sprites[0]
+
+    @property
+    def sprites(self) -> list:
+        self._load()
+        return list(self._sprites)
+
     @property
     def width(self):
         return Mustache.FACE_WIDTH * self._proportional_width * self._size
 
     @property
     def height(self):
+        self._load()
         return self.width / self._mustache_aspect_ratio
 
     @property
@@ -66,4 +133,5 @@ class Mustache:
 
     @property
     def image(self):
+        self._load()
         return self._image.copy()
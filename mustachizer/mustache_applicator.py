@@ -1,131 +1,461 @@
 import io
 import logging
 import random
+from contextlib import closing, nullcontext
 
 from PIL import Image, ImageSequence
 
+from mustachizer import metrics
+from mustachizer.cache import FaceCache, ResultCache
 from mustachizer.errors import ImageIncorrectError, NoFaceFoundError
+from mustachizer.metrics import Metrics
 from mustachizer.mustache_placer import MustachePlacer
 from mustachizer.mustache_type import MustacheType
+from mustachizer.profiling import Profiler
 from mustachizer.tools.camera import Camera
 from mustachizer.tools.debug_drawer import DebugDrawer
 from mustachizer.tools.face_finder import FaceFinder
+from mustachizer.tools.face_tracker import FaceTracker
+from mustachizer.tools.frame_deduplicator import FrameDeduplicator
+from mustachizer.tools.gif_reader import read_frames
+from mustachizer.tools.gif_writer import GifWriter
+from mustachizer.tools.video_reader import VideoReader, is_video
+from mustachizer.tools.video_writer import VideoWriter
 
 logger = logging.getLogger("stachlog")
 
+# Frames per second videos are decoded at, by output format. GIF delays are
+# counted in hundredths of a second
+VIDEO_RATES = {"GIF": 25, "MP4": 30}
+
 
 class MustacheApplicator:
     """
     Apply mustaches on medias.
     """
 
-    def __init__(self, debug: bool = False):
+    def __init__(
+        self,
+        debug: bool = False,
+        cache: ResultCache = None,
+        face_cache: FaceCache = None,
+        tracking: bool = False,
+        detection_width: int = None,
+        detector: str = "haar",
+        deduplication: bool = True,
+        video_format: str = "GIF",
+        metrics: Metrics = None,
+        profiler: Profiler = None,
+    ):
         """
         Construct the applicator.
 
         :param debug: Whether it should draw debug lines, defaults to False
+        :param cache: Where mustachized medias are cached, defaults to no cache
+        :param face_cache: Where faces found on frames are cached, defaults to no
+            cache
+        :param tracking: Whether faces of animations are followed from frame to
+            frame rather than detected on each of them, defaults to False
+        :param detection_width: Width wider medias are downscaled to before
+            detecting faces, defaults to detecting them at full resolution
+        :param detector: Name of the backend detecting faces, defaults to "haar"
+        :param deduplication: Whether frames of animations seen before reuse
+            their faces, and their mustaches when identical, defaults to True
+        :param video_format: Format videos are written in once mustachized,
+            "GIF" or "MP4" with the audio of the video, defaults to "GIF"
+        :param metrics: Where the time spent in each stage of a mustachization
+            is measured, defaults to measuring nothing
+        :param profiler: Where each mustachization is profiled, defaults to
+            profiling nothing
         """
         self._debug = debug
+        # Part of the keys of cached medias
+        self.output_options = {
+            "debug": debug,
+            "tracking": tracking,
+            "detection_width": detection_width,
+            "detector": detector,
+        }
+        self.cache = cache
         self._supported_formats = ["JPEG", "PNG", "GIF"]
         self.mustache_placer = MustachePlacer(debug=debug)
-        self.face_finder = FaceFinder(debug=debug)
+        self.face_finder = FaceFinder(
+            debug=debug,
+            cache=face_cache,
+            detection_width=detection_width,
+            detector=detector,
+        )
+        self.face_tracker = FaceTracker(self.face_finder) if tracking else None
+        self.frame_deduplicator = FrameDeduplicator() if deduplication else None
+        if video_format not in VIDEO_RATES:
+            raise ValueError(f"Unsupported video format '{video_format}'")
+        self.video_format = video_format
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.profiler = profiler if profiler is not None else Profiler()
+
+    def _open(self, image_buffer: io.BytesIO) -> Image:
+        """
+        Open an image.
+
+        :raises ImageIncorrectError: The provided image is not in the correct format
+        """
+        try:
+            return Image.open(image_buffer, formats=self._supported_formats)
+        except Exception as exception:
+            error_message = "An exception occured while loading the provided image"
+            raise ImageIncorrectError(error_message) from exception
+
+    def find_faces(self, image_buffer: io.BytesIO) -> list:
+        """
+        Find the faces on each frame of an image.
+
+        The result can be given back to `mustachize` to skip the detection, for
+        instance to try several mustaches on the same image.
+
+        :param image_buffer: The buffer containing the image
+
+        :raises ImageIncorrectError: The provided image is not in the correct format
+
+        :return: Batch of the faces found, for each frame
+        """
+        image = self._open(image_buffer)
+        frames_faces = []
+        for image_frame in ImageSequence.Iterator(image):
+            image_frame = image_frame.convert("RGBA")
+            DebugDrawer.instance().load(image_frame)
+            camera = Camera(image_frame)
+            frames_faces.append(self.face_finder.find_faces(image_frame, camera))
+        return frames_faces
 
     def mustachize(
         self,
         image_buffer: io.BytesIO,
         mustache_name: str = "RANDOM",
         mustache_size: str = "realist",
+        seed: int = None,
+        faces: list = None,
     ) -> io.BytesIO:
         """Place mustaches on an image.
 
         :param image_buffer: The buffer containing the image
         :param mustache_name: Name of the mustache
         :param mustache_size: Size of the mustache (between 1 and 5)
+        :param seed: Seed of the random mustaches, defaults to a random one or,
+            when results are cached, to one derived from the image
+        :param faces: Faces on each frame as given by `find_faces`, the result
+            being left out of the cache, defaults to finding them
 
         :raises NoFaceFoundError: No face has been found on the image
         :raises ImageIncorrectError: The provided image is not in the correct format
 
         :return: The modified image
         """
-        logger.info("Apply mustache(s)")
+        # Results are cached for the faces found, not for faces given
+        if self.cache is None or faces is not None:
+            return self._mustachize(
+                image_buffer, mustache_name, mustache_size, random.Random(seed), faces
+            )
+
+        data = image_buffer.read()
+        key, seed = ResultCache.media_key(
+            data,
+            mustache_name,
+            mustache_size,
+            seed,
+            self.video_format,
+            self.output_options,
+        )
+
+        cached = self.cache.lookup(key)
+        if cached is not None:
+            return io.BytesIO(cached)
+
         try:
-            image = Image.open(image_buffer, formats=self._supported_formats)
-        except Exception as exception:
-            error_message = "An exception occured while loading the provided image"
-            raise ImageIncorrectError(error_message) from exception
+            output_stream = self._mustachize(
+                io.BytesIO(data),
+                mustache_name,
+                mustache_size,
+                random.Random(seed),
+                faces,
+            )
+        except NoFaceFoundError as error:
+            self.cache.store(key, error)
+            raise
+        self.cache.store(key, output_stream.getvalue())
+        return output_stream
 
-        # File format
-        format_ = image.format
+    def _mustachize(
+        self,
+        image_buffer: io.BytesIO,
+        mustache_name: str,
+        mustache_size: str,
+        rng: random.Random,
+        frames_faces: list = None,
+    ) -> io.BytesIO:
+        """
+        Place mustaches on an image, picking random mustaches with `rng`, and
+        measure and profile it.
+        """
+        with self.profiler.request(), self.metrics.measure():
+            return self._apply_mustaches(
+                image_buffer, mustache_name, mustache_size, rng, frames_faces
+            )
 
-        # Frames contained in media (more than 1 for gif)
-        nb_frames = getattr(image, "n_frames", 1)
+    def _apply_mustaches(
+        self,
+        image_buffer: io.BytesIO,
+        mustache_name: str,
+        mustache_size: str,
+        rng: random.Random,
+        frames_faces: list = None,
+    ) -> io.BytesIO:
+        logger.info("Apply mustache(s)")
+        output_stream = io.BytesIO()
+        format_, nb_frames, frames, writer = self._open_frames(
+            image_buffer, output_stream
+        )
+        animated = writer is not None
 
-        mustachized_frames = []
         recognized_faces = False
         mustache_list = []
         max_faces_found = 0
 
         # Freeze mustache_name if more than one frame
-        if nb_frames > 1 and mustache_name not in MustacheType.get_names():
-            mustache_name = random.choice(MustacheType.get_names())
+        if animated and mustache_name not in MustacheType.get_names():
+            mustache_name = rng.choice(MustacheType.get_names())
 
-        # Iterate media by frame
-        for image_frame in ImageSequence.Iterator(image):
-            image_frame = image_frame.convert("RGBA")
-            DebugDrawer.instance().load(image_frame)
+        if frames_faces is not None and len(frames_faces) != nb_frames:
+            error_message = (
+                f"Faces given for {len(frames_faces)} frame(s), "
+                f"media has {nb_frames or 'an unknown number of'} frame(s)"
+            )
+            frames.close()
+            raise ValueError(error_message)
 
-            camera = Camera(image_frame)
-            faces = self.face_finder.find_faces(image_frame, camera)
-            max_faces_found = max(max_faces_found, len(faces))
-
-            # Faces found in frame
-            if faces:
-                recognized_faces = True
-                # Iterate each face
-                for face in faces:
-                    # Get mustache
-                    mustache_type = getattr(
-                        MustacheType, mustache_name, MustacheType.random()
-                    ).value
-                    mustache_type.size = mustache_size
-                    mustache_list.append(mustache_type.name)
-                    # Place mustache
-                    self.mustache_placer.place_mustache(
-                        face_image=image_frame,
-                        camera=camera,
-                        face=face,
-                        mustache=mustache_type,
+        # Follow faces from frame to frame in animations
+        tracking = self.face_tracker is not None and animated
+        if tracking:
+            self.face_tracker.reset()
+
+        # Reuse the work done on frames seen before. Debug lines are drawn
+        # while searching faces, so they can't be reused
+        deduplicating = (
+            self.frame_deduplicator is not None
+            and animated
+            and frames_faces is None
+            and not self._debug
+        )
+        if deduplicating:
+            self.frame_deduplicator.reset()
+
+        # Iterate media by frame, videos being decoded meanwhile
+        with closing(frames), writer or nullcontext():
+            for index, (image_frame, duration, raw_frame) in enumerate(frames):
+                seen = None
+                if deduplicating:
+                    with metrics.stage("deduplicate"):
+                        seen = self.frame_deduplicator.match(image_frame)
+                    if seen.composited is not None:
+                        faces, image_frame = seen.faces, seen.composited
+                        recognized_faces = recognized_faces or bool(faces)
+                        with metrics.stage("encode"):
+                            writer.write(
+                                image_frame, duration, None if faces else raw_frame
+                            )
+                        continue
+
+                with metrics.stage("convert"):
+                    image_frame = image_frame.convert("RGBA")
+                DebugDrawer.instance().load(image_frame)
+
+                camera = Camera(image_frame)
+                if frames_faces is not None:
+                    faces = frames_faces[index]
+                elif seen is not None and seen.faces is not None:
+                    faces = seen.faces
+                else:
+                    faces = self._find_frame_faces(image_frame, camera, tracking)
+                max_faces_found = max(max_faces_found, len(faces))
+
+                # Faces found in frame
+                if faces:
+                    recognized_faces = True
+                    mustaches = self._pick_mustaches(
+                        len(faces), mustache_name, mustache_size, rng
                     )
-            mustachized_frames.append(image_frame)
+                    mustache_list.extend(mustache.name for mustache in mustaches)
+                    # Place mustaches
+                    with metrics.stage("composite"):
+                        self.mustache_placer.place_mustaches(
+                            frame=image_frame,
+                            camera=camera,
+                            faces=faces,
+                            mustaches=mustaches,
+                        )
+                if seen is not None:
+                    self.frame_deduplicator.remember(seen, faces, image_frame)
+                if writer is not None:
+                    with metrics.stage("encode"):
+                        writer.write(
+                            image_frame, duration, None if faces else raw_frame
+                        )
+
+            metrics.describe(format_, image_frame.size, index + 1, max_faces_found)
 
-        if not recognized_faces:
-            raise NoFaceFoundError("No face found in media.")
+            # Raised before leaving, for a video being encoded to be given up on
+            if not recognized_faces:
+                raise NoFaceFoundError("No face found in media.")
 
         # Logger
         logger.debug(f"Format : {format_}")
-        logger.debug(f"Frames : {nb_frames}")
+        logger.debug(f"Frames : {index + 1}")
+        if writer is not None:
+            self._log_animation_statistics(tracking, deduplicating, writer)
         logger.debug(f"Max faces found on a single frame : {max_faces_found}")
         logger.debug(f"Number of mustaches placed: {len(mustache_list)}")
         logger.debug(f"Type: {', '.join(set(mustache_list))}")
         logger.debug(f"Size: {mustache_size}")
 
-        output_stream = io.BytesIO()
-        if format_ == "JPEG":
-            mustachized_frames[0] = mustachized_frames[0].convert("RGB")
-        if len(mustachized_frames) == 1:
-            mustachized_frames[0].save(output_stream, format=format_.lower())
-        elif len(mustachized_frames) > 1:
-            mustachized_frames[0].save(
-                output_stream,
-                format="GIF",
-                save_all=True,
-                append_images=mustachized_frames[1:],
-                duration=image.duration if "duration" in dir(image) else 0.1,
-            )
+        if writer is None:
+            with metrics.stage("encode"):
+                if format_ == "JPEG":
+                    image_frame = image_frame.convert("RGB")
+                image_frame.save(output_stream, format=format_.lower())
         output_stream.seek(0)
 
         return output_stream
 
+    def _open_frames(
+        self, image_buffer: io.BytesIO, output_stream: io.BytesIO
+    ) -> tuple:
+        """
+        Open a media to iterate its frames. Videos are decoded as they are
+        iterated, and written in the video format of the applicator.
+
+        :raises ImageIncorrectError: The provided image is not in the correct format
+
+        :return: The format of the media, its number of frames, None when not
+            known beforehand, a generator of its frames with their duration and
+            their encoded frame in the source, and the writer of animations,
+            None for a single image
+        """
+        header = image_buffer.read(12)
+        image_buffer.seek(0)
+        if is_video(header):
+            data = image_buffer.read()
+            try:
+                with metrics.stage("decode"):
+                    video = VideoReader(data, fps=VIDEO_RATES[self.video_format])
+            except ValueError as exception:
+                error_message = "An exception occured while loading the provided video"
+                raise ImageIncorrectError(error_message) from exception
+            if self.video_format == "MP4":
+                writer = VideoWriter(output_stream, video.size, video.fps, audio=data)
+            else:
+                writer = GifWriter(output_stream, video.size, loop=0)
+            return "VIDEO", None, self._video_frames(video), writer
+
+        with metrics.stage("decode"):
+            image = self._open(image_buffer)
+            nb_frames = getattr(image, "n_frames", 1)
+        gif_writer, raw_frames = None, iter(())
+        if nb_frames > 1:
+            gif_writer, raw_frames = self._open_gif_writer(
+                image, image_buffer, output_stream
+            )
+        frames = self._image_frames(image, raw_frames)
+        return image.format, nb_frames, frames, gif_writer
+
+    @staticmethod
+    def _image_frames(image: Image, raw_frames):
+        """
+        Yield the frames of an image with their duration and their encoded
+        frame in the source, each frame being decoded before it is yielded.
+        """
+        for image_frame in ImageSequence.Iterator(image):
+            with metrics.stage("decode"):
+                image_frame.load()
+            duration = image_frame.info.get("duration", 0)
+            yield image_frame, duration, next(raw_frames, None)
+
+    @staticmethod
+    def _video_frames(video: VideoReader):
+        """
+        Yield the frames of a video with their duration, ffmpeg being stopped
+        once they are all read or given up on.
+        """
+        with video:
+            pixels = iter(video)
+            while True:
+                with metrics.stage("decode"):
+                    frame = next(pixels, None)
+                if frame is None:
+                    return
+                yield Image.fromarray(frame), video.duration, None
+
+    def _open_gif_writer(
+        self, image: Image, image_buffer: io.BytesIO, output_stream: io.BytesIO
+    ) -> tuple:
+        """
+        Create the writer of an animation, keeping its palette, loop and
+        transparency.
+
+        :return: The writer, and the encoded frames of the source copied for
+            frames without faces
+        """
+        raw_frames = iter(())
+        if image.format == "GIF":
+            image_buffer.seek(0)
+            raw_frames = read_frames(image_buffer.read())
+        global_palette = getattr(image, "global_palette", None)
+        gif_writer = GifWriter(
+            output_stream,
+            image.size,
+            palette=global_palette and global_palette.palette,
+            loop=image.info.get("loop"),
+            transparency=image.info.get("transparency"),
+        )
+        return gif_writer, raw_frames
+
+    def _log_animation_statistics(
+        self, tracking: bool, deduplicating: bool, writer
+    ) -> None:
+        if tracking:
+            logger.debug(f"Keyframes : {self.face_tracker.keyframes}")
+        if deduplicating:
+            deduplicator = self.frame_deduplicator
+            logger.debug(
+                f"Frames reused : {deduplicator.reused}/{deduplicator.frames} "
+                f"({deduplicator.identical} identical, {deduplicator.similar} similar)"
+            )
+        if isinstance(writer, GifWriter):
+            logger.debug(f"Frames passed through : {writer.passed_through}")
+
+    def _find_frame_faces(self, frame: Image, camera: Camera, tracking: bool):
+        """
+        Find the faces of a frame, following them from the previous frame when
+        tracking.
+        """
+        if tracking:
+            return self.face_tracker.track_faces(frame, camera)
+        return self.face_finder.find_faces(frame, camera)
+
+    @staticmethod
+    def _pick_mustaches(
+        count: int, mustache_name: str, mustache_size: str, rng: random.Random
+    ) -> list:
+        """
+        Get a mustache for each face.
+        """
+        mustaches = []
+        for _ in range(count):
+            mustache_type = getattr(
+                MustacheType, mustache_name, MustacheType.random(rng)
+            ).value
+            mustache_type.size = mustache_size
+            mustaches.append(mustache_type)
+        return mustaches
+
     @property
     def debug(self):
         return self._debug
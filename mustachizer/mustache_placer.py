@@ -5,7 +5,8 @@ from PIL import Image
 from mustachizer.mustache import Mustache
 from mustachizer.tools.camera import Camera
 from mustachizer.tools.debug_drawer import DebugDrawer
-from mustachizer.tools.face import Face
+from mustachizer.tools.face import Face, FaceBatch
+from mustachizer.tools.pose_estimator import project_points
 
 
 class MustachePlacer:
@@ -46,6 +47,93 @@ class MustachePlacer:
             )
         )
 
+    def _compute_region(self, box_projected: list, image_size: tuple):
+        """
+        Computes the region of the image covered by a projected box.
+
+        The region is padded by a pixel on each side so that the bilinear
+        interpolation at the edges of the mustache is kept, and is clipped to
+        the image. Returns None when the box falls outside of the image.
+        """
+        points = numpy.array(box_projected, dtype=numpy.float64)
+        if not numpy.isfinite(points).all():
+            return None
+        width, height = image_size
+        left = max(int(numpy.floor(points[:, 0].min())) - 1, 0)
+        top = max(int(numpy.floor(points[:, 1].min())) - 1, 0)
+        right = min(int(numpy.ceil(points[:, 0].max())) + 2, width)
+        bottom = min(int(numpy.ceil(points[:, 1].max())) + 2, height)
+        if left >= right or top >= bottom:
+            return None
+        return left, top, right, bottom
+
+    def _project_points(self, points, faces: FaceBatch, camera: Camera):
+        """
+        Projects points expressed in the space of each face on the image.
+
+        :param points: Array of shape (N, P, 3), P points for each of the N faces.
+        :param faces: The N faces.
+        :param camera: Camera the image was taken with.
+
+        :return: Array of shape (N, P, 2)
+        """
+        # Lens distortion is not linear, let OpenCV handle it face by face
+        if numpy.any(camera.distortion):
+            return numpy.array(
+                [
+                    cv2.projectPoints(
+                        face_points,
+                        face.rotation,
+                        face.translation,
+                        camera.matrix,
+                        camera.distortion,
+                    )[0].reshape(-1, 2)
+                    for face_points, face in zip(points, faces)
+                ]
+            )
+
+        return project_points(
+            points, faces.rotations, faces.translations, camera.matrix
+        )
+
+    def _blend(self, frame, patch, left: int, top: int):
+        """
+        Alpha-blends an RGBA patch into an RGBA frame buffer, in place.
+        """
+        height, width = patch.shape[:2]
+        region = frame[top : top + height, left : left + width]
+        alpha = patch[..., 3:].astype(numpy.uint16)
+        blended = patch * alpha + region * (255 - alpha) + 127
+        region[...] = (blended // 255).astype(numpy.uint8)
+
+    def _draw_face(self, face: Face):
+        """
+        Draws the construction lines of a face.
+        """
+        drawer = DebugDrawer.instance().drawer
+        drawer.rectangle(
+            (face.x, face.y, face.x + face.width, face.y + face.height),
+            outline="red",
+        )
+        drawer.line(
+            (
+                face.x + face.width / 2,
+                face.y,
+                face.x + face.width / 2,
+                face.y + face.height,
+            ),
+            "red",
+        )
+        drawer.line(
+            (
+                face.x,
+                face.y + face.height / 2,
+                face.x + face.width,
+                face.y + face.height / 2,
+            ),
+            "red",
+        )
+
     def place_mustache(
         self,
         face_image: Image,
@@ -56,73 +144,87 @@ class MustachePlacer:
         """
         Place a mustache on a face.
         """
+        self.place_mustaches(face_image, camera, [face], [mustache])
+
+    def place_mustaches(
+        self,
+        frame: Image,
+        camera: Camera,
+        faces: FaceBatch,
+        mustaches: list,
+    ):
+        """
+        Place a mustache on each face of a frame.
+
+        The frame is converted to a buffer once, every mustache is composited
+        into it and the result is written back into the frame.
+
+        :param frame: RGBA image to place the mustaches on, modified in place.
+        :param camera: Camera the frame was taken with.
+        :param faces: Faces found on the frame, a list of `Face` is accepted too.
+        :param mustaches: Mustache to place on each face.
+        """
+        faces = FaceBatch.from_faces(faces)
+        if not faces:
+            return
+
         # Construction lines
         if self.debug:
-            drawer = DebugDrawer.instance().drawer
-            drawer.rectangle(
-                (face.x, face.y, face.x + face.width, face.y + face.height),
-                outline="red",
-            )
-            drawer.line(
-                (
-                    face.x + face.width / 2,
-                    face.y,
-                    face.x + face.width / 2,
-                    face.y + face.height,
-                ),
-                "red",
-            )
-            drawer.line(
-                (
-                    face.x,
-                    face.y + face.height / 2,
-                    face.x + face.width,
-                    face.y + face.height / 2,
-                ),
-                "red",
-            )
+            for face in faces:
+                self._draw_face(face)
 
-        # Get buffer of selected mustache
-        mustache_image = mustache.image
-
-        # Find where and place mustache
-        mustache_box = self._compute_mustache_box(mustache)
-        mustache_box_projected, _ = cv2.projectPoints(
-            mustache_box,
-            face.rotation,
-            face.translation,
-            camera.matrix,
-            camera.distortion,
-        )
-        mustache_box_projected = [tuple(point[0]) for point in mustache_box_projected]
-
-        mustache_box = [tuple(point[:2]) for point in mustache_box]
-        original_box = numpy.float32(
+        # Find where to place the mustaches, anchors being projected for debug
+        points = numpy.array(
             [
-                [0, 0],
-                [mustache_image.width, 0],
-                [mustache_image.width, mustache_image.height],
-                [0, mustache_image.height],
+                [*self._compute_mustache_box(mustache), mustache.anchor]
+                for mustache in mustaches
             ]
         )
-        perspective_matrix = cv2.getPerspectiveTransform(
-            original_box, numpy.float32(mustache_box_projected)
-        )
-        mustache_image = mustache_image.transpose(Image.FLIP_TOP_BOTTOM)
-        cv2_image = numpy.array(mustache_image)
-        cv2_image = cv2.warpPerspective(cv2_image, perspective_matrix, face_image.size)
-        mustache_image = Image.fromarray(cv2_image, "RGBA")
-        face_image.paste(mustache_image, (0, 0), mustache_image.getchannel("A"))
+        points_projected = self._project_points(points, faces, camera)
+
+        buffer = numpy.array(frame)
+        for mustache, face_points in zip(mustaches, points_projected):
+            mustache_box_projected = face_points[:4]
+
+            # Only warp the region of the frame covered by the mustache
+            region = self._compute_region(mustache_box_projected, frame.size)
+            if region is None:
+                continue
+            left, top, right, bottom = region
+
+            # Warp from the sprite closest to the size it is drawn at
+            edges = numpy.diff(mustache_box_projected, axis=0, append=face_points[:1])
+            lengths = numpy.linalg.norm(edges, axis=1)
+            sprite = mustache.get_sprite(
+                width=max(lengths[0], lengths[2]),
+                height=max(lengths[1], lengths[3]),
+            )
+            sprite_height, sprite_width = sprite.shape[:2]
+            original_box = numpy.float32(
+                [
+                    [0, 0],
+                    [sprite_width, 0],
+                    [sprite_width, sprite_height],
+                    [0, sprite_height],
+                ]
+            )
+            perspective_matrix = cv2.getPerspectiveTransform(
+                original_box, numpy.float32(mustache_box_projected)
+            )
+            translation = numpy.array([[1, 0, -left], [0, 1, -top], [0, 0, 1]])
+            cv2_image = cv2.warpPerspective(
+                sprite,
+                translation @ perspective_matrix,
+                (right - left, bottom - top),
+            )
+            self._blend(buffer, cv2_image, left, top)
+        frame.paste(Image.fromarray(buffer))
 
         # Draw debugs lines
         if self.debug:
             drawer = DebugDrawer.instance().drawer
-            mustache_projected, _ = cv2.projectPoints(
-                mustache.anchor,
-                face.rotation,
-                face.translation,
-                camera.matrix,
-                camera.distortion,
-            )
-            drawer.text(mustache_projected, "x", "cyan")
-            drawer.polygon(mustache_box_projected, outline="cyan")
+            for face_points in points_projected:
+                drawer.text(tuple(face_points[4]), "x", "cyan")
+                drawer.polygon(
+                    [tuple(point) for point in face_points[:4]], outline="cyan"
+                )
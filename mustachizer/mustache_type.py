@@ -118,5 +118,5 @@ class MustacheType(Enum):
         return list(cls.__members__)
 
     @classmethod
-    def random(cls):
-        return random.choice(list(MustacheType))
+    def random(cls, rng: random.Random = random):
+        return rng.choice(list(MustacheType))
@@ -0,0 +1,383 @@
+import cProfile
+import json
+import logging
+import multiprocessing
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+
+logger = logging.getLogger("stachlog")
+
+MODES = ("cprofile", "sampling")
+
+# Seconds between two rewrites of the collapsed stacks, besides the rewrite
+# ending each request, processes of a pool being stopped without being told
+FLUSH_INTERVAL = 10
+
+# Allocation sites listed for each request in memory reports
+MEMORY_TOP = 10
+
+# Given when nothing is profiled, so that requests cost next to nothing
+_NOT_PROFILED = nullcontext()
+
+
+class Profiler:
+    """
+    Profiles the requests of a process, a request being the mustachization of
+    a media, with outputs written in a directory.
+
+    In "cprofile" mode each request is profiled deterministically on its
+    thread, in a file of its own or in a file of all the requests of the
+    process. In "sampling" mode the stacks of every thread are sampled at
+    regular intervals and written collapsed, a line per stack, for
+    flamegraphs. Memory reports give the peak of the memory traced by
+    tracemalloc during each request and where it grew, figures of requests
+    running side by side mixing together.
+
+    Files are suffixed by the id of the process, so that processes of a pool
+    write their own.
+    """
+
+    def __init__(
+        self,
+        mode: str = None,
+        directory: Path = Path("profiles"),
+        per_request: bool = False,
+        memory: bool = False,
+        interval: float = 0.01,
+        paused: bool = False,
+    ):
+        """
+        Construct the profiler.
+
+        :param mode: "cprofile", "sampling", or None to profile only the
+            memory, if asked, defaults to None
+        :param directory: Where the outputs are written, defaults to
+            "profiles"
+        :param per_request: Whether each request gets its own cProfile file,
+            defaults to aggregating them
+        :param memory: Whether memory reports are written, defaults to False
+        :param interval: Seconds between two samples of the stacks, defaults
+            to 0.01
+        :param paused: Whether profiling waits for `toggle` to start, defaults
+            to False
+        """
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unsupported profiling mode '{mode}'")
+        self.mode = mode
+        self.directory = Path(directory)
+        self.per_request = per_request
+        self.memory = memory
+        self.interval = interval
+        self._active = None
+        if self.enabled:
+            self._active = multiprocessing.Event()
+            if not paused:
+                self._active.set()
+        self._reset()
+
+    def _reset(self) -> None:
+        # State of the current process, left behind by `for_workers`
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._stats = None
+        self._stacks = Counter()
+        self._sampler = None
+        self._stopped = threading.Event()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ["_lock", "_stats", "_stacks", "_sampler", "_stopped"]:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None or self.memory
+
+    @property
+    def active(self) -> bool:
+        """
+        Whether requests are profiled now, shared with the processes of pools.
+        """
+        return self._active is not None and self._active.is_set()
+
+    def start(self) -> None:
+        """
+        Start sampling the stacks of the process, in "sampling" mode, rather
+        than waiting for the first request.
+        """
+        if self.mode == "sampling":
+            self._start_sampler()
+
+    def request(self):
+        """
+        Profile a request run by the current thread.
+
+        :return: Context manager profiling the block, doing nothing when
+            nothing is profiled
+        """
+        if not self.enabled:
+            return _NOT_PROFILED
+        if not self._active.is_set():
+            # Tracing memory slows every allocation down, it ends with the window
+            if self.memory and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            return _NOT_PROFILED
+        if self._pid != os.getpid():
+            self._reset()
+        if self.mode == "sampling":
+            self._start_sampler()
+        with self._lock:
+            self._requests += 1
+            number = self._requests
+        return _Profiling(self, number)
+
+    def toggle(self) -> bool:
+        """
+        Pause profiling or resume it, in every process sharing the profiler.
+
+        :return: Whether profiling is resumed
+        """
+        if self._active is None:
+            return False
+        if self._active.is_set():
+            self._active.clear()
+        else:
+            self._active.set()
+        return self._active.is_set()
+
+    def toggle_on_signal(self, signal_number: int = None) -> None:
+        """
+        Pause or resume profiling each time the process gets a signal, from
+        the main thread.
+
+        :param signal_number: Signal toggling profiling, defaults to SIGUSR1
+        """
+        if signal_number is None:
+            signal_number = signal.SIGUSR1
+
+        def handle(number, frame):
+            resumed = self.toggle()
+            logger.info(f"Profiling {'resumed' if resumed else 'paused'}")
+
+        signal.signal(signal_number, handle)
+
+    def for_workers(self):
+        """
+        Profiler for the applicators of worker processes, paused and resumed
+        with this one, each process writing its own files.
+
+        Given to the processes as they are created, as in the arguments of
+        their initializer.
+
+        :return: The profiler, None when nothing is profiled
+        """
+        if not self.enabled:
+            return None
+        return self
+
+    def close(self) -> None:
+        """
+        Stop sampling and write what was not written yet.
+        """
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+            self._sampler = None
+        self._write_stacks()
+
+    def _path(self, name: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.directory / name
+
+    def _record_profile(self, profile: cProfile.Profile, number: int) -> None:
+        if self.per_request:
+            profile.dump_stats(self._path(f"request-{self._pid}-{number:05}.prof"))
+            return
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._stats.dump_stats(self._path(f"profile-{self._pid}.prof"))
+
+    def _record_memory(self, report: dict) -> None:
+        line = json.dumps(report, separators=(",", ":"))
+        with self._lock:
+            with open(self._path(f"memory-{self._pid}.jsonl"), "a") as file:
+                file.write(line + "\n")
+
+    def _start_sampler(self) -> None:
+        with self._lock:
+            if self._sampler is not None:
+                return
+            self._sampler = threading.Thread(
+                target=self._sample, name="profiler", daemon=True
+            )
+        self._sampler.start()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        flushed = time.monotonic()
+        changed = False
+        while not self._stopped.wait(self.interval):
+            if self._active.is_set():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stacks = [
+                    _collapse(names.get(ident, "?"), frame)
+                    for ident, frame in sys._current_frames().items()
+                    if ident != own
+                ]
+                with self._lock:
+                    self._stacks.update(stacks)
+                changed = True
+            # Written when paused, then from time to time
+            paused = not self._active.is_set()
+            if changed and (paused or time.monotonic() - flushed > FLUSH_INTERVAL):
+                self._write_stacks()
+                flushed = time.monotonic()
+                changed = False
+
+    def _write_stacks(self) -> None:
+        with self._lock:
+            stacks = self._stacks.copy()
+        if not stacks:
+            return
+        path = self._path(f"stacks-{self._pid}.txt")
+        temporary = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(temporary, "w") as file:
+            for stack, count in stacks.items():
+                file.write(f"{stack} {count}\n")
+        temporary.replace(path)
+
+
+def _collapse(thread_name: str, frame) -> str:
+    """
+    Stack of a frame in the collapsed format of flamegraphs, from the thread
+    to the frame.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class _Profiling:
+    """
+    Profiles a request while it runs on the current thread.
+    """
+
+    __slots__ = ("profiler", "number", "profile", "snapshot", "traced", "wall")
+
+    def __init__(self, profiler: Profiler, number: int):
+        self.profiler = profiler
+        self.number = number
+        self.profile = None
+        self.snapshot = None
+
+    def __enter__(self):
+        if self.profiler.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.snapshot = tracemalloc.take_snapshot()
+            self.traced = tracemalloc.get_traced_memory()[0]
+        self.wall = time.perf_counter()
+        if self.profiler.mode == "cprofile":
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:
+                # From Python 3.12, a single thread is profiled at a time
+                self.profile = None
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if self.profile is not None:
+            self.profile.disable()
+        wall = time.perf_counter() - self.wall
+        try:
+            if self.profile is not None:
+                self.profiler._record_profile(self.profile, self.number)
+            # Tracing may have stopped with the window meanwhile
+            if self.snapshot is not None and tracemalloc.is_tracing():
+                self.profiler._record_memory(self._memory_report(wall))
+            if self.profiler.mode == "sampling":
+                self.profiler._write_stacks()
+        except OSError as error:
+            logger.error(f"Profile not written: {error}")
+
+    def _memory_report(self, wall: float) -> dict:
+        traced, peak = tracemalloc.get_traced_memory()
+        # Allocations of the profilers themselves are left out
+        ignored = [
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ]
+        growth = (
+            tracemalloc.take_snapshot()
+            .filter_traces(ignored)
+            .compare_to(self.snapshot.filter_traces(ignored), "lineno")
+        )
+        return {
+            "timestamp": time.time(),
+            "request": self.number,
+            "wall": wall,
+            "peak": peak - self.traced,
+            "retained": traced - self.traced,
+            "top": [
+                {
+                    "where": f"{statistic.traceback[0].filename}:"
+                    f"{statistic.traceback[0].lineno}",
+                    "size": statistic.size_diff,
+                    "count": statistic.count_diff,
+                }
+                for statistic in growth[:MEMORY_TOP]
+            ],
+        }
+
+
+def create_profiler(
+    mode: str = None,
+    directory: Path = Path("profiles"),
+    per_request: bool = False,
+    memory: bool = False,
+    paused: bool = False,
+) -> Profiler:
+    """
+    Build the profiler of a command line from its options, samples being
+    taken from now on.
+
+    :param mode: "cprofile", "sampling", or None to profile only the memory,
+        if asked, defaults to None
+    :param directory: Where the outputs are written, defaults to "profiles"
+    :param per_request: Whether each request gets its own cProfile file,
+        defaults to aggregating them
+    :param memory: Whether memory reports are written, defaults to False
+    :param paused: Whether profiling waits for a toggle to start, defaults to
+        False
+
+    :return: The profiler, profiling nothing without mode nor memory
+    """
+    profiler = Profiler(mode, directory, per_request, memory, paused=paused)
+    if profiler.enabled:
+        logger.info(f"Profiles written in '{profiler.directory}'")
+        profiler.start()
+    return profiler
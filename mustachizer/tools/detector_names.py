@@ -0,0 +1,3 @@
+# Names of the backends of `mustachizer.tools.face_detectors`, kept apart so
+# that command lines list them without loading OpenCV
+DETECTOR_NAMES = ("haar", "yunet", "ssd")
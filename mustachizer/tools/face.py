@@ -1,15 +1,21 @@
+import numpy
+
+
 class Face:
     """
     Represents the hitbox of a face.
     """
 
-    def __init__(self, x, y, width, height, rotation, translation):
+    __slots__ = ("x", "y", "width", "height", "rotation", "translation", "landmarks")
+
+    def __init__(self, x, y, width, height, rotation, translation, landmarks=None):
         self.x = x
         self.y = y
         self.width = width
         self.height = height
         self.rotation = rotation
         self.translation = translation
+        self.landmarks = landmarks
 
     def __repr__(self):
         return (
@@ -20,3 +26,105 @@ class Face:
             f"{self.rotation}, "
             f"{self.translation})"
         )
+
+
+class FaceBatch:
+    """
+    Faces of a frame, stored in contiguous arrays rather than one object each.
+
+    Indexing gives a `Face` whose rotation, translation and landmarks are views
+    on the arrays, slicing gives a `FaceBatch` of views.
+    """
+
+    __slots__ = ("boxes", "rotations", "translations", "landmarks")
+
+    LANDMARKS = 68
+
+    def __init__(self, boxes, rotations, translations, landmarks=None):
+        """
+        Construct the batch, the arrays are not copied when already contiguous
+        and of the right type.
+
+        :param boxes: Array of shape (N, 4), the x, y, width and height of each face.
+        :param rotations: Array of shape (N, 3), rotation vector of each face.
+        :param translations: Array of shape (N, 3), translation of each face.
+        :param landmarks: Array of shape (N, 68, 2), defaults to unknown (NaN)
+        """
+        self.boxes = numpy.ascontiguousarray(boxes, dtype=numpy.int32).reshape(-1, 4)
+        count = len(self.boxes)
+        self.rotations = numpy.ascontiguousarray(
+            rotations, dtype=numpy.float64
+        ).reshape(count, 3)
+        self.translations = numpy.ascontiguousarray(
+            translations, dtype=numpy.float64
+        ).reshape(count, 3)
+        if landmarks is None:
+            landmarks = numpy.full((count, self.LANDMARKS, 2), numpy.nan)
+        self.landmarks = numpy.ascontiguousarray(
+            landmarks, dtype=numpy.float32
+        ).reshape(count, self.LANDMARKS, 2)
+
+    @classmethod
+    def empty(cls) -> "FaceBatch":
+        return cls(numpy.empty((0, 4)), numpy.empty((0, 3)), numpy.empty((0, 3)))
+
+    @classmethod
+    def from_faces(cls, faces) -> "FaceBatch":
+        """
+        Gather faces into a batch, a batch being returned as is.
+        """
+        if isinstance(faces, FaceBatch):
+            return faces
+        faces = list(faces)
+        if not faces:
+            return cls.empty()
+        landmarks = None
+        if all(face.landmarks is not None for face in faces):
+            landmarks = [face.landmarks for face in faces]
+        return cls(
+            [(face.x, face.y, face.width, face.height) for face in faces],
+            [numpy.ravel(face.rotation) for face in faces],
+            [numpy.ravel(face.translation) for face in faces],
+            landmarks,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the arrays of the batch, in bytes.
+        """
+        return (
+            self.boxes.nbytes
+            + self.rotations.nbytes
+            + self.translations.nbytes
+            + self.landmarks.nbytes
+        )
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FaceBatch(
+                self.boxes[index],
+                self.rotations[index],
+                self.translations[index],
+                self.landmarks[index],
+            )
+        x, y, width, height = self.boxes[index].tolist()
+        return Face(
+            x,
+            y,
+            width,
+            height,
+            self.rotations[index].reshape(3, 1),
+            self.translations[index].reshape(3, 1),
+            self.landmarks[index],
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return f"FaceBatch({len(self)} faces)"
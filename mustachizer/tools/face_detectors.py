@@ -0,0 +1,207 @@
+from functools import lru_cache
+
+import cv2
+import numpy
+
+from mustachizer import PATH
+from mustachizer.tools.detector_names import DETECTOR_NAMES
+
+FACE_CASCADE_FILEPATH = PATH / "models" / "haarcascade" / "frontalface_default.xml"
+YUNET_FILEPATH = PATH / "models" / "dnn" / "face_detection_yunet_2023mar.onnx"
+SSD_CONFIG_FILEPATH = PATH / "models" / "dnn" / "deploy.prototxt"
+SSD_WEIGHTS_FILEPATH = (
+    PATH / "models" / "dnn" / "res10_300x300_ssd_iter_140000.caffemodel"
+)
+
+
+@lru_cache(maxsize=None)
+def load_face_cascade() -> cv2.CascadeClassifier:
+    """
+    Load the Haar cascade detecting faces, once per process.
+    """
+    return cv2.CascadeClassifier(str(FACE_CASCADE_FILEPATH))
+
+
+def _check_model(*filepaths) -> None:
+    for filepath in filepaths:
+        if not filepath.exists():
+            raise FileNotFoundError(
+                f"Model '{filepath.name}' not found, download it to '{filepath}'"
+            )
+
+
+def _filter_sizes(boxes: numpy.ndarray, min_size: tuple, max_size: tuple):
+    """
+    Keep the boxes between two sizes, as the cascade does while detecting.
+    """
+    keep = (boxes[:, 2] >= min_size[0]) & (boxes[:, 3] >= min_size[1])
+    if max_size[0] > 0 and max_size[1] > 0:
+        keep &= (boxes[:, 2] <= max_size[0]) & (boxes[:, 3] <= max_size[1])
+    return boxes[keep]
+
+
+class FaceDetector:
+    """
+    Detects the bounding boxes of faces, the backend of `FaceFinder`.
+    """
+
+    NAME = None
+    # Whether images are given in grayscale rather than in BGR
+    GRAYSCALE = False
+
+    def load(self) -> None:
+        """
+        Load the model now rather than on first use.
+        """
+
+    def detect(
+        self,
+        cv2_image: numpy.ndarray,
+        min_size: tuple = (30, 30),
+        max_size: tuple = (0, 0),
+    ) -> numpy.ndarray:
+        """
+        Detect the bounding boxes of faces.
+
+        :param cv2_image: Image in grayscale or BGR, depending on the backend.
+        :param min_size: Smallest box detected, defaults to (30, 30)
+        :param max_size: Biggest box detected, defaults to no limit
+
+        :return: Array of shape (N, 4), the x, y, width and height of each box
+        """
+        raise NotImplementedError
+
+
+class HaarDetector(FaceDetector):
+    """
+    Viola-Jones cascade of Haar features, fast but prone to false positives.
+    """
+
+    NAME = "haar"
+    GRAYSCALE = True
+
+    def load(self) -> None:
+        load_face_cascade()
+
+    def detect(self, cv2_image, min_size=(30, 30), max_size=(0, 0)):
+        faces = load_face_cascade().detectMultiScale(
+            cv2_image,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=min_size,
+            maxSize=max_size,
+        )
+        return numpy.array(faces, dtype=numpy.int32).reshape(-1, 4)
+
+
+class YuNetDetector(FaceDetector):
+    """
+    YuNet convolutional network run by OpenCV on CPU.
+    """
+
+    NAME = "yunet"
+
+    def __init__(self, score_threshold: float = 0.9):
+        """
+        Construct the detector.
+
+        :param score_threshold: Confidence below which faces are dropped,
+            defaults to 0.9
+        """
+        self.score_threshold = score_threshold
+        self._network = None
+
+    def load(self) -> None:
+        if self._network is None:
+            _check_model(YUNET_FILEPATH)
+            self._network = cv2.FaceDetectorYN.create(
+                str(YUNET_FILEPATH),
+                "",
+                (320, 320),
+                score_threshold=self.score_threshold,
+                backend_id=cv2.dnn.DNN_BACKEND_OPENCV,
+                target_id=cv2.dnn.DNN_TARGET_CPU,
+            )
+
+    def detect(self, cv2_image, min_size=(30, 30), max_size=(0, 0)):
+        self.load()
+        height, width = cv2_image.shape[:2]
+        self._network.setInputSize((width, height))
+        _, faces = self._network.detect(cv2_image)
+        if faces is None:
+            return numpy.empty((0, 4), dtype=numpy.int32)
+
+        # Rows also hold five landmarks and the score after the box, which
+        # runs past the image for faces on its edges
+        corners = numpy.hstack([faces[:, :2], faces[:, :2] + faces[:, 2:4]])
+        corners = numpy.clip(corners, 0, (width, height, width, height))
+        boxes = numpy.rint(
+            numpy.hstack([corners[:, :2], corners[:, 2:] - corners[:, :2]])
+        ).astype(numpy.int32)
+        return _filter_sizes(boxes, min_size, max_size)
+
+
+class SSDDetector(FaceDetector):
+    """
+    ResNet-10 single shot detector run by OpenCV on CPU.
+    """
+
+    NAME = "ssd"
+    INPUT_SIZE = (300, 300)
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self, score_threshold: float = 0.5):
+        """
+        Construct the detector.
+
+        :param score_threshold: Confidence below which faces are dropped,
+            defaults to 0.5
+        """
+        self.score_threshold = score_threshold
+        self._network = None
+
+    def load(self) -> None:
+        if self._network is None:
+            _check_model(SSD_CONFIG_FILEPATH, SSD_WEIGHTS_FILEPATH)
+            network = cv2.dnn.readNetFromCaffe(
+                str(SSD_CONFIG_FILEPATH), str(SSD_WEIGHTS_FILEPATH)
+            )
+            network.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            network.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._network = network
+
+    def detect(self, cv2_image, min_size=(30, 30), max_size=(0, 0)):
+        self.load()
+        height, width = cv2_image.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(cv2_image, self.INPUT_SIZE), 1.0, self.INPUT_SIZE, self.MEAN
+        )
+        self._network.setInput(blob)
+
+        # Rows of (image, class, score, left, top, right, bottom), corners relative
+        detections = self._network.forward().reshape(-1, 7)
+        detections = detections[detections[:, 2] >= self.score_threshold]
+        corners = detections[:, 3:7] * (width, height, width, height)
+        corners = numpy.clip(corners, 0, (width, height, width, height))
+        boxes = numpy.rint(
+            numpy.hstack([corners[:, :2], corners[:, 2:] - corners[:, :2]])
+        ).astype(numpy.int32)
+        return _filter_sizes(boxes.reshape(-1, 4), min_size, max_size)
+
+
+DETECTORS = {
+    detector.NAME: detector for detector in (HaarDetector, YuNetDetector, SSDDetector)
+}
+
+
+def create_detector(name: str) -> FaceDetector:
+    """
+    Create a detector from the name of its backend.
+
+    :raises ValueError: There is no backend with this name
+    """
+    if name not in DETECTORS:
+        raise ValueError(
+            f"Unknown face detector '{name}', choose among {', '.join(DETECTOR_NAMES)}"
+        )
+    return DETECTORS[name]()
@@ -1,18 +1,30 @@
 import logging
-import math
 
 import cv2
 import numpy
 from PIL import Image
 
-from mustachizer import PATH
+from mustachizer import PATH, metrics
+from mustachizer.cache import FaceCache
 from mustachizer.tools.camera import Camera
 from mustachizer.tools.debug_drawer import DebugDrawer
-from mustachizer.tools.face import Face
-
-faceCascade = cv2.CascadeClassifier(
-    f"{PATH}/models/haarcascade/frontalface_default.xml"
+from mustachizer.tools.face import FaceBatch
+from mustachizer.tools.face_detectors import (  # noqa: F401
+    FACE_CASCADE_FILEPATH,
+    FaceDetector,
+    create_detector,
+    load_face_cascade,
 )
+from mustachizer.tools.pose_estimator import estimate_poses
+
+FACE_MARKER_FILEPATH = PATH / "models" / "face_marker_models" / "lbf.model"
+
+
+def __getattr__(name: str):
+    # The cascade used to be loaded as soon as the module was imported
+    if name == "faceCascade":
+        return load_face_cascade()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class FaceFinder:
@@ -32,55 +44,173 @@ class FaceFinder:
     )
     FACE_2D_INDEXES = [30, 8, 36, 45, 48, 54]
 
-    def __init__(self, debug: bool = False):
+    def __init__(
+        self,
+        debug: bool = False,
+        cache: FaceCache = None,
+        detection_width: int = None,
+        detector="haar",
+    ):
         """
         Construct the finder.
 
         :param debug: Whether it should draw debug lines, defaults to False
+        :param cache: Where faces found are cached, defaults to no cache
+        :param detection_width: Width wider images are downscaled to before
+            detecting faces, defaults to detecting them at full resolution
+        :param detector: Backend detecting the faces, or its name, defaults to
+            the Haar cascade
+
+        :raises ValueError: There is no backend with this name
         """
         self.debug = debug
+        self.cache = cache
+        self.detection_width = detection_width
+        if not isinstance(detector, FaceDetector):
+            detector = create_detector(detector)
+        self.detector = detector
+
+        # Model is loaded on first use
+        self._face_marker = None
+
+    def load_models(self) -> None:
+        """
+        Load the models now rather than on first use.
+        """
+        self.detector.load()
+        self.face_marker
+
+    @property
+    def face_marker(self):
+        if self._face_marker is None:
+            # TODO hide model loaded in log
+            face_marker = cv2.face.createFacemarkLBF()
+            face_marker.loadModel(str(FACE_MARKER_FILEPATH))
+            self._face_marker = face_marker
+        return self._face_marker
 
-        # Load model
-        # TODO hide model loaded in log
-        self._face_marker = cv2.face.createFacemarkLBF()
-        self._face_marker.loadModel(f"{PATH}/models/face_marker_models/lbf.model")
-
-    def _compute_face_projections(self, cv2_image, camera: Camera, faces) -> list:
-        _, face_marks = self._face_marker.fit(cv2_image, faces)
-        face_marks = [marks.reshape(68, 2) for marks in face_marks]
-
-        projections = []
-        for i in range(len(faces)):
-            success, rotation_vector, translation_vector = cv2.solvePnP(
-                self.FACE_3D_POINTS,
-                face_marks[i][self.FACE_2D_INDEXES],
-                camera.matrix,
-                camera.distortion,
+    def _compute_face_projections(
+        self, cv2_image, camera: Camera, faces, scale: float = 1.0
+    ) -> tuple:
+        """
+        Fit the landmarks of faces and estimate their poses.
+
+        :return: The rotations (N, 3), translations (N, 3) and landmarks (N, 68, 2)
+        """
+        with metrics.stage("fit"):
+            _, face_marks = self.face_marker.fit(cv2_image, faces)
+        face_marks = numpy.array(face_marks).reshape(-1, 68, 2) / scale
+
+        with metrics.stage("pose"):
+            rotations, translations = estimate_poses(
+                self.FACE_3D_POINTS, face_marks[:, self.FACE_2D_INDEXES], camera
             )
-            rotation_vector_degree = rotation_vector * 180 / math.pi
-            logging.debug("Rotation: %s", rotation_vector_degree)
-            logging.debug("Translation: %s", translation_vector)
-            projections.append((rotation_vector, translation_vector))
-
-            if self.debug:
-                drawer = DebugDrawer.instance().drawer
-                for j, mark in enumerate(face_marks[i]):
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for rotation, translation in zip(rotations, translations):
+                logging.debug("Rotation: %s", numpy.degrees(rotation))
+                logging.debug("Translation: %s", translation)
+
+        if self.debug:
+            drawer = DebugDrawer.instance().drawer
+            for marks in face_marks:
+                for j, mark in enumerate(marks):
                     drawer.text(
-                        mark, f"{j}", "blue" if j in self.FACE_2D_INDEXES else "lime"
+                        tuple(mark),
+                        f"{j}",
+                        "blue" if j in self.FACE_2D_INDEXES else "lime",
                     )
 
-        return projections
+        return rotations, translations, face_marks
 
-    def find_faces(self, image: Image, camera: Camera) -> list:
-        cv2_image = cv2.cvtColor(numpy.array(image), cv2.COLOR_RGB2BGR)
-        cv2_gray_image = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
-        faces = faceCascade.detectMultiScale(
-            cv2_gray_image, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
+    def find_faces(self, image: Image, camera: Camera) -> FaceBatch:
+        pixels = numpy.array(image)
+
+        # Debug lines are drawn while searching, so they can't come from cache
+        key = None
+        if self.cache is not None and not self.debug:
+            key = FaceCache.key(pixels)
+            faces = self.cache.get(key)
+            if faces is not None:
+                return faces
+
+        faces = self._find_faces(pixels, camera)
+        if key is not None:
+            self.cache.put(key, faces)
+        return faces
+
+    def _find_faces(self, pixels: numpy.ndarray, camera: Camera) -> FaceBatch:
+        with metrics.stage("detect"):
+            cv2_image, scale = self.downscale(self.to_cv2(pixels))
+            faces = self.detect_boxes(cv2_image)
+        return self.locate_faces(cv2_image, camera, faces, scale)
+
+    @staticmethod
+    def to_gray(pixels: numpy.ndarray) -> numpy.ndarray:
+        """
+        Convert the RGB(A) pixels of an image to grayscale.
+        """
+        cv2_image = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+        return cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
+
+    def to_cv2(self, pixels: numpy.ndarray) -> numpy.ndarray:
+        """
+        Convert the RGB(A) pixels of an image to what the detector finds faces on.
+        """
+        if self.detector.GRAYSCALE:
+            return self.to_gray(pixels)
+        return cv2.cvtColor(
+            pixels, cv2.COLOR_RGBA2BGR if pixels.shape[2] == 4 else cv2.COLOR_RGB2BGR
+        )
+
+    def downscale(self, cv2_image: numpy.ndarray) -> tuple:
+        """
+        Downscale an image wider than the detection width.
+
+        :return: The image faces are detected on and its scale to the original
+        """
+        width = cv2_image.shape[1]
+        if not self.detection_width or width <= self.detection_width:
+            return cv2_image, 1.0
+        scale = self.detection_width / width
+        cv2_image = cv2.resize(
+            cv2_image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
         )
+        return cv2_image, scale
+
+    def detect_boxes(
+        self,
+        cv2_image: numpy.ndarray,
+        min_size: tuple = (30, 30),
+        max_size: tuple = (0, 0),
+    ) -> numpy.ndarray:
+        """
+        Detect the bounding boxes of faces with the backend.
+
+        :return: Array of shape (N, 4), the x, y, width and height of each box
+        """
+        return self.detector.detect(cv2_image, min_size=min_size, max_size=max_size)
+
+    def locate_faces(
+        self,
+        cv2_image: numpy.ndarray,
+        camera: Camera,
+        faces: numpy.ndarray,
+        scale: float = 1.0,
+    ) -> FaceBatch:
+        """
+        Compute the position of faces in space from their bounding boxes.
+
+        :param cv2_image: Image the faces were detected on.
+        :param camera: Camera the original image was taken with.
+        :param faces: Bounding boxes of the faces.
+        :param scale: Scale of the image to the original one, defaults to 1.0
+        """
         if len(faces) == 0:
-            return []
-        projections = self._compute_face_projections(cv2_gray_image, camera, faces)
+            return FaceBatch.empty()
+        rotations, translations, landmarks = self._compute_face_projections(
+            cv2_image, camera, faces, scale
+        )
 
-        return [
-            Face(*face, *projection) for face, projection in zip(faces, projections)
-        ]
+        # Boxes back to the coordinates of the original image
+        boxes = numpy.rint(faces / scale)
+        return FaceBatch(boxes, rotations, translations, landmarks)
@@ -0,0 +1,126 @@
+import numpy
+from PIL import Image
+
+from mustachizer import metrics
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face import FaceBatch
+from mustachizer.tools.face_finder import FaceFinder
+
+
+class FaceTracker:
+    """
+    Follows faces from frame to frame of an animation.
+
+    Faces are detected on the whole frame only on keyframes. In between, each
+    face is searched for in a window around where it was on the previous
+    frame, and a new keyframe is made as soon as one of them is lost.
+    """
+
+    def __init__(
+        self,
+        face_finder: FaceFinder,
+        keyframe_interval: int = 10,
+        search_margin: float = 0.5,
+        smoothing: float = 0.5,
+    ):
+        """
+        Construct the tracker.
+
+        :param face_finder: Finder detecting and locating the faces.
+        :param keyframe_interval: Maximum number of frames between two
+            detections on the whole frame, defaults to 10
+        :param search_margin: Margin around the previous box where a face is
+            searched for, proportional to its size, defaults to 0.5
+        :param smoothing: Weight of the previous box in the new one, to reduce
+            jitter, defaults to 0.5
+        """
+        self.face_finder = face_finder
+        self.keyframe_interval = keyframe_interval
+        self.search_margin = search_margin
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget the faces tracked, the next frame is a keyframe.
+        """
+        self._boxes = None
+        self._frames_since_keyframe = 0
+        self.keyframes = 0
+        self.tracked_frames = 0
+
+    def _follow(self, cv2_image: numpy.ndarray, box: numpy.ndarray):
+        """
+        Search for a face around its previous box.
+
+        :return: The new box, None if the face was not found
+        """
+        x, y, width, height = box
+        margin_x = int(width * self.search_margin)
+        margin_y = int(height * self.search_margin)
+        image_height, image_width = cv2_image.shape[:2]
+        left, top = max(x - margin_x, 0), max(y - margin_y, 0)
+        right = min(x + width + margin_x, image_width)
+        bottom = min(y + height + margin_y, image_height)
+
+        # Faces barely change size from a frame to the next
+        min_size = int(min(width, height) * 0.7)
+        max_size = int(max(width, height) * 1.4)
+        candidates = self.face_finder.detect_boxes(
+            cv2_image[top:bottom, left:right],
+            min_size=(min_size, min_size),
+            max_size=(max_size, max_size),
+        )
+        if len(candidates) == 0:
+            return None
+
+        # Closest candidate to the previous box
+        candidates[:, :2] += (left, top)
+        centers = candidates[:, :2] + candidates[:, 2:] / 2
+        distances = numpy.linalg.norm(centers - (x + width / 2, y + height / 2), axis=1)
+        candidate = candidates[numpy.argmin(distances)]
+
+        smoothed = self.smoothing * box + (1 - self.smoothing) * candidate
+        return numpy.rint(smoothed).astype(numpy.int32)
+
+    def track_faces(self, image: Image, camera: Camera) -> FaceBatch:
+        """
+        Find the faces of the next frame.
+
+        :param image: The frame.
+        :param camera: Camera the frame was taken with.
+
+        :return: Faces found
+        """
+        pixels = numpy.array(image)
+
+        boxes = None
+        if (
+            self._boxes is not None
+            and len(self._boxes) > 0
+            and self._frames_since_keyframe < self.keyframe_interval
+        ):
+            # Followed at the resolution faces are detected at
+            with metrics.stage("detect"):
+                cv2_image, scale = self.face_finder.downscale(
+                    self.face_finder.to_cv2(pixels)
+                )
+                scaled_boxes = numpy.rint(self._boxes * scale).astype(numpy.int32)
+                boxes = [self._follow(cv2_image, box) for box in scaled_boxes]
+            if any(box is None for box in boxes):  # Face lost
+                boxes = None
+
+        if boxes is None:
+            faces = self.face_finder.find_faces(image, camera)
+            self._boxes = faces.boxes
+            self._frames_since_keyframe = 1
+            self.keyframes += 1
+            return faces
+
+        faces = self.face_finder.locate_faces(
+            cv2_image, camera, numpy.array(boxes), scale
+        )
+        self._boxes = faces.boxes
+        self._frames_since_keyframe += 1
+        self.tracked_frames += 1
+        return faces
@@ -0,0 +1,143 @@
+import hashlib
+from collections import deque
+
+import numpy
+from PIL import Image
+
+from mustachizer.cache import LRUCache
+from mustachizer.tools.face import FaceBatch
+
+
+class SeenFrame:
+    """
+    What is known of a frame from the frames seen before it.
+    """
+
+    __slots__ = ("key", "fingerprint", "faces", "composited")
+
+    def __init__(self, key, fingerprint, faces=None, composited=None):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.faces = faces
+        self.composited = composited
+
+
+class FrameDeduplicator:
+    """
+    Recognizes the frames of an animation already seen.
+
+    A frame identical to one seen before gets back its faces and the frame
+    once mustachized. A frame barely different from a recent one, as told by
+    comparing small thumbnails, only gets back its faces, mustaches being
+    drawn again.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 64 * 2**20,
+        fingerprint_size: int = 16,
+        tolerance: float = 4.0,
+        max_fingerprints: int = 64,
+    ):
+        """
+        Construct the deduplicator.
+
+        :param max_size: Total size of the mustachized frames kept, in bytes,
+            defaults to 64 MiB
+        :param fingerprint_size: Width and height of the thumbnails compared,
+            defaults to 16
+        :param tolerance: Largest difference between two pixels of thumbnails
+            of frames barely different, 0 to only reuse identical frames,
+            defaults to 4.0
+        :param max_fingerprints: Number of recent frames thumbnails are
+            compared to, defaults to 64
+        """
+        self.fingerprint_size = fingerprint_size
+        self.tolerance = tolerance
+        self._composited = LRUCache(max_size, sizeof=self._entry_size)
+        self._fingerprints = deque(maxlen=max_fingerprints)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget the frames seen, before the frames of another animation.
+        """
+        self._composited.clear()
+        self._fingerprints.clear()
+        self.frames = 0
+        self.identical = 0
+        self.similar = 0
+
+    @staticmethod
+    def _entry_size(entry: tuple) -> int:
+        _, composited = entry
+        return composited.width * composited.height * len(composited.getbands())
+
+    @staticmethod
+    def key(image: Image) -> str:
+        """
+        Compute the key of a frame, as decoded.
+        """
+        # Only the first frame of a GIF is decoded with its palette
+        if image.mode == "P":
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.mode}:{image.size}".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def fingerprint(self, image: Image) -> numpy.ndarray:
+        """
+        Compute the thumbnail of a frame, as decoded.
+        """
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        size = (self.fingerprint_size, self.fingerprint_size)
+        thumbnail = image.resize(size, Image.BOX).convert("RGBA")
+        return numpy.asarray(thumbnail, dtype=numpy.float32)
+
+    def match(self, image: Image) -> SeenFrame:
+        """
+        Look for a frame seen before.
+
+        :param image: The frame, as decoded.
+
+        :return: The key and thumbnail of the frame, with the faces and the
+            mustachized frame of a frame seen before when there is one
+        """
+        self.frames += 1
+        key = self.key(image)
+        cached = self._composited.get(key)
+        if cached is not None:
+            self.identical += 1
+            faces, composited = cached
+            return SeenFrame(key, None, faces, composited)
+
+        fingerprint = self.fingerprint(image)
+        if self.tolerance > 0 and self._fingerprints:
+            fingerprints = numpy.stack([seen for seen, _ in self._fingerprints])
+            differences = numpy.abs(fingerprints - fingerprint).max(axis=(1, 2, 3))
+            closest = int(numpy.argmin(differences))
+            if differences[closest] <= self.tolerance:
+                self.similar += 1
+                return SeenFrame(key, fingerprint, self._fingerprints[closest][1])
+        return SeenFrame(key, fingerprint)
+
+    def remember(self, seen: SeenFrame, faces: FaceBatch, composited: Image) -> None:
+        """
+        Keep the faces and the mustachized frame of a frame not reused.
+
+        :param seen: What `match` returned for the frame.
+        :param faces: Faces found on the frame.
+        :param composited: The frame once mustachized, not modified afterwards.
+        """
+        self._composited.put(seen.key, (faces, composited))
+        if seen.fingerprint is not None and seen.faces is None:
+            self._fingerprints.append((seen.fingerprint, faces))
+
+    @property
+    def reused(self) -> int:
+        """
+        Number of frames whose faces were reused.
+        """
+        return self.identical + self.similar
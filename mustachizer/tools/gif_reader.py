@@ -0,0 +1,96 @@
+import struct
+
+# Disposal methods of the graphic control extension
+DISPOSAL_UNSPECIFIED = 0
+DISPOSAL_NONE = 1
+DISPOSAL_BACKGROUND = 2
+DISPOSAL_PREVIOUS = 3
+
+
+class RawFrame:
+    """
+    Encoded frame of a GIF, as found in the file.
+    """
+
+    __slots__ = ("blocks", "region", "disposal", "transparent", "local_palette")
+
+    def __init__(self, blocks, region, disposal, transparent, local_palette):
+        self.blocks = blocks
+        self.region = region
+        self.disposal = disposal
+        self.transparent = transparent
+        self.local_palette = local_palette
+
+    def covers(self, size: tuple) -> bool:
+        """
+        Whether the frame is drawn over the whole canvas without transparency,
+        hiding everything drawn before it.
+        """
+        return self.region == (0, 0) + tuple(size) and not self.transparent
+
+
+def _skip_sub_blocks(data: memoryview, position: int) -> int:
+    """
+    Return the position following the data sub-blocks starting at `position`.
+    """
+    while data[position]:
+        position += data[position] + 1
+    return position + 1
+
+
+def read_frames(data: bytes):
+    """
+    Split a GIF into its encoded frames, without decoding them.
+
+    Frames come with the graphic control extension preceding them. Reading
+    stops quietly on truncated data, decoders being lenient with it too.
+
+    :param data: Content of the GIF file.
+
+    :return: Generator of `RawFrame`
+    """
+    data = memoryview(data)
+    packed = data[10]
+    position = 13
+    if packed & 0x80:
+        position += 3 << ((packed & 0x07) + 1)
+
+    control = None
+    try:
+        while data[position] != 0x3B:
+            if data[position] == 0x21:
+                start = position
+                position = _skip_sub_blocks(data, position + 2)
+                if data[start + 1] == 0xF9:
+                    control = data[start:position]
+            elif data[position] == 0x2C:
+                start = position
+                left, top, width, height, flags = struct.unpack_from(
+                    "<HHHHB", data, position + 1
+                )
+                position += 10
+                if flags & 0x80:
+                    position += 3 << ((flags & 0x07) + 1)
+                # LZW minimum code size, then the image data
+                position = _skip_sub_blocks(data, position + 1)
+                if position > len(data):
+                    return
+
+                disposal, transparent = DISPOSAL_UNSPECIFIED, False
+                blocks = (data[start:position],)
+                if control is not None:
+                    disposal = (control[3] >> 2) & 0x07
+                    transparent = bool(control[3] & 0x01)
+                    blocks = (control,) + blocks
+                yield RawFrame(
+                    blocks,
+                    (left, top, left + width, top + height),
+                    disposal,
+                    transparent,
+                    bool(flags & 0x80),
+                )
+                control = None
+            else:
+                return
+    except (IndexError, struct.error):
+        return
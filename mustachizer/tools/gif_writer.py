@@ -0,0 +1,329 @@
+import struct
+import sys
+
+import numpy
+from PIL import GifImagePlugin, Image
+
+from mustachizer.tools.gif_reader import (
+    DISPOSAL_BACKGROUND,
+    DISPOSAL_NONE,
+    DISPOSAL_PREVIOUS,
+    RawFrame,
+)
+
+PALETTE_SIZE = 256
+
+
+class _Frame:
+    """
+    Last frame given to the writer.
+
+    Encoded frames are held back until the next one is known, to choose how
+    they are disposed of. Frames passed through are written at once, only
+    their pixels are kept.
+    """
+
+    __slots__ = ("pixels", "indexes", "region", "duration", "disposal")
+
+    def __init__(self, pixels, indexes, region, duration, disposal=None):
+        self.pixels = pixels
+        self.indexes = indexes
+        self.region = region
+        self.duration = duration
+        self.disposal = disposal
+
+    @property
+    def written(self) -> bool:
+        return self.indexes is None
+
+
+class GifWriter:
+    """
+    Encodes an animated GIF frame by frame, as frames come.
+
+    Every frame is mapped on one global palette and only the region that
+    changed since the previous frame is encoded. Identical consecutive frames
+    are merged into one. A single frame is held back, to choose how it is
+    disposed of once the next one is known, so memory does not grow with the
+    number of frames.
+
+    Frames left untouched are copied as they are encoded in the source GIF,
+    with their duration and disposal, as long as they are drawn on the same
+    canvas as in the source.
+    """
+
+    def __init__(
+        self,
+        stream,
+        size: tuple,
+        palette: bytes = None,
+        loop: int = None,
+        transparency: int = None,
+    ):
+        """
+        Construct the writer, nothing is written until the first frame.
+
+        :param stream: Binary stream the GIF is written to.
+        :param size: Width and height of the animation.
+        :param palette: RGB colors of the global palette, completed with colors
+            of the first frame when shorter than 256 colors, defaults to a
+            palette built from the first frame
+        :param loop: Number of times the animation is repeated, 0 for ever,
+            defaults to playing it once
+        :param transparency: Index of the palette used for transparent pixels,
+            defaults to ignoring transparency
+        """
+        self.stream = stream
+        self.size = tuple(size)
+        self.palette = bytes(palette) if palette is not None else b""
+        self.loop = loop
+        self.transparency = transparency
+        self.frames = 0
+        self.passed_through = 0
+        self._source_palette = palette is not None
+        self._previous = None
+        self._keys = None
+        self._lookup = None
+        self._quantization_palette = None
+        self._substitute = None
+        # Whether the canvas is the same as when decoding the source GIF
+        self._in_sync = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.close()
+
+    def _complete_palette(self, pixels: numpy.ndarray) -> None:
+        """
+        Fill the free entries of the palette with the colors of a frame.
+        """
+        colors = len(self.palette) // 3
+        reserved = self.transparency is not None and self.transparency >= colors
+        free = PALETTE_SIZE - colors - reserved
+        palette = list(self.palette[: 3 * colors])
+        if free > 0:
+            image = Image.fromarray(numpy.ascontiguousarray(pixels[..., :3]))
+            quantized = image.quantize(colors=free)
+            palette += quantized.getpalette()[: 3 * free]
+        palette += [0] * (3 * PALETTE_SIZE - len(palette))
+
+        # Transparent index in the place asked for
+        if reserved:
+            palette[3 * self.transparency : 3 * self.transparency] = [0, 0, 0]
+        self.palette = bytes(palette[: 3 * PALETTE_SIZE])
+        colors = numpy.frombuffer(self.palette, dtype=numpy.uint8).reshape(-1, 3)
+
+        # Index of every color of the palette, by its 24 bits value. Only the
+        # pages of the table holding colors met are ever allocated
+        indexes = numpy.arange(PALETTE_SIZE, dtype=numpy.uint8)
+        if self.transparency is not None:
+            indexes = indexes[indexes != self.transparency]
+        opaque = numpy.full((PALETTE_SIZE, 1), 255, dtype=numpy.uint8)
+        self._keys = self._color_keys(numpy.hstack([colors, opaque]))
+        keys, first = numpy.unique(self._keys[indexes], return_index=True)
+        self._lookup = numpy.zeros(1 << 24, dtype=numpy.uint8)
+        self._lookup[keys] = indexes[first]
+
+        # The transparent index mirrors another color, so that opaque pixels
+        # mapped on it can be moved to that color afterwards
+        quantization_palette = list(self.palette)
+        if self.transparency is not None:
+            self._substitute = 1 if self.transparency == 0 else 0
+            substitute = self.palette[3 * self._substitute : 3 * self._substitute + 3]
+            quantization_palette[
+                3 * self.transparency : 3 * self.transparency + 3
+            ] = substitute
+        self._quantization_palette = Image.new("P", (1, 1))
+        self._quantization_palette.putpalette(quantization_palette)
+
+    def _write_header(self) -> None:
+        width, height = self.size
+        background = self.transparency or 0
+        header = (
+            b"GIF89a"
+            + struct.pack("<HHBBB", width, height, 0xF7, background, 0)
+            + self.palette
+        )
+        if self.loop is not None:
+            header += (
+                b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loop) + b"\0"
+            )
+        self.stream.write(header)
+
+    @staticmethod
+    def _pack(pixels: numpy.ndarray) -> numpy.ndarray:
+        """
+        View RGBA pixels as one 32 bits integer each, fast to compare.
+        """
+        return numpy.ascontiguousarray(pixels).view(numpy.uint32)[..., 0]
+
+    @classmethod
+    def _color_keys(cls, pixels: numpy.ndarray) -> numpy.ndarray:
+        """
+        24 bits value of the color of RGBA pixels, alpha left out.
+        """
+        packed = cls._pack(pixels)
+        return packed & 0xFFFFFF if sys.byteorder == "little" else packed >> 8
+
+    def _quantize(self, pixels: numpy.ndarray) -> numpy.ndarray:
+        """
+        Map RGBA pixels on the global palette.
+
+        Colors of the palette keep their index, Pillow only approximating the
+        others.
+        """
+        keys = self._color_keys(pixels)
+        indexes = self._lookup[keys]
+        inexact = self._keys[indexes] != keys
+        if inexact.any():
+            colors = numpy.ascontiguousarray(pixels[inexact, :3])
+            image = Image.fromarray(colors[numpy.newaxis])
+            approximated = numpy.array(
+                image.quantize(palette=self._quantization_palette, dither=Image.NONE)
+            )[0]
+            if self.transparency is not None:
+                approximated[approximated == self.transparency] = self._substitute
+            indexes[inexact] = approximated
+        if self.transparency is not None:
+            indexes[pixels[..., 3] < 128] = self.transparency
+        return indexes
+
+    def _is_exact(self, pixels: numpy.ndarray, indexes: numpy.ndarray) -> bool:
+        """
+        Whether the opaque pixels are drawn with their exact colors.
+        """
+        opaque = pixels[..., 3] >= 128
+        keys = self._color_keys(pixels)[opaque]
+        return numpy.array_equal(self._keys[indexes[opaque]], keys)
+
+    @staticmethod
+    def _changed_region(changed: numpy.ndarray) -> tuple:
+        """
+        Bounding box of the changed pixels, a single pixel when none changed.
+        """
+        rows = numpy.flatnonzero(changed.any(axis=1))
+        columns = numpy.flatnonzero(changed.any(axis=0))
+        if not len(rows):
+            return (0, 0, 1, 1)
+        return (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1)
+
+    def _flush(self, disposal: int) -> None:
+        """
+        Encode the frame held back, if any.
+        """
+        previous = self._previous
+        if previous is None or previous.written:
+            return
+        left, top, right, bottom = previous.region
+        indexes = numpy.ascontiguousarray(previous.indexes[top:bottom, left:right])
+        image = Image.frombytes("P", (right - left, bottom - top), indexes.tobytes())
+        parameters = {"duration": previous.duration, "disposal": disposal}
+        if self.transparency is not None:
+            parameters["transparency"] = self.transparency
+        for data in GifImagePlugin.getdata(image, (left, top), **parameters):
+            self.stream.write(data)
+        self.frames += 1
+        previous.indexes = None
+        previous.disposal = disposal
+
+    def _can_pass_through(self, source: RawFrame) -> bool:
+        if not (source.local_palette or self._source_palette):
+            return False
+        return self._in_sync or source.covers(self.size)
+
+    def _pass_through(self, pixels: numpy.ndarray, source: RawFrame) -> None:
+        """
+        Write a frame as it is encoded in the source GIF.
+        """
+        self._flush(DISPOSAL_NONE)
+        for block in source.blocks:
+            self.stream.write(block)
+        self.frames += 1
+        self.passed_through += 1
+        self._previous = _Frame(pixels, None, None, None, source.disposal)
+        # Restoring the canvas from before the frame would bring the
+        # differences back
+        self._in_sync = self._in_sync or source.disposal != DISPOSAL_PREVIOUS
+
+    def write(self, frame: Image, duration: int = 0, source: RawFrame = None) -> None:
+        """
+        Add a frame to the animation.
+
+        :param frame: Frame of the size of the animation, as composited when
+            decoding.
+        :param duration: How long the frame is displayed, in milliseconds,
+            defaults to 0
+        :param source: Encoded frame of the source GIF when the frame is left
+            untouched, copied as is when possible, defaults to encoding the
+            frame
+        """
+        if frame.mode != "RGBA":
+            frame = frame.convert("RGBA")
+        pixels = numpy.asarray(frame)
+        full = (0, 0) + self.size
+
+        # Same frame again, not even mapped on the palette
+        previous = self._previous
+        if (
+            previous is not None
+            and not previous.written
+            and numpy.array_equal(self._pack(pixels), self._pack(previous.pixels))
+        ):
+            previous.duration += duration
+            return
+
+        if self._quantization_palette is None:
+            self._complete_palette(pixels)
+            self._write_header()
+        if source is not None and self._can_pass_through(source):
+            self._pass_through(pixels, source)
+            return
+
+        indexes = self._quantize(pixels)
+        previous = self._previous
+        if previous is None:
+            region = full
+        elif previous.written:
+            # Drawn over a frame passed through, on the same canvas as in the
+            # source, which the frame was composited on
+            if previous.disposal in (DISPOSAL_BACKGROUND, DISPOSAL_PREVIOUS):
+                region = full
+            else:
+                changed = self._pack(pixels) != self._pack(previous.pixels)
+                region = self._changed_region(changed)
+        else:
+            changed = indexes != previous.indexes
+            if not changed.any():
+                previous.duration += duration
+                return
+
+            # Transparent pixels can't be drawn over the previous frame, so it
+            # is cleared and the whole frame is drawn again
+            if self.transparency is not None and (indexes == self.transparency).any():
+                previous.region = full
+                self._flush(DISPOSAL_BACKGROUND)
+                region = full
+            else:
+                self._flush(DISPOSAL_NONE)
+                region = self._changed_region(changed)
+        self._previous = _Frame(pixels, indexes, region, duration)
+
+        # Back to the canvas of the source once an untouched frame is drawn
+        # exactly and left in place, by both
+        self._in_sync = (
+            source is not None
+            and source.disposal <= DISPOSAL_NONE
+            and self._is_exact(pixels, indexes)
+        )
+
+    def close(self) -> None:
+        """
+        Encode the last frame and end the animation, the stream is left open.
+        """
+        self._flush(DISPOSAL_NONE)
+        self._previous = None
+        if self._quantization_palette is not None:
+            self.stream.write(b";")
@@ -0,0 +1,263 @@
+import cv2
+import numpy
+
+from mustachizer.tools.camera import Camera
+
+# Same stopping criteria as cv2.solvePnP with SOLVEPNP_ITERATIVE
+MAX_ITERATIONS = 20
+EPSILON = numpy.finfo(numpy.float32).eps
+# Below this many poses, NumPy overhead makes OpenCV faster face by face
+BATCH_MIN_SIZE = 16
+
+
+def rodrigues(rotations: numpy.ndarray) -> numpy.ndarray:
+    """
+    Convert rotation vectors to rotation matrices, as cv2.Rodrigues does.
+
+    :param rotations: Array of shape (N, 3), axis times angle of each rotation.
+
+    :return: Array of shape (N, 3, 3)
+    """
+    angles = numpy.linalg.norm(rotations, axis=1)
+    axes = rotations / numpy.where(angles > 0, angles, 1)[:, numpy.newaxis]
+    cross = numpy.zeros((len(rotations), 3, 3))
+    cross[:, 0, 1], cross[:, 0, 2] = -axes[:, 2], axes[:, 1]
+    cross[:, 1, 0], cross[:, 1, 2] = axes[:, 2], -axes[:, 0]
+    cross[:, 2, 0], cross[:, 2, 1] = -axes[:, 1], axes[:, 0]
+    sin = numpy.sin(angles)[:, numpy.newaxis, numpy.newaxis]
+    cos = numpy.cos(angles)[:, numpy.newaxis, numpy.newaxis]
+    return numpy.eye(3) + sin * cross + (1 - cos) * cross @ cross
+
+
+def rotation_vectors(matrices: numpy.ndarray) -> numpy.ndarray:
+    """
+    Convert rotation matrices to rotation vectors, the inverse of `rodrigues`.
+
+    :param matrices: Array of shape (N, 3, 3).
+
+    :return: Array of shape (N, 3)
+    """
+    cos = numpy.clip((numpy.trace(matrices, axis1=1, axis2=2) - 1) / 2, -1, 1)
+    angles = numpy.arccos(cos)
+    skew = numpy.stack(
+        [
+            matrices[:, 2, 1] - matrices[:, 1, 2],
+            matrices[:, 0, 2] - matrices[:, 2, 0],
+            matrices[:, 1, 0] - matrices[:, 0, 1],
+        ],
+        axis=1,
+    )
+    sin = numpy.sin(angles)
+    vectors = numpy.empty((len(matrices), 3))
+
+    # Axis read from the antisymmetric part, unless the angle is close to 0 or pi
+    regular = sin > 1e-5
+    vectors[regular] = (
+        skew[regular] * (angles[regular] / (2 * sin[regular]))[:, numpy.newaxis]
+    )
+    small = ~regular & (cos > 0)
+    vectors[small] = skew[small] / 2
+
+    # Half turns, the axis is read from the symmetric part
+    for i in numpy.flatnonzero(~regular & (cos <= 0)):
+        symmetric = (matrices[i] + numpy.eye(3)) / 2
+        axis = numpy.sqrt(numpy.clip(numpy.diag(symmetric), 0, None))
+        pivot = numpy.argmax(axis)
+        axis = symmetric[pivot] / axis[pivot]
+        vectors[i] = axis / numpy.linalg.norm(axis) * angles[i]
+    return vectors
+
+
+def project_points(
+    points: numpy.ndarray,
+    rotations: numpy.ndarray,
+    translations: numpy.ndarray,
+    camera_matrix: numpy.ndarray,
+) -> numpy.ndarray:
+    """
+    Project points expressed in the space of each object on an image.
+
+    :param points: Array of shape (N, P, 3) or (P, 3) if shared by the objects.
+    :param rotations: Array of shape (N, 3), rotation vector of each object.
+    :param translations: Array of shape (N, 3), translation of each object.
+    :param camera_matrix: Intrinsic matrix of the camera, without distortion.
+
+    :return: Array of shape (N, P, 2)
+    """
+    camera_points = points @ rodrigues(rotations).transpose(0, 2, 1)
+    camera_points += translations[:, numpy.newaxis, :]
+    image_points = camera_points @ camera_matrix.T
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return image_points[..., :2] / image_points[..., 2:]
+
+
+def _initial_poses(object_points: numpy.ndarray, normalized: numpy.ndarray):
+    """
+    Closed-form poses from the direct linear transform, as cv2.solvePnP does
+    for non-planar objects.
+
+    :param object_points: Array of shape (P, 3).
+    :param normalized: Array of shape (N, P, 2), image points without intrinsics.
+
+    :return: The rotation matrices and the translations
+    """
+    count, points = normalized.shape[:2]
+    homogeneous = numpy.hstack([object_points, numpy.ones((points, 1))])
+
+    # Two equations per point on the 12 coefficients of [R|t]
+    equations = numpy.zeros((count, points, 2, 12))
+    equations[:, :, 0, :4] = homogeneous
+    equations[:, :, 1, 4:8] = homogeneous
+    equations[:, :, 0, 8:] = -normalized[..., 0:1] * homogeneous
+    equations[:, :, 1, 8:] = -normalized[..., 1:2] * homogeneous
+    equations = equations.reshape(count, 2 * points, 12)
+
+    _, _, vt = numpy.linalg.svd(equations.transpose(0, 2, 1) @ equations)
+    projections = vt[:, -1].reshape(count, 3, 4)
+    sign = numpy.sign(numpy.linalg.det(projections[:, :, :3]))
+    projections *= numpy.where(sign == 0, 1, sign)[:, numpy.newaxis, numpy.newaxis]
+
+    # Closest rotation, the translation scaled alike
+    u, _, vt = numpy.linalg.svd(projections[:, :, :3])
+    matrices = u @ vt
+    scales = numpy.linalg.norm(matrices, axis=(1, 2)) / numpy.linalg.norm(
+        projections[:, :, :3], axis=(1, 2)
+    )
+    translations = projections[:, :, 3] * scales[:, numpy.newaxis]
+    return matrices, translations
+
+
+def _skew(vectors: numpy.ndarray) -> numpy.ndarray:
+    """
+    Cross product matrices of vectors of shape (..., 3).
+    """
+    skew = numpy.zeros(vectors.shape + (3,))
+    skew[..., 0, 1], skew[..., 0, 2] = -vectors[..., 2], vectors[..., 1]
+    skew[..., 1, 0], skew[..., 1, 2] = vectors[..., 2], -vectors[..., 0]
+    skew[..., 2, 0], skew[..., 2, 1] = -vectors[..., 1], vectors[..., 0]
+    return skew
+
+
+def _linearize(object_points, image_points, matrices, translations, camera_matrix):
+    """
+    Compute the reprojection residuals of poses and their jacobians.
+
+    The rotation is differentiated with respect to a small rotation applied on
+    top of it, so that the jacobian stays simple whatever the current rotation.
+
+    :return: The residuals of shape (N, 2P) and the jacobians of shape (N, 2P, 6)
+    """
+    rotated = object_points @ matrices.transpose(0, 2, 1)
+    camera_points = rotated + translations[:, numpy.newaxis, :]
+    depths = camera_points[..., 2:]
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        normalized = camera_points[..., :2] / depths
+        projected = normalized @ camera_matrix[:2, :2].T + camera_matrix[:2, 2]
+
+        # Derivatives of the projection with respect to the point in camera space
+        projection = numpy.zeros(camera_points.shape[:2] + (2, 3))
+        projection[..., 0, 0] = projection[..., 1, 1] = 1 / depths[..., 0]
+        projection[..., :, 2] = -normalized / depths
+    projection = camera_matrix[:2, :2] @ projection
+
+    jacobians = numpy.concatenate(
+        [-projection @ _skew(rotated), projection], axis=3
+    ).reshape(len(matrices), -1, 6)
+    residuals = (projected - image_points).reshape(len(matrices), -1)
+    return residuals, jacobians
+
+
+def _refine_poses(object_points, image_points, matrices, translations, camera_matrix):
+    """
+    Minimize the reprojection error of every pose at once with
+    Levenberg-Marquardt, the poses are updated in place.
+    """
+    residuals, jacobians = _linearize(
+        object_points, image_points, matrices, translations, camera_matrix
+    )
+    errors = numpy.sum(residuals**2, axis=1)
+    damping = numpy.full(len(matrices), 1e-3)
+    active = numpy.flatnonzero(numpy.isfinite(errors))
+
+    for _ in range(MAX_ITERATIONS):
+        if len(active) == 0:
+            break
+        jacobian = jacobians[active]
+        normal = jacobian.transpose(0, 2, 1) @ jacobian
+        gradient = jacobian.transpose(0, 2, 1) @ residuals[active, :, numpy.newaxis]
+        diagonal = numpy.einsum("nii->ni", normal)
+        normal[:, range(6), range(6)] += damping[active, numpy.newaxis] * diagonal
+        normal[:, range(6), range(6)] += 1e-12
+        steps = -numpy.linalg.solve(normal, gradient)[..., 0]
+
+        candidate_matrices = rodrigues(steps[:, :3]) @ matrices[active]
+        candidate_translations = translations[active] + steps[:, 3:]
+        candidate_residuals, candidate_jacobians = _linearize(
+            object_points,
+            image_points[active],
+            candidate_matrices,
+            candidate_translations,
+            camera_matrix,
+        )
+        candidate_errors = numpy.sum(candidate_residuals**2, axis=1)
+
+        # Better steps are taken and trusted more, worse ones are damped
+        better = candidate_errors < errors[active]
+        taken = active[better]
+        matrices[taken] = candidate_matrices[better]
+        translations[taken] = candidate_translations[better]
+        residuals[taken] = candidate_residuals[better]
+        jacobians[taken] = candidate_jacobians[better]
+        errors[taken] = candidate_errors[better]
+        damping[taken] /= 10
+        damping[active[~better]] *= 10
+
+        scales = numpy.linalg.norm(translations[active], axis=1) + 1
+        converged = numpy.linalg.norm(steps, axis=1) <= EPSILON * scales
+        active = active[~converged & (damping[active] < 1e10)]
+
+
+def estimate_poses(
+    object_points: numpy.ndarray,
+    image_points: numpy.ndarray,
+    camera: Camera,
+    batch_min_size: int = BATCH_MIN_SIZE,
+) -> tuple:
+    """
+    Estimate the poses of several instances of an object from their projections,
+    the batched equivalent of cv2.solvePnP.
+
+    :param object_points: Array of shape (P, 3), at least 6 non-coplanar points.
+    :param image_points: Array of shape (N, P, 2), where the points are seen on
+        the image for each of the N instances.
+    :param camera: Camera the image was taken with.
+    :param batch_min_size: Number of poses from which they are estimated all at
+        once rather than one by one with OpenCV, defaults to `BATCH_MIN_SIZE`
+
+    :return: The rotation vectors and the translations, arrays of shape (N, 3)
+    """
+    object_points = numpy.ascontiguousarray(object_points, dtype=numpy.float64)
+    image_points = numpy.ascontiguousarray(image_points, dtype=numpy.float64)
+    count = len(image_points)
+    if count == 0:
+        return numpy.empty((0, 3)), numpy.empty((0, 3))
+
+    # Lens distortion is not linear and few poses are faster one by one
+    if count < batch_min_size or numpy.any(camera.distortion):
+        poses = [
+            cv2.solvePnP(object_points, points, camera.matrix, camera.distortion)[1:]
+            for points in image_points
+        ]
+        rotations, translations = zip(*poses)
+        return (
+            numpy.array(rotations).reshape(count, 3),
+            numpy.array(translations).reshape(count, 3),
+        )
+
+    homogeneous = numpy.concatenate(
+        [image_points, numpy.ones(image_points.shape[:2] + (1,))], axis=2
+    )
+    normalized = (homogeneous @ numpy.linalg.inv(camera.matrix).T)[..., :2]
+    matrices, translations = _initial_poses(object_points, normalized)
+    _refine_poses(object_points, image_points, matrices, translations, camera.matrix)
+    return rotation_vectors(matrices), translations
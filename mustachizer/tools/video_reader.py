@@ -0,0 +1,222 @@
+import struct
+import subprocess
+import threading
+
+import numpy
+
+# Signatures of the containers ffmpeg is given, at their offset
+VIDEO_SIGNATURES = (
+    (4, b"ftyp"),  # MP4, MOV
+    (0, b"\x1a\x45\xdf\xa3"),  # WebM, MKV
+)
+
+
+def is_video(header: bytes) -> bool:
+    """
+    Whether data starting with `header` is a video rather than an image.
+
+    :param header: First bytes of the data, at least 8.
+    """
+    return any(
+        header[offset : offset + len(signature)] == signature
+        for offset, signature in VIDEO_SIGNATURES
+    )
+
+
+# Boxes of an MP4 index holding the boxes of chunk offsets
+_INDEX_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def _boxes(data, start: int, end: int):
+    """
+    Yield the type, position, header size and size of the MP4 boxes between
+    `start` and `end`, stopping at the first box truncated.
+    """
+    position = start
+    while position + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, position)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, position + 8)
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header or position + size > end:
+            return
+        yield kind, position, header, size
+        position += size
+
+
+def _shift_chunk_offsets(index: bytearray, start: int, end: int, shift: int):
+    """
+    Add `shift` to the chunk offsets of the boxes of an MP4 index.
+    """
+    for kind, position, header, size in _boxes(index, start, end):
+        if kind in _INDEX_CONTAINERS:
+            _shift_chunk_offsets(index, position + header, position + size, shift)
+        elif kind in (b"stco", b"co64"):
+            dtype = numpy.dtype(">u4" if kind == b"stco" else ">u8")
+            (count,) = struct.unpack_from(">I", index, position + header + 4)
+            offset = position + header + 8
+            offsets = numpy.frombuffer(index, dtype=dtype, count=count, offset=offset)
+            if count and int(offsets.max()) + shift >= 1 << (8 * dtype.itemsize):
+                raise ValueError("Chunk offsets of the video are too large")
+            shifted = offsets.astype(numpy.uint64) + shift
+            index[offset : offset + count * dtype.itemsize] = shifted.astype(
+                dtype
+            ).tobytes()
+
+
+def move_index_first(data: bytes) -> bytes:
+    """
+    Move the index of an MP4 before its media data, as needed to decode it
+    from a pipe, which can't be seeked back.
+
+    :param data: Content of the video file.
+
+    :return: The video, unchanged when its index already comes first or when
+        it is not an MP4
+    """
+    boxes = list(_boxes(data, 0, len(data)))
+    kinds = [kind for kind, *_ in boxes]
+    if b"moov" not in kinds or b"mdat" not in kinds:
+        return data
+    moov, mdat = kinds.index(b"moov"), kinds.index(b"mdat")
+    if moov < mdat:
+        return data
+
+    _, position, header, size = boxes[moov]
+    index = bytearray(data[position : position + size])
+    try:
+        _shift_chunk_offsets(index, header, size, size)
+    except (ValueError, struct.error):
+        return data
+
+    parts = []
+    for number, (_, position, _, size) in enumerate(boxes):
+        if number == mdat:
+            parts.append(bytes(index))
+        if number != moov:
+            parts.append(data[position : position + size])
+    return b"".join(parts)
+
+
+class VideoReader:
+    """
+    Decodes a video held in memory, frame by frame, through an ffmpeg pipe.
+
+    The video is fed to ffmpeg from a thread while frames are read from its
+    output, as PPM images carrying their own size, so that nothing is written
+    to disk. Frames are resampled to a constant rate, so they all last as long.
+    """
+
+    def __init__(self, data: bytes, fps: int = 25):
+        """
+        Start decoding a video, up to its first frame.
+
+        :param data: Content of the video file.
+        :param fps: Number of frames per second decoded, defaults to 25
+
+        :raises ValueError: No frame could be decoded
+        """
+        # Only needed for videos
+        import imageio_ffmpeg
+
+        self.fps = fps
+        self.duration = round(1000 / fps)
+        self.size = None
+        self.frames = 0
+        self._errors = b""
+        self._process = subprocess.Popen(
+            [
+                imageio_ffmpeg.get_ffmpeg_exe(),
+                "-v",
+                "error",
+                "-i",
+                "pipe:0",
+                "-an",
+                "-vf",
+                f"fps={fps}",
+                "-f",
+                "image2pipe",
+                "-vcodec",
+                "ppm",
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._threads = [
+            threading.Thread(
+                target=self._feed, args=(move_index_first(data),), daemon=True
+            ),
+            threading.Thread(target=self._collect_errors, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        self._first = self._read_frame()
+        if self._first is None:
+            self.close()
+            errors = self._errors.decode(errors="replace").strip()
+            raise ValueError(f"No frame could be decoded from the video: {errors}")
+        height, width, _ = self._first.shape
+        self.size = (width, height)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+    def _feed(self, data: bytes) -> None:
+        # ffmpeg may stop reading, having given up or been stopped
+        try:
+            self._process.stdin.write(data)
+        except BrokenPipeError:
+            pass
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def _collect_errors(self) -> None:
+        self._errors = self._process.stderr.read()
+
+    def _read_frame(self) -> numpy.ndarray:
+        """
+        Read the next frame, None at the end of the video.
+        """
+        stdout = self._process.stdout
+        header = [stdout.readline() for _ in range(3)]
+        if not header[-1].endswith(b"\n") or header[0] != b"P6\n":
+            return None
+        width, height = map(int, header[1].split())
+        size = width * height * 3
+        data = stdout.read(size)
+        if len(data) < size:
+            return None
+        return numpy.frombuffer(data, dtype=numpy.uint8).reshape(height, width, 3)
+
+    def __iter__(self):
+        """
+        Iterate the frames, as RGB arrays.
+        """
+        frame, self._first = self._first, None
+        while frame is not None:
+            self.frames += 1
+            yield frame
+            frame = self._read_frame()
+
+    def close(self) -> None:
+        """
+        Stop ffmpeg, frames not read yet are given up on.
+        """
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        for thread in self._threads:
+            thread.join()
+        self._process.stdout.close()
+        self._process.stderr.close()
@@ -0,0 +1,228 @@
+import logging
+import os
+import re
+import subprocess
+import threading
+
+from PIL import Image
+
+from mustachizer.tools.video_reader import move_index_first
+
+logger = logging.getLogger("stachlog")
+
+# Lines of the progress ffmpeg reports on its standard error, among its errors
+_PROGRESS_LINE = re.compile(rb"^[a-z0-9_]+=")
+
+
+class VideoWriter:
+    """
+    Encodes an H.264 MP4 frame by frame, as frames come, through an ffmpeg
+    pipe.
+
+    Frames are written to the standard input of ffmpeg while the video is read
+    from its standard output, so that only the frame being written is held in
+    memory. The MP4 is fragmented, its index coming first, as ffmpeg can't
+    seek back in a pipe. The audio of the source video, given on another pipe,
+    is copied as it is from MP4s and encoded in AAC from other containers, the
+    index of MP4s being moved first for the same reason.
+    """
+
+    def __init__(
+        self,
+        stream,
+        size: tuple,
+        fps: int = 30,
+        audio: bytes = None,
+        crf: int = 23,
+        preset: str = "veryfast",
+    ):
+        """
+        Start ffmpeg, nothing is written until the first frame.
+
+        :param stream: Binary stream the MP4 is written to.
+        :param size: Width and height of the video.
+        :param fps: Number of frames per second, frames all lasting as long,
+            defaults to 30
+        :param audio: Content of a video file whose audio is copied, defaults
+            to a video without sound
+        :param crf: Quality of the video, lower is better, defaults to 23
+        :param preset: Trade-off between encoding speed and size of the video,
+            defaults to "veryfast"
+        """
+        # Only needed for videos
+        import imageio_ffmpeg
+
+        self.stream = stream
+        self.size = tuple(size)
+        self.fps = fps
+        self.frames = 0
+        self.written = 0
+        self._errors = b""
+        width, height = self.size
+        command = [
+            imageio_ffmpeg.get_ffmpeg_exe(),
+            "-v",
+            "error",
+            "-progress",
+            "pipe:2",
+            "-nostats",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgb24",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            f"{fps}",
+            "-i",
+            "pipe:0",
+        ]
+
+        # The source is read on a pipe of its own, standard input being taken
+        audio_pipe = None
+        pass_fds = ()
+        if audio is not None:
+            audio = move_index_first(audio)
+            audio_pipe = os.pipe()
+            pass_fds = (audio_pipe[0],)
+            # Audio of other containers may not fit in an MP4
+            codec = "copy" if audio[4:8] == b"ftyp" else "aac"
+            command += ["-i", f"pipe:{audio_pipe[0]}", "-map", "0:v", "-map", "1:a?"]
+            command += ["-c:a", codec]
+
+        command += [
+            "-c:v",
+            "libx264",
+            "-preset",
+            preset,
+            "-crf",
+            f"{crf}",
+            "-pix_fmt",
+            "yuv420p",
+            # Chroma subsampling needs an even width and height
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-movflags",
+            "frag_keyframe+empty_moov+default_base_moof",
+            "-f",
+            "mp4",
+            "pipe:1",
+        ]
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=pass_fds,
+        )
+        self._threads = [
+            threading.Thread(target=self._copy_output, daemon=True),
+            threading.Thread(target=self._collect_errors, daemon=True),
+        ]
+        if audio_pipe is not None:
+            os.close(audio_pipe[0])
+            self._threads.append(
+                threading.Thread(
+                    target=self._feed_audio, args=(audio_pipe[1], audio), daemon=True
+                )
+            )
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @staticmethod
+    def _feed_audio(descriptor: int, audio: bytes) -> None:
+        # ffmpeg stops reading once the video ends
+        with open(descriptor, "wb") as pipe:
+            try:
+                pipe.write(audio)
+            except BrokenPipeError:
+                pass
+
+    def _copy_output(self) -> None:
+        for chunk in iter(lambda: self._process.stdout.read(2**16), b""):
+            self.stream.write(chunk)
+
+    def _collect_errors(self) -> None:
+        errors = []
+        for line in self._process.stderr:
+            if not _PROGRESS_LINE.match(line):
+                errors.append(line)
+            elif line.startswith(b"frame="):
+                self.written = int(line[6:])
+        self._errors = b"".join(errors)
+
+    def _error(self) -> RuntimeError:
+        errors = self._errors.decode(errors="replace").strip()
+        return RuntimeError(f"The video could not be encoded: {errors}")
+
+    def write(self, frame: Image, duration: int = 0, source=None) -> None:
+        """
+        Add a frame to the video.
+
+        :param frame: Frame of the size of the video.
+        :param duration: Ignored, frames last 1 / fps second
+        :param source: Ignored, every frame is encoded
+
+        :raises RuntimeError: ffmpeg stopped encoding
+        """
+        if frame.mode != "RGB":
+            frame = frame.convert("RGB")
+        try:
+            self._process.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            self.abort()
+            raise self._error() from None
+        self.frames += 1
+
+    def close(self) -> None:
+        """
+        Encode the last frames and end the video, the stream is left open.
+
+        :raises RuntimeError: ffmpeg failed to encode the video, or encoded
+            fewer frames than it was given
+        """
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._process.wait()
+        for thread in self._threads:
+            thread.join()
+        self._process.stdout.close()
+        self._process.stderr.close()
+        if self._process.returncode:
+            raise self._error()
+        if self.written < self.frames:
+            raise RuntimeError(
+                f"The video could not be encoded: {self.written} frame(s) of "
+                f"{self.frames} written. {self._errors.decode(errors='replace')}"
+            )
+        # The audio of the source may not have been read, ffmpeg ending well
+        if self._errors:
+            errors = self._errors.decode(errors="replace").strip()
+            logger.warning(f"Video encoded with errors: {errors}")
+
+    def abort(self) -> None:
+        """
+        Stop ffmpeg, the video written so far being incomplete.
+        """
+        if self._process.poll() is None:
+            self._process.kill()
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._process.wait()
+        for thread in self._threads:
+            thread.join()
+        self._process.stdout.close()
+        self._process.stderr.close()
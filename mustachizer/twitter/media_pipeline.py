@@ -0,0 +1,225 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger("stachlog")
+
+# Tells a thread to stop once the work queued before it is done
+_STOP = object()
+
+
+class PipelineStage:
+    """
+    Step the medias of mentions go through, run by its own threads.
+    """
+
+    def __init__(self, name: str, function, workers: int = 1, accepts=None):
+        """
+        Construct the stage.
+
+        :param name: Name of the stage, in logs and thread names
+        :param function: Called with a media and what the stage before returned
+            for it, None for the first stage, returns what is given to the next
+        :param workers: Number of threads running the stage, defaults to 1
+        :param accepts: Called with a media, whether it goes through the stage,
+            defaults to every media
+        """
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.accepts = accepts
+
+
+class _Mention:
+    """
+    A mention waiting for all its medias to go through the stages.
+    """
+
+    __slots__ = ("number", "context", "jobs", "remaining")
+
+    def __init__(self, number: int, context, medias: list):
+        self.number = number
+        self.context = context
+        self.jobs = [_Job(self, media) for media in medias]
+        self.remaining = len(self.jobs)
+
+
+class _Job:
+    """
+    A media of a mention, going from stage to stage.
+    """
+
+    __slots__ = ("mention", "media", "data", "error")
+
+    def __init__(self, mention: _Mention, media: dict):
+        self.mention = mention
+        self.media = media
+        self.data = None
+        self.error = None
+
+
+class MediaPipeline:
+    """
+    Take the medias of mentions through stages running side by side, then
+    reply to the mentions in the order they were submitted.
+
+    Each stage has its own threads, fed by a bounded queue: a slow stage holds
+    back the ones before it rather than letting medias pile up in memory. A
+    media failing a stage skips the stages after it and is left out of the
+    reply.
+    """
+
+    def __init__(
+        self,
+        stages: list,
+        reply,
+        max_queued: int = 8,
+        expected_errors: tuple = (),
+    ):
+        """
+        Construct the pipeline, threads are started by `start`.
+
+        :param stages: `PipelineStage` of each step, in order
+        :param reply: Called with the context of a mention, what the last
+            stage returned for each of its medias that went through them all,
+            and the exception of each of its medias that failed a stage
+        :param max_queued: Number of medias waiting for each stage, defaults
+            to 8
+        :param expected_errors: Exceptions of the stages only logged as
+            warnings, defaults to logging every exception as an error
+        """
+        self.stages = stages
+        self.reply = reply
+        self.expected_errors = tuple(expected_errors)
+        self._queues = [queue.Queue(maxsize=max_queued) for _ in stages]
+        self._replies = queue.Queue()
+        self._threads = [[] for _ in stages]
+        self._reply_thread = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.join()
+
+    def start(self) -> None:
+        """
+        Start the threads of every stage.
+        """
+        self._submitted = 0
+        for index, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"{stage.name}-{number}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads[index].append(thread)
+        self._reply_thread = threading.Thread(
+            target=self._reply_in_order, name="reply", daemon=True
+        )
+        self._reply_thread.start()
+
+    def submit(self, context, medias: list) -> None:
+        """
+        Send the medias of a mention through the stages.
+
+        Blocks while the first stage has too many medias waiting.
+
+        :param context: Given back to `reply` with the results
+        :param medias: Medias of the mention, results keep their order
+        """
+        mention = _Mention(self._submitted, context, medias)
+        self._submitted += 1
+        if not mention.jobs:
+            self._replies.put(mention)
+        for job in mention.jobs:
+            self._forward(job, 0)
+
+    def join(self) -> None:
+        """
+        Wait for every mention submitted to be replied to, then stop the threads.
+        """
+        # Stages are stopped in order, once nothing more can reach them
+        for stage_queue, threads in zip(self._queues, self._threads):
+            for _ in threads:
+                stage_queue.put(_STOP)
+            for thread in threads:
+                thread.join()
+            threads.clear()
+        if self._reply_thread is not None:
+            self._replies.put(_STOP)
+            self._reply_thread.join()
+            self._reply_thread = None
+
+    def depths(self) -> dict:
+        """
+        Number of medias waiting for each stage, by name of the stage.
+        """
+        return {
+            stage.name: stage_queue.qsize()
+            for stage, stage_queue in zip(self.stages, self._queues)
+        }
+
+    def _forward(self, job: _Job, first: int) -> None:
+        """
+        Queue a media for the next stage it goes through, if any.
+        """
+        for index in range(first, len(self.stages)):
+            accepts = self.stages[index].accepts
+            if accepts is None or accepts(job.media):
+                self._queues[index].put(job)
+                return
+        self._finish(job)
+
+    def _finish(self, job: _Job) -> None:
+        mention = job.mention
+        with self._lock:
+            mention.remaining -= 1
+            done = mention.remaining == 0
+        if done:
+            self._replies.put(mention)
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        stage_queue = self._queues[index]
+        while True:
+            job = stage_queue.get()
+            if job is _STOP:
+                return
+            try:
+                job.data = stage.function(job.media, job.data)
+            except self.expected_errors as error:
+                logger.warning(f"{error}")
+                job.error = error
+            except Exception as error:
+                logger.exception(f"Stage '{stage.name}' failed: {error}")
+                job.error = error
+
+            if job.error is None:
+                self._forward(job, index + 1)
+            else:
+                self._finish(job)
+
+    def _reply_in_order(self) -> None:
+        ready = {}
+        next_number = 0
+        while True:
+            mention = self._replies.get()
+            if mention is _STOP:
+                return
+            ready[mention.number] = mention
+            while next_number in ready:
+                mention = ready.pop(next_number)
+                next_number += 1
+                results = [job.data for job in mention.jobs if job.error is None]
+                errors = [job.error for job in mention.jobs if job.error is not None]
+                try:
+                    self.reply(mention.context, results, errors)
+                except Exception as error:
+                    logger.exception(f"Reply failed: {error}")
@@ -36,12 +36,16 @@ class TweepyWrapper:
 
     TWITTER_MEDIA_TYPES = {"photo", "animated_gif", "video"}
 
-    def __init__(self):
+    def __init__(self, poll_interval: float = 12):
         """
         Construct the Tweepy wrapper.
+
+        :param poll_interval: Seconds between two looks for new mentions,
+            defaults to 12
         """
         # Info
         self.info = None
+        self.poll_interval = poll_interval
 
         # Token
         self.token = None
@@ -115,7 +119,7 @@ class TweepyWrapper:
 
             if new_mentions:
                 break
-            sleep(12)
+            sleep(self.poll_interval)
 
         logger.info(f"{len(new_mentions)} new mention(s) found")
         return new_mentions
@@ -130,6 +134,16 @@ class TweepyWrapper:
         :param msg: text to post
         :param status_id: tweet's id to reply to
         """
+        self.check_medias(medias)
+        media_ids = [self.upload_media(media) for media in medias]
+        self.post_reply(media_ids=media_ids, msg=msg, status_id=status_id)
+
+    def check_medias(self, medias: list) -> None:
+        """
+        Check that medias can be posted together in a tweet.
+
+        :param medias: list of dict containing at least the twitter media type
+        """
         medias_types = {media["type"] for media in medias}
 
         # Check medias types
@@ -141,45 +155,75 @@ class TweepyWrapper:
             )
             raise MediaTypeError(error_message)
 
-        media_ids = []
-
         # All medias are photos
         if all(type_ == "photo" for type_ in medias_types):
-            for media in medias:
-                media_ids.append(
-                    self.api.media_upload(
-                        filename="",
-                        file=media["buffer"],
-                    ).media_id_string
-                )
+            return
 
         # All medias are GIF
-        elif all(type_ == "animated_gif" for type_ in medias_types):
-
+        if all(type_ == "animated_gif" for type_ in medias_types):
             if len(medias) != 1:
                 error_message = "Can't upload multiple gif in a single tweet."
                 raise MultipleUploadError(error_message)
-
-            for media in medias:
-                media_ids.append(
-                    self.api.chunked_upload(
-                        filename="",
-                        file=media["buffer"],
-                        file_type="image/gif",
-                        media_category="tweet_gif",
-                        wait_for_async_finalize=True,
-                    ).media_id_string
-                )
+            return
 
         # All medias are videos
-        elif all(type_ == "video" for type_ in medias_types):
-            error_message = "Mustachization of video is not yet implemented."
-            raise NotImplementedError(error_message)
+        if all(type_ == "video" for type_ in medias_types):
+            if len(medias) != 1:
+                error_message = "Can't upload multiple videos in a single tweet."
+                raise MultipleUploadError(error_message)
+            return
+
+        error_message = "Can't upload different type of media at the same time."
+        raise MixedMediasError(error_message)
 
-        else:
-            error_message = "Can't upload different type of media at the same time."
-            raise MixedMediasError(error_message)
+    def upload_media(self, media: dict) -> str:
+        """
+        Upload a media, to be attached to a reply.
+
+        :param media: dict containing media buffer and twitter media type
+
+        :return: id of the uploaded media
+        """
+        if media["type"] == "photo":
+            return self.api.media_upload(
+                filename="",
+                file=media["buffer"],
+            ).media_id_string
+
+        if media["type"] == "animated_gif":
+            return self.api.chunked_upload(
+                filename="",
+                file=media["buffer"],
+                file_type="image/gif",
+                media_category="tweet_gif",
+                wait_for_async_finalize=True,
+            ).media_id_string
+
+        if media["type"] == "video":
+            return self.api.chunked_upload(
+                filename="",
+                file=media["buffer"],
+                file_type="video/mp4",
+                media_category="tweet_video",
+                wait_for_async_finalize=True,
+            ).media_id_string
+
+        error_message = (
+            f"Invalid media type given: '{media['type']}'. "
+            f"Must be in {list(TweepyWrapper.TWITTER_MEDIA_TYPES)}."
+        )
+        raise MediaTypeError(error_message)
 
+    def post_reply(
+        self, media_ids: list = [], msg: str = "", status_id: str = ""
+    ) -> None:
+        """
+        Reply to a tweet with medias already uploaded.
+
+        :param media_ids: ids of the uploaded medias
+        :param msg: text to post
+        :param status_id: tweet's id to reply to
+        """
         # TODO use create_media_metadata() to add alt text to medias
 
         try:
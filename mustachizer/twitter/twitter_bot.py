@@ -1,22 +1,29 @@
 import logging
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from io import BytesIO
 from pathlib import Path
 from urllib.request import urlopen
 
 from dateutil import parser
-from moviepy.editor import VideoFileClip
 
+from mustachizer.batch_processor import _initialize_worker, _mustachize_data_in_worker
+from mustachizer.cache import ResultCache
 from mustachizer.errors import ImageIncorrectError, NoFaceFoundError
+from mustachizer.metrics import Metrics
 from mustachizer.mustache_applicator import MustacheApplicator
+from mustachizer.profiling import Profiler
+from mustachizer.tools.video_reader import is_video
 from mustachizer.twitter.errors import (
-    MediaTypeError,
-    MultipleUploadError,
+    MediaUploadError,
+    TweepyWrapperError,
     TweetNotReachable,
     TwitterConnectionError,
     TwitterTokenError,
 )
+from mustachizer.twitter.media_pipeline import MediaPipeline, PipelineStage
 from mustachizer.twitter.tweepy_wrapper import TweepyWrapper
 from mustachizer.utilities.sentence_provider import SentenceProvider
 
@@ -28,21 +35,89 @@ class BotTwitter:
     The Twiter Bot.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        cache_directory: Path = None,
+        detector: str = "haar",
+        tracking: bool = False,
+        detection_width: int = None,
+        workers: int = 1,
+        download_workers: int = 4,
+        upload_workers: int = 2,
+        max_queued: int = 8,
+        metrics: Metrics = None,
+        tweepy_wrapper: TweepyWrapper = None,
+        profiler: Profiler = None,
+    ):
         """
         Construct twitter's StacheBot.
+
+        :param cache_directory: Where mustachized medias are cached on disk,
+            defaults to caching them in memory only
+        :param detector: Name of the backend detecting faces, defaults to "haar"
+        :param tracking: Whether faces of animations are followed from frame to
+            frame rather than detected on each of them, defaults to False
+        :param detection_width: Width wider medias are downscaled to before
+            detecting faces, defaults to detecting them at full resolution
+        :param workers: Number of processes mustachizing medias, 0 for one per
+            CPU, 1 to stay in the current process, defaults to 1
+        :param download_workers: Number of medias downloaded at once, defaults
+            to 4
+        :param upload_workers: Number of medias uploaded at once, defaults to 2
+        :param max_queued: Number of medias waiting for each stage of the
+            processing of mentions, defaults to 8
+        :param metrics: Where the time spent mustachizing medias is measured,
+            defaults to measuring nothing
+        :param tweepy_wrapper: Wrapper of the API the bot talks to, defaults to
+            one connecting to Twitter with the credentials file
+        :param profiler: Where each mustachization is profiled, in the processes
+            mustachizing medias, defaults to profiling nothing
         """
         # Set up
         self.last_datetime = datetime.now(timezone.utc)
-        self.mustachizer = MustacheApplicator(debug=False)
+        options = {
+            "debug": False,
+            "tracking": tracking,
+            "detection_width": detection_width,
+            "detector": detector,
+            "video_format": "MP4",
+        }
+        self.mustachizer = MustacheApplicator(
+            cache=ResultCache(directory=cache_directory),
+            metrics=metrics,
+            profiler=profiler,
+            **options,
+        )
         self.sentence_provider = SentenceProvider()
 
+        # Processing of mentions
+        self.workers = workers if workers > 0 else os.cpu_count()
+        self.download_workers = download_workers
+        self.upload_workers = upload_workers
+        self.max_queued = max_queued
+        self._executor = None
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_initialize_worker,
+                initargs=(
+                    "",
+                    {
+                        **options,
+                        "metrics": metrics and metrics.for_workers(),
+                        "profiler": profiler and profiler.for_workers(),
+                    },
+                ),
+            )
+
         # Tweepy configuration
-        try:
-            self.tweepy_wrapper = TweepyWrapper()
-        except TwitterTokenError as error:
-            logger.error(error)
-            sys.exit(1)
+        self.tweepy_wrapper = tweepy_wrapper
+        if self.tweepy_wrapper is None:
+            try:
+                self.tweepy_wrapper = TweepyWrapper()
+            except TwitterTokenError as error:
+                logger.error(error)
+                sys.exit(1)
 
     def run(self) -> None:
         """
@@ -62,50 +137,110 @@ class BotTwitter:
             )
             self.process_mentions(mentions)
 
+    def close(self) -> None:
+        """
+        Stop the processes mustachizing medias, if any.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def create_pipeline(self) -> MediaPipeline:
+        """
+        Build the stages the medias of mentions go through.
+        """
+        stages = [
+            PipelineStage(
+                "download",
+                lambda media, _: self.download_media(self.media_url(media)),
+                workers=self.download_workers,
+            ),
+            PipelineStage(
+                "mustachize",
+                lambda _, data: self.mustachize_media(data),
+                workers=self.workers,
+            ),
+            PipelineStage(
+                "upload",
+                lambda media, buffer: self.tweepy_wrapper.upload_media(
+                    {"buffer": buffer, "type": self.mustachized_type(media, buffer)}
+                ),
+                workers=self.upload_workers,
+            ),
+        ]
+        return MediaPipeline(
+            stages,
+            reply=self.reply,
+            max_queued=self.max_queued,
+            expected_errors=(
+                NoFaceFoundError,
+                ImageIncorrectError,
+                MediaUploadError,
+                OSError,
+            ),
+        )
+
     def process_mentions(self, mentions: list):
-        for tweet in mentions:
-            # TODO except error from get_tweet_containing_medias
-            tweet_with_medias = self.get_tweet_containing_medias(tweet=tweet)
-
-            # Update datetime with datetime of last mention
-            self.last_datetime = max(
-                self.last_datetime,
-                parser.parse(tweet["created_at"]),
-            )
+        """
+        Reply to mentions, their medias processed side by side.
 
-            # Bad case :(
-            if not tweet_with_medias:
-                logger.info("Tweet ignored")
-                continue
+        Replies are posted in the order of the mentions, with the medias in
+        the order of the tweets.
 
-            # Mustachize
-            try:
-                medias = self.mustachize_medias(
-                    medias=tweet_with_medias["extended_entities"]["media"]
-                )
-                if medias:
-                    message = self.sentence_provider.provide()
-                else:
-                    message = "No face found. Can't mustachize :("
-            except NotImplementedError as error:
-                medias = []
-                message = error
-
-            # Reply
-            try:
-                self.tweepy_wrapper.reply_to_status(
-                    medias=medias, msg=message, status_id=tweet["id_str"]
+        :param mentions: Tweets mentioning the bot.
+        """
+        with self.create_pipeline() as pipeline:
+            for tweet in mentions:
+                # TODO except error from get_tweet_containing_medias
+                tweet_with_medias = self.get_tweet_containing_medias(tweet=tweet)
+
+                # Update datetime with datetime of last mention
+                self.last_datetime = max(
+                    self.last_datetime,
+                    parser.parse(tweet["created_at"]),
                 )
-                logger.info("Replied to the mention with the mustachized media(s)")
-            except (
-                TweetNotReachable,
-                MultipleUploadError,
-                NotImplementedError,
-                MediaTypeError,
-            ) as error:
-                logger.error(f"{error}")
+
+                # Bad case :(
+                if not tweet_with_medias:
+                    logger.info("Tweet ignored")
+                    continue
+
+                medias = tweet_with_medias["extended_entities"]["media"]
+                logger.info(f"Medias found: {len(medias)}")
+                try:
+                    self.tweepy_wrapper.check_medias(medias)
+                except TweepyWrapperError as error:
+                    logger.error(f"{error}")
+                    continue
+                pipeline.submit(tweet["id_str"], medias)
+
+        logger.info("All mentions processed")
+        logger.debug(f"Cache: {self.mustachizer.cache.stats}")
+
+    def reply(self, status_id: str, media_ids: list, errors: list = ()) -> None:
+        """
+        Reply to a mention with its medias once mustachized and uploaded.
+
+        A mention none of whose medias made it is told so only when no face
+        was found on them, others failing for reasons of our own.
+
+        :param status_id: Id of the tweet to reply to
+        :param media_ids: Ids of the uploaded medias
+        :param errors: Exceptions of the medias that failed, defaults to none
+        """
+        if media_ids:
+            message = self.sentence_provider.provide()
+        elif errors and all(isinstance(error, NoFaceFoundError) for error in errors):
+            message = "No face found. Can't mustachize :("
         else:
-            logger.info("All mentions processed")
+            logger.error(f"Mention {status_id} not replied to, no media uploaded")
+            return
+        try:
+            self.tweepy_wrapper.post_reply(
+                media_ids=media_ids, msg=message, status_id=status_id
+            )
+            logger.info("Replied to the mention with the mustachized media(s)")
+        except TweetNotReachable as error:
+            logger.error(f"{error}")
 
     def get_tweet_containing_medias(self, tweet: dict) -> dict:
         """
@@ -141,88 +276,84 @@ class BotTwitter:
         logger.info("Mention type not supported")
         return {}
 
-    def download_media_from_url(
-        self, url: str, media_type: str, tmp_folder: Path = Path("/tmp")
-    ) -> BytesIO:
+    def download_media(self, url: str) -> bytes:
         """
         Download media from url.
 
         :param url: url's media.
-        :param media_type: media must be converted to gif.
-        :tmp_folder: where to save temporary video files when converting to gif.
 
         :return: downloaded media
         """
-        logger.info("Download media from url")
-
-        file = urlopen(url)
-        if media_type == "photo":
-            return file.read()
-
-        # TODO tmp must be in mustachizer folder
-        # TODO no tmp folder at all, use BytesIO object
-        try:
-            tmp_filepath = Path(tmp_folder)
-            logger.debug("Temporary save the file as a video")
-            with open(tmp_filepath / "video_to_gif", "wb") as save_file:
-                save_file.write(file.read())
-            clip = VideoFileClip(
-                filename=f"{tmp_filepath}/video_to_gif",
-                audio=False,
-            )
-            logger.debug("Convert the video into gif")
-            clip.write_gif(
-                filename=tmp_filepath / "output.gif",
-                fps=None,
-                program="ffmpeg",
-                logger=None,
-            )
-            return open(tmp_filepath / "output.gif", "rb").read()
-        # TODO do not return BytesIO() object but raise exception instead
-        except OSError as error:
-            logger.error(f"{error}")
-            return BytesIO()
+        logger.info(f"Download media from {url}")
+        return urlopen(url).read()
 
-    def mustachize_medias(self, medias: list) -> list:
+    def media_url(self, media: dict) -> str:
         """
-        Put mustaches on medias.
+        Url to download a media from, the MP4 of the highest bitrate for videos.
 
-        :param medias: list of medias to mustachize
+        :param media: media of a tweet
         """
-        logger.info(f"Medias found: {len(medias)}")
-
-        mustachized_medias = []
-        for media in medias:
-            media_type = media["type"]
+        if media["type"] == "photo":
+            return media["media_url_https"]
+
+        variants = [
+            variant
+            for variant in media["video_info"]["variants"]
+            if variant.get("content_type", "video/mp4") == "video/mp4"
+        ]
+        variant = max(variants, key=lambda variant: variant.get("bitrate", 0))
+        return variant["url"]
+
+    @staticmethod
+    def mustachized_type(media: dict, buffer: BytesIO) -> str:
+        """
+        Twitter media type of a mustachized media, animated gifs coming out
+        as videos.
 
-            if media_type == "photo":
-                url = media["media_url_https"]
+        :param media: media of a tweet
+        :param buffer: the media once mustachized
+        """
+        if is_video(buffer.getvalue()[:12]):
+            return "video"
+        return media["type"]
 
-            if media_type == "animated_gif":
-                url = media["video_info"]["variants"][0]["url"]
+    def mustachize_media(self, data: bytes) -> BytesIO:
+        """
+        Put mustaches on a downloaded media, on a process of the pool if any.
+        Videos, animated gifs included, come out as MP4s with their sound.
 
-            if media_type == "video":
-                error_message = "Media is a video and videos are not yet supported"
-                logger.error(f"{error_message}")
-                raise NotImplementedError(error_message)
+        :param data: downloaded media
 
-            logger.info(f"Processing {url}")
-            logger.debug(f"Twitter media type: {media_type.replace('_',' ')}")
+        :raises NoFaceFoundError: No face has been found on the media
+        :raises ImageIncorrectError: The media is not in the correct format
 
-            # TODO raise exception in download_media_from_url()
-            image_buffer = self.download_media_from_url(
-                url=url,
-                media_type=media_type,
-            )
-            try:
-                mustachized_media = self.mustachizer.mustachize(BytesIO(image_buffer))
-                mustachized_medias.append(
-                    {"buffer": mustachized_media, "type": media_type}
-                )
-            except (NoFaceFoundError, ImageIncorrectError) as error:
-                logger.warning(f"{error}")
+        :return: mustachized media
+        """
+        if self._executor is None:
+            return self.mustachizer.mustachize(BytesIO(data))
+
+        # Mustachized medias are cached in this process, for every worker
+        cache = self.mustachizer.cache
+        key, seed = ResultCache.media_key(
+            data,
+            "RANDOM",
+            "realist",
+            video_format=self.mustachizer.video_format,
+            options=self.mustachizer.output_options,
+        )
+        cached = cache.lookup(key)
+        if cached is not None:
+            return BytesIO(cached)
 
-        return mustachized_medias
+        try:
+            result = self._executor.submit(
+                _mustachize_data_in_worker, data, "RANDOM", "realist", seed
+            ).result()
+        except NoFaceFoundError as error:
+            cache.store(key, error)
+            raise
+        cache.store(key, result)
+        return BytesIO(result)
 
     def get_tweet_object(self, id: str) -> dict:
         return self.tweepy_wrapper.api.lookup_statuses(id=[id])[0]._json
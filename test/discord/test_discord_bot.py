@@ -0,0 +1,74 @@
+import asyncio
+import io
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import AsyncMock, Mock, patch
+
+from mustachizer.discord.discord_bot import DiscordBot
+from mustachizer.errors import ImageIncorrectError, NoFaceFoundError
+
+
+def attachment(data: bytes, filename: str, content_type: str = "image/png"):
+    """
+    Attachment of a message, saved with `data`.
+    """
+
+    async def save(buffer):
+        buffer.write(data)
+        buffer.seek(0)
+
+    return Mock(filename=filename, content_type=content_type, save=save)
+
+
+async def fake_mustachize_async(image_buffer):
+    data = image_buffer.read()
+    if data == b"incorrect":
+        raise ImageIncorrectError("Incorrect image")
+    if data == b"no face":
+        raise NoFaceFoundError("No face found in media.")
+    if data == b"crash":
+        raise BrokenProcessPool("A process terminated abruptly")
+    return io.BytesIO(data[::-1])
+
+
+class TestDiscordBot(unittest.TestCase):
+    """
+    Test `mustachizer.discord.discord_bot.DiscordBot`.
+    """
+
+    def setUp(self):
+        applicator = Mock()
+        applicator.mustachize_async = AsyncMock(side_effect=fake_mustachize_async)
+        with patch(
+            "mustachizer.discord.discord_bot.AsyncMustacheApplicator",
+            return_value=applicator,
+        ):
+            self.discord_bot = DiscordBot()
+
+    def mustachize_attachments(self, *attachments):
+        message = Mock(attachments=list(attachments))
+        return asyncio.run(self.discord_bot.mustachize_attachments(message))
+
+    def test_mustachize_attachments(self):
+        files = self.mustachize_attachments(
+            attachment(b"image", "image.png"),
+            attachment(b"text", "notes.txt", content_type="text/plain"),
+            attachment(b"no face", "landscape.png"),
+        )
+        self.assertEqual([file.filename for file in files], ["image.png"])
+        self.assertEqual(files[0].fp.read(), b"egami")
+
+    def test_failing_attachment(self):
+        # The other attachments of the message are still mustachized
+        for data in [b"incorrect", b"crash"]:
+            with self.subTest(data=data):
+                with self.assertLogs("stachlog") as logs:
+                    files = self.mustachize_attachments(
+                        attachment(data, "bad.png"), attachment(b"image", "good.png")
+                    )
+                self.assertEqual([file.filename for file in files], ["good.png"])
+                self.assertIn("bad.png", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
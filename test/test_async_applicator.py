@@ -0,0 +1,119 @@
+import asyncio
+import io
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+from mustachizer.async_applicator import AsyncMustacheApplicator
+from mustachizer.cache import ResultCache
+from mustachizer.errors import MustachizeTimeoutError, NoFaceFoundError
+
+
+class FakeMustachize:
+    """
+    Blocking mustachization, counting how many run at the same time.
+    """
+
+    def __init__(self, duration: float = 0.2):
+        self.duration = duration
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, image_buffer, mustache_name, mustache_size, seed):
+        data = image_buffer.read()
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.duration)
+        with self._lock:
+            self.running -= 1
+        if data == b"no face":
+            raise NoFaceFoundError("No face found in media.")
+        return io.BytesIO(data[::-1])
+
+
+@patch("mustachizer.async_applicator.ProcessPoolExecutor", ThreadPoolExecutor)
+class TestAsyncMustacheApplicator(unittest.TestCase):
+    """
+    Test `mustachizer.async_applicator.AsyncMustacheApplicator`.
+    """
+
+    def setUp(self):
+        self.mustachize = FakeMustachize()
+        applicator = Mock()
+        applicator.mustachize.side_effect = self.mustachize
+        patcher = patch(
+            "mustachizer.batch_processor.MustacheApplicator", return_value=applicator
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_applicator(self, coroutine, **parameters):
+        applicator = AsyncMustacheApplicator(**parameters)
+        try:
+            return asyncio.run(coroutine(applicator))
+        finally:
+            applicator.close()
+
+    def test_event_loop_not_blocked(self):
+        async def mustachize(applicator):
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(tick())
+            result = await applicator.mustachize_async(io.BytesIO(b"media"))
+            ticker.cancel()
+            return result, ticks
+
+        result, ticks = self.run_applicator(mustachize)
+        self.assertEqual(result.getvalue(), b"aidem")
+        self.assertGreater(ticks, 5)
+
+    def test_concurrency(self):
+        async def mustachize(applicator):
+            return await asyncio.gather(
+                *(applicator.mustachize_async(io.BytesIO(b"%d" % i)) for i in range(4))
+            )
+
+        results = self.run_applicator(mustachize, workers=4, max_concurrency=2)
+        self.assertEqual(
+            [result.getvalue() for result in results], [b"0", b"1", b"2", b"3"]
+        )
+        self.assertEqual(self.mustachize.max_running, 2)
+
+    def test_timeout(self):
+        async def mustachize(applicator):
+            with self.assertRaises(MustachizeTimeoutError):
+                await applicator.mustachize_async(io.BytesIO(b"media"))
+
+            # Timeout of the request rather than of the applicator
+            result = await applicator.mustachize_async(io.BytesIO(b"media"), timeout=1)
+            return result
+
+        result = self.run_applicator(mustachize, timeout=0.05)
+        self.assertEqual(result.getvalue(), b"aidem")
+
+    def test_cache(self):
+        async def mustachize(applicator):
+            for _ in range(2):
+                result = await applicator.mustachize_async(io.BytesIO(b"media"))
+                self.assertEqual(result.getvalue(), b"aidem")
+                with self.assertRaises(NoFaceFoundError):
+                    await applicator.mustachize_async(io.BytesIO(b"no face"))
+
+        self.run_applicator(mustachize, cache=ResultCache())
+        self.assertEqual(self.mustachize.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
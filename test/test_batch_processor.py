@@ -0,0 +1,169 @@
+import io
+import sys
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from mustachizer.batch_processor import (
+    BatchProcessor,
+    iter_directory,
+    iter_manifest,
+    mustachize_file,
+)
+from mustachizer.errors import NoFaceFoundError
+
+MEDIAS_FOLDER = Path("assets", "tests_medias")
+FILES = [
+    MEDIAS_FOLDER / "test1.jpg",
+    MEDIAS_FOLDER / "test2.jpg",
+    MEDIAS_FOLDER / "test3.jpg",
+    MEDIAS_FOLDER / "test_no_face.jpg",
+]
+
+
+def fake_mustachize(image_buffer, mustache_name, mustache_size):
+    """
+    Return the size of the media as result.
+    """
+    size = len(image_buffer.read())
+    return io.BytesIO(f"{size}".encode())
+
+
+class TestBatchProcessor(unittest.TestCase):
+    """
+    Test `mustachizer.batch_processor`.
+    """
+
+    def setUp(self):
+        self.applicator = Mock()
+        self.applicator.mustachize.side_effect = fake_mustachize
+        patcher = patch(
+            "mustachizer.batch_processor.MustacheApplicator",
+            return_value=self.applicator,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_mustachize_file(self):
+        # File mustachized
+        result = mustachize_file(self.applicator, FILES[0])
+        self.assertEqual(result["file"], FILES[0])
+        self.assertEqual(result["buffer"], f"{FILES[0].stat().st_size}".encode())
+        self.assertIsNone(result["error"])
+
+        # File not found
+        result = mustachize_file(self.applicator, MEDIAS_FOLDER / "missing.jpg")
+        self.assertEqual(result["error"], "File not found")
+
+        # Extension not supported
+        result = mustachize_file(self.applicator, Path("README.md"))
+        self.assertEqual(result["error"], "Extension '.md' is not supported")
+
+        # No face found
+        self.applicator.mustachize.side_effect = NoFaceFoundError("No face")
+        result = mustachize_file(self.applicator, FILES[0])
+        self.assertIsNone(result["buffer"])
+        self.assertEqual(result["error"], "No face")
+
+        # Unexpected error
+        self.applicator.mustachize.side_effect = OSError("Disk failure")
+        with self.assertLogs("stachlog", "ERROR"):
+            result = mustachize_file(self.applicator, FILES[0])
+        self.assertIsNone(result["buffer"])
+        self.assertEqual(result["error"], "OSError: Disk failure")
+
+    def test_process(self):
+        results = list(BatchProcessor(jobs=1).process(FILES))
+        self.assertEqual([result["file"] for result in results], FILES)
+        self.applicator.face_finder.load_models.assert_not_called()
+
+    @patch("mustachizer.batch_processor.ProcessPoolExecutor", ThreadPoolExecutor)
+    def test_process_jobs(self):
+        # Results in the order of the files
+        results = list(BatchProcessor(jobs=2, ordered=True).process(iter(FILES)))
+        self.assertEqual([result["file"] for result in results], FILES)
+        self.applicator.face_finder.load_models.assert_called()
+
+        # Results as soon as they are ready, the first file held back until
+        # the others are
+        release = threading.Event()
+
+        def mustachize(image_buffer, mustache_name, mustache_size):
+            if image_buffer.name == str(FILES[0]):
+                release.wait(10)
+            return fake_mustachize(image_buffer, mustache_name, mustache_size)
+
+        self.applicator.mustachize.side_effect = mustachize
+        results = BatchProcessor(jobs=4, ordered=False).process(iter(FILES))
+        files = [next(results)["file"] for _ in FILES[1:]]
+        release.set()
+        files += [result["file"] for result in results]
+        self.assertCountEqual(files, FILES)
+        self.assertEqual(files[-1], FILES[0])
+
+    @patch("mustachizer.batch_processor.ProcessPoolExecutor", ThreadPoolExecutor)
+    def test_process_bounded(self):
+        consumed = []
+
+        def files():
+            for file in FILES * 3:
+                consumed.append(file)
+                yield file
+
+        results = BatchProcessor(jobs=2, max_pending=3).process(files())
+        next(results)
+        self.assertLessEqual(len(consumed), 3)
+        self.assertEqual(len(list(results)), len(FILES) * 3 - 1)
+
+    def test_iter_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            (directory / "sub").mkdir()
+            for name in ["a.jpg", "b.PNG", "c.txt", "sub/d.gif", "sub/e.jpg"]:
+                (directory / name).touch()
+
+            self.assertCountEqual(
+                iter_directory(directory),
+                [directory / "a.jpg", directory / "b.PNG"],
+            )
+            self.assertCountEqual(
+                iter_directory(directory, recursive=True),
+                [
+                    directory / "a.jpg",
+                    directory / "b.PNG",
+                    directory / "sub" / "d.gif",
+                    directory / "sub" / "e.jpg",
+                ],
+            )
+            self.assertCountEqual(
+                iter_directory(directory, recursive=True, patterns=["*.jpg", "c*"]),
+                [
+                    directory / "a.jpg",
+                    directory / "c.txt",
+                    directory / "sub" / "e.jpg",
+                ],
+            )
+
+    def test_iter_manifest(self):
+        lines = "a.jpg\n\n# Comment\n  folder/b.png  \n"
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as manifest:
+            manifest.write(lines)
+            manifest.flush()
+            self.assertEqual(
+                list(iter_manifest(Path(manifest.name))),
+                [Path("a.jpg"), Path("folder/b.png")],
+            )
+
+        # Manifest from standard input
+        with patch.object(sys, "stdin", io.StringIO(lines)):
+            self.assertEqual(
+                list(iter_manifest("-")),
+                [Path("a.jpg"), Path("folder/b.png")],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
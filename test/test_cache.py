@@ -0,0 +1,215 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from mustachizer.cache import DiskCache, LRUCache, ResultCache
+from mustachizer.errors import NoFaceFoundError
+from mustachizer.mustache_applicator import MustacheApplicator
+
+IMAGE_FILEPATH = Path("assets", "tests_medias", "test1.jpg")
+
+
+class TestLRUCache(unittest.TestCase):
+    """
+    Test `mustachizer.cache.LRUCache`.
+    """
+
+    def test_cache(self):
+        cache = LRUCache(max_size=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        self.assertEqual(cache.get("a"), b"aaaa")
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Least recently used entry is evicted
+        cache.put("c", b"cccc")
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.size, 8)
+
+        # Entry replaced
+        cache.put("c", b"cc")
+        self.assertEqual(cache.get("c"), b"cc")
+        self.assertEqual(cache.size, 6)
+
+        # Entry bigger than the cache
+        cache.put("d", b"d" * 11)
+        self.assertNotIn("d", cache)
+        self.assertEqual(len(cache), 2)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+
+class TestDiskCache(unittest.TestCase):
+    """
+    Test `mustachizer.cache.DiskCache`.
+    """
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DiskCache(directory, max_size=10)
+            cache.put("a", b"aaaa")
+            cache.put("b", b"bbbb")
+            self.assertEqual(cache.get("a"), b"aaaa")
+            self.assertIsNone(cache.get("c"))
+
+            # Least recently used file is evicted
+            cache.put("c", b"cccc")
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(len(list(Path(directory).iterdir())), 2)
+
+            # Entries are taken over by a new cache
+            cache = DiskCache(directory, max_size=4)
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(cache.get("c"), b"cccc")
+            self.assertEqual(cache.size, 4)
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Test `mustachizer.cache.ResultCache`.
+    """
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(memory_size=10, directory=directory, disk_size=100)
+            key = ResultCache.key(ResultCache.hash(b"image"), "RANDOM", "big", 1)
+            self.assertNotEqual(
+                key, ResultCache.key(ResultCache.hash(b"image"), "RANDOM", "big", 2)
+            )
+            self.assertIsNone(cache.get(key))
+            cache.put(key, b"mustachized")
+
+            # Too big to stay in memory, found on disk
+            self.assertEqual(cache.get(key), b"mustachized")
+            self.assertEqual(cache.stats["disk_hits"], 1)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lookup(self):
+        cache = ResultCache()
+        self.assertIsNone(cache.lookup("a"))
+        cache.store("a", b"mustachized")
+        self.assertEqual(cache.lookup("a"), b"mustachized")
+
+        # Medias without face are cached, not other failures
+        cache.store("b", NoFaceFoundError())
+        with self.assertRaises(NoFaceFoundError):
+            cache.lookup("b")
+        cache.store("c", OSError())
+        self.assertIsNone(cache.lookup("c"))
+
+    def test_media_key(self):
+        image = IMAGE_FILEPATH.read_bytes()
+        video = b"\x00\x00\x00\x20ftypisom" + b"\x00" * 20
+
+        # Videos written as MP4s are other results than as GIFs
+        self.assertNotEqual(
+            ResultCache.media_key(video, "RANDOM", "big"),
+            ResultCache.media_key(video, "RANDOM", "big", video_format="MP4"),
+        )
+        self.assertEqual(
+            ResultCache.media_key(image, "RANDOM", "big"),
+            ResultCache.media_key(image, "RANDOM", "big", video_format="MP4"),
+        )
+
+        # Options changing the mustachized media are part of the key
+        self.assertNotEqual(
+            ResultCache.media_key(image, "RANDOM", "big"),
+            ResultCache.media_key(image, "RANDOM", "big", options={"tracking": True}),
+        )
+        self.assertEqual(
+            ResultCache.media_key(image, "RANDOM", "big"),
+            ResultCache.media_key(
+                image, "RANDOM", "big", options={"detector": "haar", "workers": 2}
+            ),
+        )
+
+    @patch("cv2.face.createFacemarkLBF")
+    def test_mustachize(self, _):
+        applicator = MustacheApplicator(cache=ResultCache())
+        data = IMAGE_FILEPATH.read_bytes()
+        with patch.object(
+            MustacheApplicator,
+            "_mustachize",
+            return_value=io.BytesIO(b"mustachized"),
+        ) as patched_mustachize:
+            # Computed once
+            for _ in range(3):
+                image = applicator.mustachize(io.BytesIO(data))
+                self.assertEqual(image.read(), b"mustachized")
+            patched_mustachize.assert_called_once()
+            self.assertEqual(applicator.cache.hits, 2)
+
+            # Random mustaches are derived from the image unless seeded
+            applicator.mustachize(io.BytesIO(data), seed=42)
+            self.assertEqual(patched_mustachize.call_count, 2)
+            self.assertEqual(
+                patched_mustachize.call_args[0][3].random(), 0.6394267984578837
+            )
+
+            # Another mustache
+            applicator.mustachize(io.BytesIO(data), mustache_name="BAMBINO")
+            self.assertEqual(patched_mustachize.call_count, 3)
+
+        # Media without face
+        with patch.object(
+            MustacheApplicator, "_mustachize", side_effect=NoFaceFoundError
+        ) as patched_mustachize:
+            for _ in range(2):
+                with self.assertRaises(NoFaceFoundError):
+                    applicator.mustachize(io.BytesIO(b"no face"))
+            patched_mustachize.assert_called_once()
+
+    @patch("cv2.face.createFacemarkLBF")
+    def test_faces_given(self, _):
+        applicator = MustacheApplicator(cache=ResultCache())
+        data = IMAGE_FILEPATH.read_bytes()
+
+        def mustachize(image_buffer, name, size, rng, faces):
+            return io.BytesIO(b"given" if faces is not None else b"found")
+
+        with patch.object(
+            MustacheApplicator, "_mustachize", side_effect=mustachize
+        ) as patched_mustachize:
+            found = applicator.mustachize(io.BytesIO(data))
+            self.assertEqual(found.read(), b"found")
+
+            # Neither answered from the cache nor stored in it
+            given = applicator.mustachize(io.BytesIO(data), faces=[[]])
+            self.assertEqual(given.read(), b"given")
+            found = applicator.mustachize(io.BytesIO(data))
+            self.assertEqual(found.read(), b"found")
+            self.assertEqual(patched_mustachize.call_count, 2)
+            self.assertEqual(applicator.cache.hits, 1)
+
+    @patch("cv2.face.createFacemarkLBF")
+    def test_detectors_not_shared(self, _):
+        with tempfile.TemporaryDirectory() as directory:
+            haar = MustacheApplicator(cache=ResultCache(directory=directory))
+            yunet = MustacheApplicator(
+                cache=ResultCache(directory=directory), detector="yunet"
+            )
+            data = IMAGE_FILEPATH.read_bytes()
+
+            # No face found with a detector, still searched with the other
+            with patch.object(
+                MustacheApplicator, "_mustachize", side_effect=NoFaceFoundError
+            ):
+                with self.assertRaises(NoFaceFoundError):
+                    haar.mustachize(io.BytesIO(data))
+            with patch.object(
+                MustacheApplicator,
+                "_mustachize",
+                return_value=io.BytesIO(b"mustachized"),
+            ) as patched_mustachize:
+                image = yunet.mustachize(io.BytesIO(data))
+                self.assertEqual(image.read(), b"mustachized")
+                patched_mustachize.assert_called_once()
+            self.assertEqual(yunet.cache.hits, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import io
+import json
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from test.test_mustache_applicator import find_one_face
+from unittest.mock import patch
+from urllib.request import urlopen
+
+import numpy
+
+from mustachizer import metrics
+from mustachizer.errors import NoFaceFoundError
+from mustachizer.metrics import (
+    Histogram,
+    JsonLinesSink,
+    Metrics,
+    MetricsSink,
+    PrometheusSink,
+)
+from mustachizer.mustache_applicator import MustacheApplicator
+from mustachizer.tools.face_finder import FaceFinder
+
+MEDIAS_FOLDER = Path("assets", "tests_medias")
+
+# Metrics of the current worker process
+_worker_metrics = None
+
+
+def _initialize_worker(worker_metrics: Metrics) -> None:
+    global _worker_metrics
+    _worker_metrics = worker_metrics
+
+
+def _measure_in_worker(frames: int) -> None:
+    with _worker_metrics.measure():
+        metrics.describe(frames=frames)
+
+
+class ListSink(MetricsSink):
+    """
+    Keeps the measurements it receives.
+    """
+
+    def __init__(self):
+        self.measurements = []
+
+    def record(self, measurement: dict) -> None:
+        self.measurements.append(measurement)
+
+
+class TestHistogram(unittest.TestCase):
+    """
+    Test `mustachizer.metrics.Histogram`.
+    """
+
+    def test_observe(self):
+        histogram = Histogram((1, 5, 10))
+        for value in [0.5, 1, 3, 7, 20]:
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative_counts(), [2, 3, 4, 5])
+        self.assertEqual((histogram.count, histogram.sum), (5, 31.5))
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Test `mustachizer.metrics.Metrics`.
+    """
+
+    def test_measure(self):
+        sink = ListSink()
+        with Metrics([sink]).measure() as measurement:
+            with metrics.stage("detect"):
+                sum(range(1000))
+            with metrics.stage("detect"):
+                pass
+            metrics.describe("PNG", (20, 10), 1, 2)
+        self.assertIsNotNone(measurement)
+
+        (recorded,) = sink.measurements
+        self.assertEqual(recorded["outcome"], "mustachized")
+        self.assertEqual(recorded["stages"]["detect"]["calls"], 2)
+        self.assertGreater(recorded["stages"]["detect"]["wall"], 0)
+        self.assertGreaterEqual(recorded["wall"], recorded["stages"]["detect"]["wall"])
+        self.assertEqual(
+            (recorded["format"], recorded["width"], recorded["height"]),
+            ("PNG", 20, 10),
+        )
+        self.assertEqual((recorded["frames"], recorded["faces"]), (1, 2))
+
+        # Outcome of failed medias
+        for error, outcome in [(NoFaceFoundError, "no_face"), (ValueError, "error")]:
+            with self.assertRaises(error):
+                with Metrics([sink]).measure():
+                    raise error()
+            self.assertEqual(sink.measurements[-1]["outcome"], outcome)
+
+    def test_disabled(self):
+        with Metrics().measure() as measurement:
+            self.assertIsNone(measurement)
+            with metrics.stage("detect") as timer:
+                self.assertIsNone(timer)
+            metrics.describe("PNG")
+        self.assertIsNone(Metrics().for_workers())
+
+    def test_failing_sink(self):
+        failing, sink = MetricsSink(), ListSink()
+        with self.assertLogs("stachlog", level="ERROR"):
+            with Metrics([failing, sink]).measure():
+                pass
+        self.assertEqual(len(sink.measurements), 1)
+
+    def test_for_workers(self):
+        sink = ListSink()
+        measured = Metrics([sink])
+        with ProcessPoolExecutor(
+            max_workers=2,
+            initializer=_initialize_worker,
+            initargs=(measured.for_workers(),),
+        ) as executor:
+            list(executor.map(_measure_in_worker, range(1, 5)))
+        measured.close()
+        self.assertEqual(
+            sorted(measurement["frames"] for measurement in sink.measurements),
+            [1, 2, 3, 4],
+        )
+
+
+class TestPrometheusSink(unittest.TestCase):
+    """
+    Test `mustachizer.metrics.PrometheusSink`.
+    """
+
+    def test_render(self):
+        sink = PrometheusSink()
+        with Metrics([sink]).measure():
+            with metrics.stage("encode"):
+                pass
+            metrics.describe("GIF", (640, 480), 12, 1)
+        text = sink.render()
+
+        self.assertIn("# TYPE mustachizer_stage_wall_seconds histogram", text)
+        self.assertIn(
+            'mustachizer_stage_cpu_seconds_count{stage="encode"} 1', text.splitlines()
+        )
+        self.assertIn(
+            'mustachizer_media_wall_seconds_count{outcome="mustachized"} 1', text
+        )
+        self.assertIn('mustachizer_media_frames_bucket{le="10"} 0', text)
+        self.assertIn('mustachizer_media_frames_bucket{le="25"} 1', text)
+        self.assertIn('mustachizer_media_pixels_bucket{le="+Inf"} 1', text)
+        self.assertIn("mustachizer_media_pixels_sum 307200", text)
+
+    def test_serve(self):
+        sink = PrometheusSink()
+        server = sink.serve(0, address="127.0.0.1")
+        try:
+            port = server.server_address[1]
+            with urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+                self.assertEqual(response.read().decode(), sink.render())
+        finally:
+            sink.close()
+
+
+class TestJsonLinesSink(unittest.TestCase):
+    """
+    Test `mustachizer.metrics.JsonLinesSink`.
+    """
+
+    def test_record(self):
+        stream = io.StringIO()
+        measured = Metrics([JsonLinesSink(stream)])
+        for _ in range(2):
+            with measured.measure():
+                with metrics.stage("decode"):
+                    pass
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])["stages"]["decode"]["calls"], 1)
+
+
+@patch("cv2.face.createFacemarkLBF")
+class TestMeasuredApplicator(unittest.TestCase):
+    """
+    Test the stages measured by `mustachizer.mustache_applicator.MustacheApplicator`.
+    """
+
+    def test_gif(self, _):
+        sink = ListSink()
+        applicator = MustacheApplicator(metrics=Metrics([sink]))
+        data = (MEDIAS_FOLDER / "face2.gif").read_bytes()
+        with patch.object(FaceFinder, "_find_faces", side_effect=find_one_face):
+            applicator.mustachize(io.BytesIO(data))
+
+        (measurement,) = sink.measurements
+        self.assertEqual(measurement["outcome"], "mustachized")
+        self.assertEqual(measurement["format"], "GIF")
+        self.assertEqual((measurement["frames"], measurement["faces"]), (35, 1))
+        for name in ["decode", "convert", "deduplicate", "composite", "encode"]:
+            self.assertIn(name, measurement["stages"])
+        self.assertEqual(measurement["stages"]["decode"]["calls"], 36)
+
+    def test_detection(self, _):
+        sink = ListSink()
+        applicator = MustacheApplicator(metrics=Metrics([sink]))
+        data = (MEDIAS_FOLDER / "test1.jpg").read_bytes()
+        with patch.object(FaceFinder, "detect_boxes", return_value=numpy.empty((0, 4))):
+            with self.assertRaises(NoFaceFoundError):
+                applicator.mustachize(io.BytesIO(data))
+
+        (measurement,) = sink.measurements
+        self.assertEqual(measurement["outcome"], "no_face")
+        self.assertEqual(measurement["stages"]["detect"]["calls"], 1)
+        self.assertEqual(measurement["faces"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
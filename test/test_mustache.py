@@ -0,0 +1,79 @@
+import unittest
+
+import numpy
+
+from mustachizer.mustache import Mustache
+from mustachizer.mustache_type import PATH, MustacheType
+
+
+class TestMustache(unittest.TestCase):
+    """
+    Test `mustachizer.mustache.Mustache`.
+    """
+
+    def setUp(self):
+        self.mustache = MustacheType.HANDLEBAR.value
+
+    def test_lazy_loading(self):
+        mustache = Mustache(
+            name="BAMBINO",
+            image_path=PATH / "Bambino.png",
+            anchor=numpy.float32([0, -70, -50]),
+            proportional_width=0.6,
+        )
+        self.assertIsNone(mustache._sprites)
+        self.assertEqual(mustache.width, Mustache.FACE_WIDTH * 0.6)
+
+        # Loaded once, on first use
+        self.assertEqual(mustache.height, mustache.width / (483 / 122))
+        sprites = mustache._sprites
+        mustache.get_sprite(100, 100)
+        self.assertIs(mustache._sprites, sprites)
+
+        # Missing image only fails when used
+        mustache = Mustache(
+            name="MISSING",
+            image_path=PATH / "Missing.png",
+            anchor=numpy.float32([0, 0, 0]),
+            proportional_width=0.6,
+        )
+        with self.assertRaises(FileNotFoundError):
+            mustache.image
+
+    def test_sprites(self):
+        sprites = self.mustache.sprites
+        image = numpy.array(self.mustache.image)
+
+        # Biggest sprite is the image flipped upside down
+        numpy.testing.assert_array_equal(sprites[0], image[::-1])
+        self.assertIs(self.mustache.sprite, sprites[0])
+
+        # Each level halves the previous one
+        for bigger, smaller in zip(sprites, sprites[1:]):
+            self.assertEqual(smaller.shape[0], bigger.shape[0] // 2)
+            self.assertEqual(smaller.shape[1], bigger.shape[1] // 2)
+        self.assertGreaterEqual(sprites[-1].shape[1], self.mustache.MIN_SPRITE_WIDTH)
+
+        # Sprites are shared, they can't be modified
+        for sprite in sprites:
+            with self.assertRaises(ValueError):
+                sprite[0, 0] = 0
+
+    def test_sprites_edges(self):
+        # Color of transparent pixels does not bleed into the mustache
+        for sprite in self.mustache.sprites[1:]:
+            opaque = sprite[..., 3] > 0
+            self.assertLess(sprite[opaque][:, :3].mean(), 60)
+
+    def test_get_sprite(self):
+        sprites = self.mustache.sprites
+        height, width = sprites[2].shape[:2]
+        self.assertIs(self.mustache.get_sprite(width, height), sprites[2])
+        self.assertIs(self.mustache.get_sprite(width + 1, height), sprites[1])
+        self.assertIs(self.mustache.get_sprite(width, height + 1), sprites[1])
+        self.assertIs(self.mustache.get_sprite(1, 1), sprites[-1])
+        self.assertIs(self.mustache.get_sprite(10000, 10000), sprites[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
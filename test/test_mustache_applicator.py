@@ -0,0 +1,162 @@
+import io
+import unittest
+from pathlib import Path
+from test.test_mustache_placer import build_face
+from test.tools.test_video_reader import encode_video
+from unittest.mock import patch
+
+import numpy
+from PIL import Image, ImageSequence
+
+from mustachizer.errors import ImageIncorrectError, NoFaceFoundError
+from mustachizer.mustache_applicator import MustacheApplicator
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face_finder import FaceFinder
+from mustachizer.tools.gif_reader import read_frames
+from mustachizer.tools.video_reader import VideoReader, is_video
+
+MEDIAS_FOLDER = Path("assets", "tests_medias")
+
+
+def find_one_face(pixels, camera):
+    height, width = pixels.shape[:2]
+    return [build_face(camera, width / 3, height / 4, width / 3)]
+
+
+@patch("cv2.face.createFacemarkLBF")
+class TestMustacheApplicator(unittest.TestCase):
+    """
+    Test `mustachizer.mustache_applicator.MustacheApplicator`.
+    """
+
+    def test_find_faces(self, _):
+        applicator = MustacheApplicator()
+        with patch.object(
+            FaceFinder, "_find_faces", side_effect=find_one_face
+        ) as patched_find_faces:
+            # Faces of every frame
+            buffer = io.BytesIO((MEDIAS_FOLDER / "face2.gif").read_bytes())
+            frames_faces = applicator.find_faces(buffer)
+            self.assertEqual(len(frames_faces), 35)
+            self.assertEqual(patched_find_faces.call_count, 35)
+
+            # Restyled without finding faces again
+            for mustache_name in ["BAMBINO", "WRESTLER"]:
+                buffer.seek(0)
+                image = applicator.mustachize(
+                    buffer, mustache_name=mustache_name, faces=frames_faces
+                )
+                self.assertEqual(Image.open(image).n_frames, 35)
+            self.assertEqual(patched_find_faces.call_count, 35)
+
+            # Faces not matching the frames
+            buffer.seek(0)
+            with self.assertRaises(ValueError):
+                applicator.mustachize(buffer, faces=frames_faces[1:])
+
+        with self.assertRaises(ImageIncorrectError):
+            applicator.find_faces(io.BytesIO(b"not an image"))
+
+    def test_gif_frames_passed_through(self, _):
+        applicator = MustacheApplicator()
+        data = (MEDIAS_FOLDER / "face1.gif").read_bytes()
+        source = Image.open(io.BytesIO(data))
+        durations = [frame.info["duration"] for frame in ImageSequence.Iterator(source)]
+
+        # A face on the first frame only
+        frames_faces = [[]] * len(durations)
+        frames_faces[0] = find_one_face(
+            numpy.zeros(source.size[::-1]), Camera(source.convert("RGBA"))
+        )
+        output = applicator.mustachize(
+            io.BytesIO(data), mustache_name="BAMBINO", faces=frames_faces
+        ).getvalue()
+
+        image = Image.open(io.BytesIO(output))
+        self.assertEqual(
+            [frame.info["duration"] for frame in ImageSequence.Iterator(image)],
+            durations,
+        )
+        self.assertEqual(image.info["loop"], source.info["loop"])
+
+        # Frames after the one drawn again once the face left are copied
+        written = {bytes(frame.blocks[-1]) for frame in read_frames(output)}
+        raw_frames = list(read_frames(data))
+        for frame in raw_frames[2:]:
+            self.assertIn(bytes(frame.blocks[-1]), written)
+        self.assertNotIn(bytes(raw_frames[0].blocks[-1]), written)
+
+    def test_repeated_frames_reused(self, _):
+        source = Image.open(MEDIAS_FOLDER / "face1.gif")
+        frames = [frame.convert("RGBA") for frame in ImageSequence.Iterator(source)]
+        frames = frames[:4] * 2
+        buffer = io.BytesIO()
+        frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:])
+        data = buffer.getvalue()
+
+        outputs = []
+        for deduplication in (False, True):
+            applicator = MustacheApplicator(deduplication=deduplication)
+            with patch.object(
+                FaceFinder, "_find_faces", side_effect=find_one_face
+            ) as patched_find_faces:
+                outputs.append(
+                    applicator.mustachize(
+                        io.BytesIO(data), mustache_name="BAMBINO"
+                    ).getvalue()
+                )
+        self.assertEqual(patched_find_faces.call_count, 4)
+        self.assertEqual(applicator.frame_deduplicator.identical, 4)
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_video(self, _):
+        source = Image.open(MEDIAS_FOLDER / "face1.gif")
+        frames = [
+            numpy.asarray(frame.convert("RGB"))
+            for frame in ImageSequence.Iterator(source)
+        ][:6]
+        data = encode_video(frames, fps=10)
+
+        # Decoded in memory and written as a GIF, frames repeated when resampled
+        # to a higher rate being reused and merged
+        applicator = MustacheApplicator()
+        with patch.object(
+            FaceFinder, "_find_faces", side_effect=find_one_face
+        ) as patched_find_faces:
+            output = applicator.mustachize(io.BytesIO(data), mustache_name="BAMBINO")
+        self.assertEqual(patched_find_faces.call_count, 6)
+
+        image = Image.open(output)
+        self.assertEqual(image.format, "GIF")
+        self.assertEqual(image.size, source.size)
+        self.assertEqual(image.n_frames, 6)
+        self.assertEqual(image.info["loop"], 0)
+        self.assertEqual(
+            sum(frame.info["duration"] for frame in ImageSequence.Iterator(image)),
+            6 * 100,
+        )
+
+        # No face on the video
+        with patch.object(FaceFinder, "_find_faces", return_value=[]):
+            with self.assertRaises(NoFaceFoundError):
+                applicator.mustachize(io.BytesIO(data))
+
+        with self.assertRaises(ImageIncorrectError):
+            applicator.mustachize(io.BytesIO(data[:100]))
+
+        # Written as an MP4, frames resampled to its rate
+        applicator = MustacheApplicator(video_format="MP4")
+        with patch.object(FaceFinder, "_find_faces", side_effect=find_one_face):
+            output = applicator.mustachize(io.BytesIO(data), mustache_name="BAMBINO")
+        output = output.getvalue()
+        self.assertTrue(is_video(output[:12]))
+        with VideoReader(output, fps=30) as video:
+            self.assertEqual(video.size, source.size)
+            self.assertEqual(len(list(video)), 18)
+
+        with self.assertRaises(ValueError):
+            MustacheApplicator(video_format="AVI")
+
+
+if __name__ == "__main__":
+    unittest.main()
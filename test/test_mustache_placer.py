@@ -0,0 +1,178 @@
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import cv2
+import numpy
+from PIL import Image
+
+from mustachizer.mustache import Mustache
+from mustachizer.mustache_placer import MustachePlacer
+from mustachizer.mustache_type import MustacheType
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face import Face, FaceBatch
+
+IMAGE_FILEPATH = Path("assets", "tests_medias", "test2.jpg")
+
+
+def build_face(camera: Camera, x: float, y: float, width: float, roll: float = 0.0):
+    """
+    Build a face looking at the camera whose bounding box is (x, y, width, width).
+    """
+    focal = camera.matrix[0, 0]
+    depth = focal * 500 / width
+    translation = numpy.array(
+        [
+            [(x + width / 2 - camera.matrix[0, 2]) * depth / focal],
+            [(y + width / 2 - camera.matrix[1, 2]) * depth / focal],
+            [depth],
+        ]
+    )
+    rotation = numpy.array([[numpy.pi], [0.2], [roll]])
+    return Face(int(x), int(y), int(width), int(width), rotation, translation)
+
+
+def place_mustache_full_frame(face_image, camera, face, mustache):
+    """
+    Reference compositing, warping the mustache over the whole frame.
+    """
+    mustache_image = mustache.image
+    mustache_box = MustachePlacer()._compute_mustache_box(mustache)
+    mustache_box_projected, _ = cv2.projectPoints(
+        mustache_box,
+        face.rotation,
+        face.translation,
+        camera.matrix,
+        camera.distortion,
+    )
+    original_box = numpy.float32(
+        [
+            [0, 0],
+            [mustache_image.width, 0],
+            [mustache_image.width, mustache_image.height],
+            [0, mustache_image.height],
+        ]
+    )
+    perspective_matrix = cv2.getPerspectiveTransform(
+        original_box, numpy.float32(mustache_box_projected.reshape(4, 2))
+    )
+    mustache_image = mustache_image.transpose(Image.FLIP_TOP_BOTTOM)
+    cv2_image = cv2.warpPerspective(
+        numpy.array(mustache_image), perspective_matrix, face_image.size
+    )
+    mustache_image = Image.fromarray(cv2_image, "RGBA")
+    face_image.paste(mustache_image, (0, 0), mustache_image.getchannel("A"))
+
+
+class TestMustachePlacer(unittest.TestCase):
+    """
+    Test `mustachizer.mustache_placer.MustachePlacer`.
+    """
+
+    def setUp(self):
+        self.image = Image.open(IMAGE_FILEPATH).convert("RGBA")
+        self.camera = Camera(self.image)
+        self.mustache_placer = MustachePlacer()
+
+    @patch.object(Mustache, "get_sprite", lambda self, width, height: self.sprite)
+    def test_place_mustache(self):
+        faces = [
+            build_face(self.camera, 400, 150, 350),
+            build_face(self.camera, 1000, 400, 120, roll=0.3),
+            # Partially out of the frame
+            build_face(self.camera, -60, 600, 200, roll=-0.2),
+        ]
+        for face, mustache_type in zip(faces, MustacheType):
+            expected = self.image.copy()
+            placed = self.image.copy()
+            place_mustache_full_frame(expected, self.camera, face, mustache_type.value)
+            self.mustache_placer.place_mustache(
+                placed, self.camera, face, mustache_type.value
+            )
+
+            expected = numpy.asarray(expected, dtype=int)
+            placed = numpy.asarray(placed, dtype=int)
+            self.assertTrue((placed != numpy.asarray(self.image)).any())
+            self.assertLessEqual(numpy.abs(expected - placed).max(), 1)
+
+    @patch.object(Mustache, "get_sprite", lambda self, width, height: self.sprite)
+    def test_place_mustaches(self):
+        faces = [
+            build_face(self.camera, 100 + 150 * i, 100 + 60 * i, 90 + 20 * i, i / 10)
+            for i in range(7)
+        ]
+        mustaches = [mustache_type.value for mustache_type in MustacheType][:7]
+
+        expected = self.image.copy()
+        for face, mustache in zip(faces, mustaches):
+            place_mustache_full_frame(expected, self.camera, face, mustache)
+        placed = self.image.copy()
+        self.mustache_placer.place_mustaches(placed, self.camera, faces, mustaches)
+
+        expected = numpy.asarray(expected, dtype=int)
+        placed = numpy.asarray(placed, dtype=int)
+        self.assertLessEqual(numpy.abs(expected - placed).max(), 2)
+
+        # Same from a batch
+        batched = self.image.copy()
+        self.mustache_placer.place_mustaches(
+            batched, self.camera, FaceBatch.from_faces(faces), mustaches
+        )
+        self.assertTrue((numpy.asarray(batched, dtype=int) == placed).all())
+
+        # Sprites are picked from the pyramid
+        with patch.object(Mustache, "get_sprite", autospec=True) as get_sprite:
+            get_sprite.side_effect = lambda self, width, height: self.sprites[-1]
+            placed = self.image.copy()
+            self.mustache_placer.place_mustaches(placed, self.camera, faces, mustaches)
+        self.assertEqual(get_sprite.call_count, len(faces))
+
+        # No face
+        placed = self.image.copy()
+        self.mustache_placer.place_mustaches(placed, self.camera, [], [])
+        self.assertEqual(placed.tobytes(), self.image.tobytes())
+
+    def test_place_mustache_pyramid(self):
+        # Small faces get a downscaled sprite, which cannot match the full
+        # resolution reference pixel for pixel. Once blurred over 2 pixels, the
+        # mean difference stays under 4.25 (a sprite one level too small goes
+        # over 4.6), and the mean color bias under 2.75 (averaging colors
+        # without weighting them by opacity bleeds transparent colors, over 3.4)
+        for width in [40, 60]:
+            for mustache_type in [MustacheType.CAPTAIN_HOOK, MustacheType.EDWARDIAN]:
+                with self.subTest(width=width, mustache_type=mustache_type):
+                    face = build_face(self.camera, 400, 300, width)
+                    expected = self.image.copy()
+                    placed = self.image.copy()
+                    place_mustache_full_frame(
+                        expected, self.camera, face, mustache_type.value
+                    )
+                    self.mustache_placer.place_mustache(
+                        placed, self.camera, face, mustache_type.value
+                    )
+
+                    expected = numpy.asarray(expected, dtype=numpy.float32)[..., :3]
+                    placed = numpy.asarray(placed, dtype=numpy.float32)[..., :3]
+                    original = numpy.asarray(self.image, dtype=numpy.float32)[..., :3]
+                    changed = ((expected != original) | (placed != original)).any(
+                        axis=2
+                    )
+                    blurred = numpy.abs(
+                        cv2.GaussianBlur(expected, (0, 0), 2)
+                        - cv2.GaussianBlur(placed, (0, 0), 2)
+                    )
+                    self.assertLessEqual(blurred[changed].mean(), 4.25)
+                    bias = (placed - expected)[changed].mean()
+                    self.assertLessEqual(abs(bias), 2.75)
+
+    def test_place_mustache_out_of_frame(self):
+        face = build_face(self.camera, 5000, 5000, 200)
+        placed = self.image.copy()
+        self.mustache_placer.place_mustache(
+            placed, self.camera, face, MustacheType.BAMBINO.value
+        )
+        self.assertEqual(placed.tobytes(), self.image.tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
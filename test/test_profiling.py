@@ -0,0 +1,164 @@
+import io
+import json
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from test.test_mustache_applicator import find_one_face
+from unittest.mock import patch
+
+from mustachizer.mustache_applicator import MustacheApplicator
+from mustachizer.profiling import Profiler, create_profiler
+from mustachizer.tools.face_finder import FaceFinder
+
+MEDIAS_FOLDER = Path("assets", "tests_medias")
+
+# Profiler of the current worker process
+_worker_profiler = None
+
+
+def _initialize_worker(worker_profiler: Profiler) -> None:
+    global _worker_profiler
+    _worker_profiler = worker_profiler
+
+
+def _request_in_worker(size: int) -> int:
+    with _worker_profiler.request():
+        sum(range(size))
+    return os.getpid()
+
+
+class TestProfiler(unittest.TestCase):
+    """
+    Test `mustachizer.profiling.Profiler`.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def test_disabled(self):
+        profiler = Profiler(directory=self.path)
+        self.assertFalse(profiler.enabled)
+        self.assertIsNone(profiler.for_workers())
+        self.assertFalse(profiler.toggle())
+        with profiler.request():
+            pass
+        profiler.close()
+        self.assertEqual(list(self.path.iterdir()), [])
+
+    def test_mode(self):
+        with self.assertRaises(ValueError):
+            Profiler("perf")
+
+    def test_cprofile(self):
+        profiler = Profiler("cprofile", self.path)
+        for _ in range(2):
+            with profiler.request():
+                sorted(range(1000))
+        profiler.close()
+
+        (path,) = self.path.iterdir()
+        self.assertEqual(path.name, f"profile-{os.getpid()}.prof")
+        stats = pstats.Stats(str(path)).stats
+        calls = [
+            calls for (_, _, name), (calls, *_) in stats.items() if "sorted" in name
+        ]
+        self.assertEqual(calls, [2])
+
+    def test_per_request(self):
+        profiler = Profiler("cprofile", self.path, per_request=True)
+        for _ in range(3):
+            with profiler.request():
+                pass
+        self.assertEqual(
+            sorted(path.name for path in self.path.iterdir()),
+            [f"request-{os.getpid()}-{number:05}.prof" for number in [1, 2, 3]],
+        )
+
+    def test_memory(self):
+        profiler = Profiler(directory=self.path, memory=True)
+        with profiler.request():
+            kept = [bytearray(1024) for _ in range(100)]
+            del kept
+
+        (path,) = self.path.iterdir()
+        (report,) = map(json.loads, path.read_text().splitlines())
+        self.assertEqual(report["request"], 1)
+        self.assertGreaterEqual(report["peak"], 100 * 1024)
+        self.assertLess(report["retained"], report["peak"])
+        self.assertLessEqual(len(report["top"]), 10)
+
+    def test_toggle(self):
+        profiler = Profiler("cprofile", self.path, per_request=True, paused=True)
+        self.assertFalse(profiler.active)
+        with profiler.request():
+            pass
+        self.assertEqual(list(self.path.iterdir()), [])
+
+        self.assertTrue(profiler.toggle())
+        with profiler.request():
+            pass
+        self.assertFalse(profiler.toggle())
+        with profiler.request():
+            pass
+        self.assertEqual(len(list(self.path.iterdir())), 1)
+
+    def test_sampling(self):
+        profiler = create_profiler("sampling", self.path)
+        profiler.interval = 0.001
+        with profiler.request():
+            deadline = time.monotonic() + 0.1
+            while time.monotonic() < deadline:
+                pass
+        profiler.close()
+
+        lines = (self.path / f"stacks-{os.getpid()}.txt").read_text().splitlines()
+        self.assertTrue(any("test_sampling" in line for line in lines))
+        self.assertTrue(any(line.startswith("MainThread;") for line in lines))
+        for line in lines:
+            self.assertGreater(int(line.rsplit(" ", 1)[1]), 0)
+
+    def test_for_workers(self):
+        profiler = Profiler("cprofile", self.path, per_request=True)
+        with ProcessPoolExecutor(
+            max_workers=2,
+            initializer=_initialize_worker,
+            initargs=(profiler.for_workers(),),
+        ) as executor:
+            pids = set(executor.map(_request_in_worker, [10] * 4))
+        names = [path.name for path in self.path.iterdir()]
+        self.assertEqual(len(names), 4)
+        self.assertEqual({int(name.split("-")[1]) for name in names}, pids)
+
+
+@patch("cv2.face.createFacemarkLBF")
+class TestProfiledApplicator(unittest.TestCase):
+    """
+    Test the requests profiled by `mustachizer.mustache_applicator.MustacheApplicator`.
+    """
+
+    def test_image(self, _):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = Profiler("cprofile", directory, per_request=True)
+            applicator = MustacheApplicator(profiler=profiler)
+            data = (MEDIAS_FOLDER / "test1.jpg").read_bytes()
+            with patch.object(FaceFinder, "_find_faces", side_effect=find_one_face):
+                applicator.mustachize(io.BytesIO(data))
+
+            (path,) = Path(directory).iterdir()
+            functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+            self.assertIn("_apply_mustaches", functions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import pickle
+import unittest
+
+import numpy
+
+from mustachizer.tools.face import Face, FaceBatch
+
+
+class TestFaceBatch(unittest.TestCase):
+    """
+    Test `mustachizer.tools.face.FaceBatch`.
+    """
+
+    def setUp(self):
+        self.boxes = numpy.array([(10, 20, 100, 110), (300, 40, 80, 90)])
+        self.rotations = numpy.array([(3.1, 0.1, 0.0), (3.0, -0.2, 0.1)])
+        self.translations = numpy.array([(-300.0, 0.0, 3000.0), (400.0, 100.0, 4000.0)])
+        self.landmarks = numpy.arange(2 * 68 * 2, dtype=numpy.float32).reshape(2, 68, 2)
+        self.batch = FaceBatch(
+            self.boxes, self.rotations, self.translations, self.landmarks
+        )
+
+    def test_arrays(self):
+        self.assertEqual(len(self.batch), 2)
+        self.assertEqual(self.batch.boxes.dtype, numpy.int32)
+        self.assertEqual(self.batch.rotations.shape, (2, 3))
+        self.assertEqual(self.batch.translations.shape, (2, 3))
+        self.assertEqual(self.batch.landmarks.shape, (2, 68, 2))
+        self.assertEqual(self.batch.nbytes, 2 * (4 * 4 + 3 * 8 + 3 * 8 + 68 * 2 * 4))
+
+        # Not copied when already of the right type
+        self.assertTrue(numpy.shares_memory(self.batch.rotations, self.rotations))
+        self.assertTrue(numpy.shares_memory(self.batch.landmarks, self.landmarks))
+
+        # Landmarks unknown
+        batch = FaceBatch(self.boxes, self.rotations, self.translations)
+        self.assertTrue(numpy.isnan(batch.landmarks).all())
+
+        self.assertEqual(len(FaceBatch.empty()), 0)
+        self.assertFalse(FaceBatch.empty())
+
+    def test_views(self):
+        face = self.batch[1]
+        self.assertIsInstance(face, Face)
+        self.assertEqual((face.x, face.y, face.width, face.height), (300, 40, 80, 90))
+        self.assertEqual(face.rotation.shape, (3, 1))
+        self.assertEqual(face.translation.shape, (3, 1))
+        for array, view in (
+            (self.rotations, face.rotation),
+            (self.translations, face.translation),
+            (self.landmarks, face.landmarks),
+        ):
+            self.assertTrue(numpy.shares_memory(array, view))
+
+        sliced = self.batch[1:]
+        self.assertIsInstance(sliced, FaceBatch)
+        self.assertEqual(len(sliced), 1)
+        self.assertTrue(numpy.shares_memory(sliced.rotations, self.rotations))
+        self.assertTrue(numpy.shares_memory(sliced.landmarks, self.landmarks))
+
+        self.assertEqual([face.x for face in self.batch], [10, 300])
+
+    def test_from_faces(self):
+        batch = FaceBatch.from_faces(list(self.batch))
+        for name in ("boxes", "rotations", "translations", "landmarks"):
+            numpy.testing.assert_array_equal(
+                getattr(batch, name), getattr(self.batch, name)
+            )
+
+        self.assertIs(FaceBatch.from_faces(self.batch), self.batch)
+        self.assertEqual(len(FaceBatch.from_faces([])), 0)
+
+    def test_slots(self):
+        face = self.batch[0]
+        with self.assertRaises(AttributeError):
+            face.__dict__
+        with self.assertRaises(AttributeError):
+            self.batch.__dict__
+
+    def test_pickle(self):
+        batch = pickle.loads(pickle.dumps(self.batch))
+        numpy.testing.assert_array_equal(batch.boxes, self.batch.boxes)
+        numpy.testing.assert_array_equal(batch.landmarks, self.batch.landmarks)
+
+
+if __name__ == "__main__":
+    unittest.main()
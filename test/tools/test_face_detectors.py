@@ -0,0 +1,127 @@
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy
+from PIL import Image
+
+from mustachizer.tools import face_detectors
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.detector_names import DETECTOR_NAMES
+from mustachizer.tools.face_detectors import (
+    DETECTORS,
+    FaceDetector,
+    HaarDetector,
+    SSDDetector,
+    YuNetDetector,
+    create_detector,
+)
+from mustachizer.tools.face_finder import FaceFinder
+
+MEDIAS_DIRECTORY = Path("assets", "tests_medias")
+
+
+class TestFaceDetectors(unittest.TestCase):
+    """
+    Test `mustachizer.tools.face_detectors`.
+    """
+
+    def setUp(self):
+        self.pixels = numpy.array(
+            Image.open(MEDIAS_DIRECTORY / "test2.jpg").convert("RGBA")
+        )
+
+    def test_create_detector(self):
+        self.assertEqual(tuple(DETECTORS), DETECTOR_NAMES)
+        for name, detector in DETECTORS.items():
+            self.assertIsInstance(create_detector(name), detector)
+        with self.assertRaises(ValueError):
+            create_detector("unknown")
+        with self.assertRaises(ValueError):
+            FaceFinder(detector="unknown")
+
+    def test_haar_detector(self):
+        face_finder = FaceFinder(detector="haar")
+        cv2_image = face_finder.to_cv2(self.pixels)
+        self.assertEqual(cv2_image.ndim, 2)
+
+        boxes = HaarDetector().detect(cv2_image)
+        self.assertEqual(boxes.shape, (1, 4))
+        self.assertEqual(boxes.dtype, numpy.int32)
+        self.assertEqual(len(HaarDetector().detect(cv2_image, min_size=(600, 600))), 0)
+
+    def test_missing_model(self):
+        missing = Path("models", "dnn", "missing.onnx")
+        with patch.object(face_detectors, "YUNET_FILEPATH", missing):
+            with self.assertRaises(FileNotFoundError):
+                YuNetDetector().load()
+        with patch.object(face_detectors, "SSD_WEIGHTS_FILEPATH", missing):
+            with self.assertRaises(FileNotFoundError):
+                SSDDetector().load()
+
+    def test_yunet_detector(self):
+        detector = YuNetDetector()
+        detector._network = MagicMock()
+        # Box, five landmarks and score
+        faces = numpy.zeros((4, 15), dtype=numpy.float32)
+        faces[:, :4] = [
+            (10.4, 20.6, 100.2, 120.0),
+            (5, 5, 20, 20),
+            (0, 0, 400, 400),
+            (-20, 300, 100, 100),  # Clipped
+        ]
+        detector._network.detect.return_value = (1, faces)
+
+        cv2_image = numpy.zeros((360, 640, 3), dtype=numpy.uint8)
+        boxes = detector.detect(cv2_image, max_size=(300, 300))
+        detector._network.setInputSize.assert_called_once_with((640, 360))
+        numpy.testing.assert_array_equal(boxes, [(10, 21, 100, 120), (0, 300, 80, 60)])
+
+        detector._network.detect.return_value = (1, None)
+        self.assertEqual(detector.detect(cv2_image).shape, (0, 4))
+
+    def test_ssd_detector(self):
+        detector = SSDDetector()
+        detector._network = MagicMock()
+        detector._network.forward.return_value = numpy.array(
+            [
+                [
+                    [
+                        (0, 1, 0.99, 0.25, 0.5, 0.5, 1.0),
+                        (0, 1, 0.8, 0.9, 0.9, 1.2, 1.1),  # Clipped
+                        (0, 1, 0.1, 0.0, 0.0, 0.5, 0.5),  # Not confident
+                    ]
+                ]
+            ],
+            dtype=numpy.float32,
+        )
+
+        cv2_image = numpy.zeros((400, 800, 3), dtype=numpy.uint8)
+        boxes = detector.detect(cv2_image)
+        blob = detector._network.setInput.call_args[0][0]
+        self.assertEqual(blob.shape, (1, 3, 300, 300))
+        numpy.testing.assert_array_equal(
+            boxes, [(200, 200, 200, 200), (720, 360, 80, 40)]
+        )
+
+    def test_face_finder_color_detector(self):
+        class ColorDetector(FaceDetector):
+            NAME = "color"
+
+            def detect(self, cv2_image, min_size=(30, 30), max_size=(0, 0)):
+                self.cv2_image = cv2_image
+                return numpy.empty((0, 4), dtype=numpy.int32)
+
+        detector = ColorDetector()
+        face_finder = FaceFinder(detector=detector)
+        self.assertIs(face_finder.detector, detector)
+
+        image = Image.fromarray(self.pixels)
+        self.assertEqual(len(face_finder.find_faces(image, Camera(image))), 0)
+
+        # Given in BGR
+        numpy.testing.assert_array_equal(detector.cv2_image, self.pixels[:, :, 2::-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import numpy
+from PIL import Image
+
+from mustachizer.cache import FaceCache
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face import FaceBatch
+from mustachizer.tools.face_finder import FaceFinder
+from mustachizer.tools.pose_estimator import project_points, rodrigues
+
+IMAGE_FILEPATH = Path("assets", "tests_medias", "test2.jpg")
+
+
+class TestFaceFinder(unittest.TestCase):
+    """
+    Test `mustachizer.tools.face_finder.FaceFinder`.
+    """
+
+    def setUp(self):
+        self.image = Image.open(IMAGE_FILEPATH).convert("RGBA")
+        self.camera = Camera(self.image)
+
+    @patch.object(FaceFinder, "_find_faces", return_value=["face"])
+    def test_find_faces_cache(self, patched_find_faces):
+        face_finder = FaceFinder(cache=FaceCache())
+
+        # Found once for the same pixels
+        for _ in range(3):
+            faces = face_finder.find_faces(self.image.copy(), self.camera)
+            self.assertEqual(faces, ["face"])
+        patched_find_faces.assert_called_once()
+        self.assertEqual(face_finder.cache.hits, 2)
+
+        # Other pixels
+        face_finder.find_faces(self.image.rotate(180), self.camera)
+        self.assertEqual(patched_find_faces.call_count, 2)
+
+        # Faces are searched again to draw debug lines
+        face_finder.debug = True
+        face_finder.find_faces(self.image, self.camera)
+        self.assertEqual(patched_find_faces.call_count, 3)
+
+    def test_downscale(self):
+        gray = FaceFinder.to_gray(numpy.array(self.image))
+
+        # Narrow enough already
+        for detection_width in (None, 1280, 2048):
+            face_finder = FaceFinder(detection_width=detection_width)
+            downscaled, scale = face_finder.downscale(gray)
+            self.assertIs(downscaled, gray)
+            self.assertEqual(scale, 1.0)
+
+        downscaled, scale = FaceFinder(detection_width=640).downscale(gray)
+        self.assertEqual(downscaled.shape, (360, 640))
+        self.assertEqual(scale, 0.5)
+
+    def test_find_faces_downscaled(self):
+        calls = []
+
+        def compute_face_projections(self, cv2_image, camera, faces, scale=1.0):
+            calls.append((cv2_image.shape, scale))
+            return numpy.zeros((len(faces), 3)), numpy.zeros((len(faces), 3)), None
+
+        with patch.object(
+            FaceFinder, "_compute_face_projections", compute_face_projections
+        ):
+            expected = FaceFinder().find_faces(self.image, self.camera)
+            faces = FaceFinder(detection_width=640).find_faces(self.image, self.camera)
+
+        # Landmarks are fitted on the downscaled image
+        self.assertEqual(calls, [((720, 1280), 1.0), ((360, 640), 0.5)])
+
+        # Boxes are given in the coordinates of the original image
+        self.assertEqual(len(faces), len(expected))
+        for face, expected_face in zip(faces, expected):
+            self.assertLess(abs(face.x - expected_face.x), 0.05 * expected_face.width)
+            self.assertLess(abs(face.y - expected_face.y), 0.05 * expected_face.width)
+            self.assertLess(
+                abs(face.width - expected_face.width), 0.1 * expected_face.width
+            )
+
+    def test_compute_face_projections(self):
+        rotations = numpy.array([(numpy.pi, 0.1, 0.0), (numpy.pi, -0.2, 0.1)])
+        translations = numpy.array([(-300.0, 0.0, 3000.0), (400.0, 100.0, 4000.0)])
+        face_marks = numpy.zeros((2, 68, 2), dtype=numpy.float32)
+        face_marks[:, FaceFinder.FACE_2D_INDEXES] = project_points(
+            FaceFinder.FACE_3D_POINTS, rotations, translations, self.camera.matrix
+        )
+        face_marker = MagicMock()
+        face_marker.fit.return_value = (True, [marks[None] for marks in face_marks])
+
+        face_finder = FaceFinder()
+        with patch.object(
+            FaceFinder, "face_marker", new_callable=PropertyMock
+        ) as patched_face_marker, patch("logging.debug") as patched_debug:
+            patched_face_marker.return_value = face_marker
+            faces = face_finder.locate_faces(
+                None, self.camera, numpy.array([(10, 20, 100, 100), (200, 20, 80, 80)])
+            )
+
+        # Debug strings are not even built when they are not logged
+        patched_debug.assert_not_called()
+        self.assertIsInstance(faces, FaceBatch)
+        numpy.testing.assert_array_equal(
+            faces.boxes, [(10, 20, 100, 100), (200, 20, 80, 80)]
+        )
+        numpy.testing.assert_array_equal(faces.landmarks, face_marks)
+        numpy.testing.assert_allclose(
+            rodrigues(faces.rotations), rodrigues(rotations), atol=1e-5
+        )
+        numpy.testing.assert_allclose(faces.translations, translations, atol=1e-3)
+
+        # No face
+        self.assertEqual(len(face_finder.locate_faces(None, self.camera, [])), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
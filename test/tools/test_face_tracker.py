@@ -0,0 +1,69 @@
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy
+from PIL import Image, ImageSequence
+
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face_finder import FaceFinder
+from mustachizer.tools.face_tracker import FaceTracker
+
+GIF_FILEPATH = Path("assets", "tests_medias", "face2.gif")
+
+
+def compute_face_projections(self, cv2_image, camera, faces, scale=1.0):
+    return numpy.zeros((len(faces), 3)), numpy.zeros((len(faces), 3)), None
+
+
+@patch.object(FaceFinder, "_compute_face_projections", compute_face_projections)
+class TestFaceTracker(unittest.TestCase):
+    """
+    Test `mustachizer.tools.face_tracker.FaceTracker`.
+    """
+
+    def setUp(self):
+        image = Image.open(GIF_FILEPATH)
+        self.frames = [frame.convert("RGBA") for frame in ImageSequence.Iterator(image)]
+        self.camera = Camera(self.frames[0])
+        self.face_finder = FaceFinder()
+
+    def test_track_faces(self):
+        face_tracker = FaceTracker(self.face_finder, keyframe_interval=10)
+        with patch.object(
+            self.face_finder, "find_faces", wraps=self.face_finder.find_faces
+        ) as patched_find_faces:
+            for frame in self.frames:
+                detected = self.face_finder.detect_boxes(
+                    FaceFinder.to_gray(numpy.array(frame))
+                )
+                faces = face_tracker.track_faces(frame, self.camera)
+
+                # Same faces as detected on the whole frame
+                self.assertEqual(len(faces), len(detected))
+                for face, box in zip(faces, detected):
+                    self.assertLess(abs(face.x - box[0]), box[2] / 4)
+                    self.assertLess(abs(face.y - box[1]), box[3] / 4)
+
+        # Whole frame only searched on keyframes
+        self.assertEqual(patched_find_faces.call_count, face_tracker.keyframes)
+        self.assertEqual(face_tracker.keyframes, 4)
+        self.assertEqual(face_tracker.tracked_frames, len(self.frames) - 4)
+
+        # Next frame is a keyframe
+        face_tracker.reset()
+        face_tracker.track_faces(self.frames[0], self.camera)
+        self.assertEqual(face_tracker.keyframes, 1)
+
+    def test_track_faces_lost(self):
+        face_tracker = FaceTracker(self.face_finder)
+        face_tracker.track_faces(self.frames[0], self.camera)
+
+        # Face disappears
+        blank = Image.new("RGBA", self.frames[0].size)
+        self.assertEqual(len(face_tracker.track_faces(blank, self.camera)), 0)
+        self.assertEqual(face_tracker.keyframes, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+import numpy
+from PIL import Image
+
+from mustachizer.tools.face import FaceBatch
+from mustachizer.tools.frame_deduplicator import FrameDeduplicator
+
+
+class TestFrameDeduplicator(unittest.TestCase):
+    """
+    Test `mustachizer.tools.frame_deduplicator.FrameDeduplicator`.
+    """
+
+    def setUp(self):
+        rng = numpy.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (48, 64, 3), dtype=numpy.uint8)
+        self.frame = Image.fromarray(self.pixels)
+        self.faces = FaceBatch(
+            [(10, 10, 20, 20)], [(3.1, 0.0, 0.0)], [(0.0, 0.0, 3000.0)]
+        )
+        self.composited = Image.new("RGBA", (64, 48))
+        self.deduplicator = FrameDeduplicator()
+
+    def remember(self, frame):
+        seen = self.deduplicator.match(frame)
+        self.deduplicator.remember(seen, self.faces, self.composited)
+        return seen
+
+    def test_identical(self):
+        seen = self.remember(self.frame)
+        self.assertIsNone(seen.faces)
+        self.assertIsNone(seen.composited)
+
+        seen = self.deduplicator.match(Image.fromarray(self.pixels.copy()))
+        self.assertIs(seen.faces, self.faces)
+        self.assertIs(seen.composited, self.composited)
+        self.assertEqual(self.deduplicator.identical, 1)
+
+        # The palette of the first frame of a GIF is taken into account
+        paletted = self.frame.quantize(colors=16)
+        self.remember(paletted)
+        seen = self.deduplicator.match(paletted.convert("RGB"))
+        self.assertIs(seen.composited, self.composited)
+
+    def test_similar(self):
+        self.remember(self.frame)
+
+        # Noise only reuses the faces
+        noisy = self.pixels.astype(int) + numpy.where(self.pixels < 255, 1, -1)
+        seen = self.deduplicator.match(Image.fromarray(noisy.astype(numpy.uint8)))
+        self.assertIs(seen.faces, self.faces)
+        self.assertIsNone(seen.composited)
+        self.assertEqual(self.deduplicator.similar, 1)
+
+        # Something moved
+        moved = numpy.roll(self.pixels, 8, axis=1)
+        seen = self.deduplicator.match(Image.fromarray(moved))
+        self.assertIsNone(seen.faces)
+
+        # Only identical frames
+        deduplicator = FrameDeduplicator(tolerance=0)
+        deduplicator.remember(deduplicator.match(self.frame), self.faces, self.frame)
+        self.assertIsNone(
+            deduplicator.match(Image.fromarray(noisy.astype(numpy.uint8))).faces
+        )
+
+    def test_statistics(self):
+        for frame in (self.frame, self.frame, self.frame.rotate(90)):
+            self.remember(frame)
+        self.assertEqual(self.deduplicator.frames, 3)
+        self.assertEqual(self.deduplicator.reused, 1)
+
+        self.deduplicator.reset()
+        self.assertEqual(self.deduplicator.frames, 0)
+        self.assertIsNone(self.deduplicator.match(self.frame).composited)
+
+    def test_memory_bounded(self):
+        deduplicator = FrameDeduplicator(max_size=2 * 64 * 48 * 4)
+        frames = [Image.fromarray(numpy.roll(self.pixels, i, axis=0)) for i in range(3)]
+        for frame in frames:
+            deduplicator.remember(
+                deduplicator.match(frame), self.faces, self.composited
+            )
+
+        # Least recent mustachized frame evicted, its faces still found
+        seen = deduplicator.match(frames[0])
+        self.assertIsNone(seen.composited)
+        self.assertIs(seen.faces, self.faces)
+        self.assertIsNotNone(deduplicator.match(frames[2]).composited)
+
+
+if __name__ == "__main__":
+    unittest.main()
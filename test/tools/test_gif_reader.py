@@ -0,0 +1,68 @@
+import io
+import unittest
+
+from PIL import Image
+
+from mustachizer.tools.gif_reader import (
+    DISPOSAL_BACKGROUND,
+    DISPOSAL_UNSPECIFIED,
+    read_frames,
+)
+
+
+class TestReadFrames(unittest.TestCase):
+    """
+    Test `mustachizer.tools.gif_reader.read_frames`.
+    """
+
+    def setUp(self):
+        frames = []
+        for index in range(3):
+            frame = Image.new("RGBA", (40, 30), (0, 0, 0, 0))
+            frame.paste((0, 200, 0, 255), (index * 10, 5, index * 10 + 10, 25))
+            frames.append(frame)
+        buffer = io.BytesIO()
+        frames[0].save(
+            buffer,
+            format="GIF",
+            save_all=True,
+            append_images=frames[1:],
+            duration=[100, 50, 70],
+            disposal=DISPOSAL_BACKGROUND,
+            loop=0,
+        )
+        self.data = buffer.getvalue()
+
+    def test_frames(self):
+        frames = list(read_frames(self.data))
+
+        self.assertEqual(len(frames), Image.open(io.BytesIO(self.data)).n_frames)
+        for frame in frames:
+            self.assertEqual(frame.disposal, DISPOSAL_BACKGROUND)
+            self.assertTrue(frame.transparent)
+            self.assertFalse(frame.covers((40, 30)))
+            # Graphic control extension, then the image
+            self.assertEqual(bytes(frame.blocks[0][:2]), b"!\xf9")
+            self.assertEqual(bytes(frame.blocks[-1][:1]), b",")
+
+        # The frames put back together give the same GIF
+        header = self.data[: self.data.index(bytes(frames[0].blocks[0]))]
+        blocks = b"".join(bytes(block) for frame in frames for block in frame.blocks)
+        self.assertEqual(header + blocks + b";", self.data)
+
+    def test_without_control(self):
+        buffer = io.BytesIO()
+        Image.new("P", (20, 10)).save(buffer, format="GIF")
+        (frame,) = read_frames(buffer.getvalue())
+
+        self.assertEqual(frame.disposal, DISPOSAL_UNSPECIFIED)
+        self.assertEqual(frame.region, (0, 0, 20, 10))
+        self.assertTrue(frame.covers((20, 10)))
+
+    def test_truncated(self):
+        frames = list(read_frames(self.data[: len(self.data) // 2]))
+        self.assertLess(len(frames), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
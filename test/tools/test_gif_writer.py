@@ -0,0 +1,177 @@
+import io
+import unittest
+
+import numpy
+from PIL import Image, ImageSequence
+
+from mustachizer.tools.gif_reader import read_frames
+from mustachizer.tools.gif_writer import GifWriter
+
+
+class TestGifWriter(unittest.TestCase):
+    """
+    Test `mustachizer.tools.gif_writer.GifWriter`.
+    """
+
+    def setUp(self):
+        self.colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+        self.palette = bytes(numpy.array(self.colors, dtype=numpy.uint8))
+        self.size = (40, 30)
+
+    def frame(self, square=None, color=(255, 255, 255), transparent=None):
+        """
+        Blue frame with a square of a color, optionally a transparent square.
+        """
+        frame = Image.new("RGBA", self.size, (0, 0, 255, 255))
+        if square:
+            frame.paste(color + (255,), square)
+        if transparent:
+            frame.paste((0, 0, 0, 0), transparent)
+        return frame
+
+    def encode(self, frames, **parameters):
+        output = io.BytesIO()
+        with GifWriter(output, self.size, **parameters) as writer:
+            for frame, duration in frames:
+                writer.write(frame, duration)
+        self.assertEqual(output.getvalue()[-1:], b";")
+        return writer, Image.open(io.BytesIO(output.getvalue()))
+
+    def test_round_trip(self):
+        frames = [
+            (self.frame(), 100),
+            (self.frame((10, 10, 20, 20)), 50),
+            (self.frame((10, 10, 20, 20), color=(255, 0, 0)), 70),
+        ]
+        writer, gif = self.encode(frames, palette=self.palette, loop=0)
+
+        self.assertEqual(writer.frames, 3)
+        self.assertEqual(gif.n_frames, 3)
+        self.assertEqual(gif.info["loop"], 0)
+        for decoded, (frame, duration) in zip(ImageSequence.Iterator(gif), frames):
+            self.assertEqual(decoded.info["duration"], duration)
+            numpy.testing.assert_array_equal(
+                numpy.asarray(decoded.convert("RGB")),
+                numpy.asarray(frame.convert("RGB")),
+            )
+
+    def test_delta_regions(self):
+        frames = [
+            (self.frame(), 100),
+            (self.frame((10, 10, 20, 20)), 100),
+            (self.frame((10, 10, 20, 20), color=(0, 255, 0)), 100),
+        ]
+        _, gif = self.encode(frames, palette=self.palette)
+
+        regions = [frame.tile[0][1] for frame in ImageSequence.Iterator(gif)]
+        self.assertEqual(regions, [(0, 0, 40, 30), (10, 10, 20, 20), (10, 10, 20, 20)])
+
+    def test_identical_frames_merged(self):
+        frames = [
+            (self.frame(), 100),
+            (self.frame(), 40),
+            (self.frame((0, 0, 5, 5)), 60),
+            (self.frame((0, 0, 5, 5)), 60),
+        ]
+        writer, gif = self.encode(frames, palette=self.palette)
+
+        self.assertEqual(writer.frames, 2)
+        durations = [frame.info["duration"] for frame in ImageSequence.Iterator(gif)]
+        self.assertEqual(durations, [140, 120])
+
+    def test_transparency(self):
+        frames = [
+            (self.frame(transparent=(0, 0, 10, 10)), 100),
+            (self.frame(transparent=(20, 0, 30, 10)), 100),
+        ]
+        _, gif = self.encode(frames, palette=self.palette, transparency=0)
+
+        for decoded, (frame, _) in zip(ImageSequence.Iterator(gif), frames):
+            # Cleared before the next frame, drawn in full
+            self.assertEqual(decoded.tile[0][1], (0, 0, 40, 30))
+            alpha = numpy.asarray(decoded.convert("RGBA"))[..., 3]
+            numpy.testing.assert_array_equal(
+                alpha > 0, numpy.asarray(frame)[..., 3] > 0
+            )
+
+        # Opaque pixels of the color of the transparent index are kept opaque
+        _, gif = self.encode(
+            [(self.frame((0, 0, 5, 5), (255, 0, 0)), 0)],
+            palette=self.palette,
+            transparency=0,
+        )
+        decoded = numpy.asarray(gif.convert("RGBA"))
+        self.assertEqual(decoded[..., 3].min(), 255)
+
+    def test_palette_completion(self):
+        writer, gif = self.encode(
+            [(self.frame((10, 10, 20, 20), color=(200, 100, 50)), 0)],
+            palette=self.palette[:6],
+        )
+
+        self.assertEqual(len(writer.palette), 768)
+        self.assertEqual(writer.palette[:6], self.palette[:6])
+        decoded = numpy.asarray(gif.convert("RGB"))
+        numpy.testing.assert_array_equal(decoded[15, 15], (200, 100, 50))
+        numpy.testing.assert_array_equal(decoded[0, 0], (0, 0, 255))
+
+        # Built from the first frame without palette
+        writer, _ = self.encode([(self.frame(), 0)])
+        self.assertEqual(len(writer.palette), 768)
+
+    def test_pass_through(self):
+        source = io.BytesIO()
+        frames = [self.frame((index * 5, 0, index * 5 + 5, 5)) for index in range(6)]
+        frames[0].save(
+            source,
+            format="GIF",
+            save_all=True,
+            append_images=frames[1:],
+            duration=[100, 40, 50, 60, 70, 80],
+            loop=0,
+        )
+        gif = Image.open(io.BytesIO(source.getvalue()))
+        raw_frames = list(read_frames(source.getvalue()))
+
+        output = io.BytesIO()
+        writer = GifWriter(output, self.size, palette=gif.global_palette.palette)
+        expected = []
+        for index, frame in enumerate(ImageSequence.Iterator(gif)):
+            duration = frame.info["duration"]
+            frame = frame.convert("RGBA")
+            # Frame 2 modified, frame 3 drawn on another canvas than in the
+            # source, frames 4 and 5 passed through again
+            if index == 2:
+                frame.paste((255, 255, 255, 255), (30, 20, 35, 25))
+            expected.append((numpy.asarray(frame.convert("RGB")), duration))
+            writer.write(frame, duration, None if index == 2 else raw_frames[index])
+        writer.close()
+
+        self.assertEqual(writer.frames, 6)
+        self.assertEqual(writer.passed_through, 4)
+        written = {
+            bytes(block)
+            for frame in read_frames(output.getvalue())
+            for block in frame.blocks
+        }
+        for index in (0, 1, 4, 5):
+            for block in raw_frames[index].blocks:
+                self.assertIn(bytes(block), written)
+
+        decoded = Image.open(io.BytesIO(output.getvalue()))
+        for frame, (pixels, duration) in zip(ImageSequence.Iterator(decoded), expected):
+            self.assertEqual(frame.info["duration"], duration)
+            numpy.testing.assert_array_equal(
+                numpy.asarray(frame.convert("RGB")), pixels
+            )
+
+    def test_empty(self):
+        output = io.BytesIO()
+        writer = GifWriter(output, self.size)
+        writer.close()
+        self.assertEqual(writer.frames, 0)
+        self.assertEqual(output.getvalue(), b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
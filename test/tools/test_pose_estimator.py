@@ -0,0 +1,110 @@
+import unittest
+
+import cv2
+import numpy
+from PIL import Image
+
+from mustachizer.tools.camera import Camera
+from mustachizer.tools.face_finder import FaceFinder
+from mustachizer.tools.pose_estimator import (
+    estimate_poses,
+    project_points,
+    rodrigues,
+    rotation_vectors,
+)
+
+
+class TestPoseEstimator(unittest.TestCase):
+    """
+    Test `mustachizer.tools.pose_estimator`.
+    """
+
+    def setUp(self):
+        rng = numpy.random.default_rng(0)
+        self.camera = Camera(Image.new("RGB", (1280, 720)))
+        self.object_points = FaceFinder.FACE_3D_POINTS
+
+        # Faces looking at the camera, seen with a few pixels of noise
+        count = 40
+        self.rotations = numpy.column_stack(
+            [
+                numpy.pi + rng.normal(0, 0.3, count),
+                rng.normal(0, 0.4, count),
+                rng.normal(0, 0.3, count),
+            ]
+        )
+        self.translations = numpy.column_stack(
+            [
+                rng.uniform(-800, 800, count),
+                rng.uniform(-400, 400, count),
+                rng.uniform(1500, 6000, count),
+            ]
+        )
+        self.image_points = project_points(
+            self.object_points, self.rotations, self.translations, self.camera.matrix
+        ) + rng.normal(0, 2, (count, len(self.object_points), 2))
+
+    def solve_pnp(self, camera: Camera) -> list:
+        return [
+            cv2.solvePnP(self.object_points, points, camera.matrix, camera.distortion)
+            for points in self.image_points
+        ]
+
+    def assertPosesAlmostEqual(self, rotations, translations, expected):
+        expected_rotations = numpy.array([pose[1].ravel() for pose in expected])
+        expected_translations = numpy.array([pose[2].ravel() for pose in expected])
+        numpy.testing.assert_allclose(
+            rodrigues(rotations), rodrigues(expected_rotations), atol=1e-3
+        )
+        numpy.testing.assert_allclose(translations, expected_translations, rtol=1e-4)
+
+    def test_rodrigues(self):
+        rotations = numpy.vstack(
+            [
+                self.rotations,
+                [(0, 0, 0), (1e-8, 0, 0), (numpy.pi, 0, 0), (0, -numpy.pi, 0)],
+                [numpy.array((1, 2, 2)) / 3 * numpy.pi],
+            ]
+        )
+        matrices = rodrigues(rotations)
+        for rotation, matrix in zip(rotations, matrices):
+            numpy.testing.assert_allclose(matrix, cv2.Rodrigues(rotation)[0], atol=1e-9)
+
+        # Back to vectors, up to the sign of half turns
+        numpy.testing.assert_allclose(
+            rodrigues(rotation_vectors(matrices)), matrices, atol=1e-9
+        )
+
+    def test_estimate_poses(self):
+        expected = self.solve_pnp(self.camera)
+        rotations, translations = estimate_poses(
+            self.object_points, self.image_points, self.camera, batch_min_size=1
+        )
+        self.assertEqual(rotations.shape, (40, 3))
+        self.assertEqual(translations.shape, (40, 3))
+        self.assertPosesAlmostEqual(rotations, translations, expected)
+
+        # Few faces are left to OpenCV
+        rotations, translations = estimate_poses(
+            self.object_points, self.image_points[:3], self.camera
+        )
+        self.assertPosesAlmostEqual(rotations, translations, expected[:3])
+
+        # No face
+        rotations, translations = estimate_poses(
+            self.object_points, numpy.empty((0, 6, 2)), self.camera
+        )
+        self.assertEqual(rotations.shape, (0, 3))
+        self.assertEqual(translations.shape, (0, 3))
+
+    def test_estimate_poses_distortion(self):
+        camera = Camera(Image.new("RGB", (1280, 720)), numpy.array([0.1, 0, 0, 0]))
+        expected = self.solve_pnp(camera)
+        rotations, translations = estimate_poses(
+            self.object_points, self.image_points, camera, batch_min_size=1
+        )
+        self.assertPosesAlmostEqual(rotations, translations, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+import imageio_ffmpeg
+import numpy
+
+from mustachizer.tools.video_reader import VideoReader, is_video, move_index_first
+
+
+def encode_video(frames: list, fps: int = 25, faststart: bool = False) -> bytes:
+    """
+    Encode RGB frames as an MP4, its index after its media data unless
+    `faststart`.
+    """
+    height, width, _ = frames[0].shape
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = Path(directory, "video.mp4")
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error"]
+            + ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}"]
+            + ["-r", f"{fps}", "-i", "pipe:0", "-pix_fmt", "yuv420p", "-q:v", "1"]
+            + (["-movflags", "faststart"] if faststart else [])
+            + [str(filepath)],
+            input=b"".join(frame.tobytes() for frame in frames),
+            check=True,
+        )
+        return filepath.read_bytes()
+
+
+def moving_square(count: int, size: tuple = (64, 48)) -> list:
+    """
+    Frames of a square moving on a plain background.
+    """
+    width, height = size
+    frames = []
+    for index in range(count):
+        frame = numpy.full((height, width, 3), (40, 80, 160), dtype=numpy.uint8)
+        frame[8:24, 4 * index : 4 * index + 16] = (250, 250, 250)
+        frames.append(frame)
+    return frames
+
+
+class TestVideoReader(unittest.TestCase):
+    """
+    Test `mustachizer.tools.video_reader.VideoReader`.
+    """
+
+    def setUp(self):
+        self.frames = moving_square(10)
+        self.data = encode_video(self.frames)
+
+    def test_frames(self):
+        with VideoReader(self.data, fps=25) as video:
+            self.assertEqual(video.size, (64, 48))
+            self.assertEqual(video.duration, 40)
+            frames = list(video)
+
+        self.assertEqual(video.frames, len(self.frames))
+        for decoded, source in zip(frames, self.frames):
+            self.assertEqual(decoded.shape, source.shape)
+            difference = numpy.abs(decoded.astype(int) - source).mean()
+            self.assertLess(difference, 8)
+
+        # Frames resampled to a lower rate
+        with VideoReader(self.data, fps=10) as video:
+            self.assertEqual(video.duration, 100)
+            self.assertEqual(len(list(video)), 4)
+
+    def test_index_moved_first(self):
+        # Index at the end, moved before the media data to be read from a pipe
+        self.assertIsNot(move_index_first(self.data), self.data)
+        with VideoReader(self.data) as video:
+            frames = list(video)
+
+        faststart = encode_video(self.frames, faststart=True)
+        self.assertIs(move_index_first(faststart), faststart)
+        with VideoReader(faststart) as video:
+            for decoded, expected in zip(video, frames):
+                numpy.testing.assert_array_equal(decoded, expected)
+
+    def test_incorrect_video(self):
+        with self.assertRaises(ValueError):
+            VideoReader(self.data[: len(self.data) // 2])
+        with self.assertRaises(ValueError):
+            VideoReader(b"not a video")
+
+    def test_closed_early(self):
+        video = VideoReader(self.data)
+        next(iter(video))
+        video.close()
+        self.assertIsNotNone(video._process.returncode)
+
+    def test_is_video(self):
+        self.assertTrue(is_video(self.data[:12]))
+        self.assertTrue(is_video(b"\x1a\x45\xdf\xa3\x01\x00\x00\x00"))
+        self.assertFalse(is_video(b"GIF89a\x10\x00\x10\x00"))
+        self.assertFalse(is_video(b""))
+
+
+if __name__ == "__main__":
+    unittest.main()
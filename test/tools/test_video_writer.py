@@ -0,0 +1,138 @@
+import io
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from test.tools.test_video_reader import encode_video, moving_square
+from unittest.mock import patch
+
+import imageio_ffmpeg
+import numpy
+from PIL import Image
+
+from mustachizer.tools.video_reader import VideoReader, is_video
+from mustachizer.tools.video_writer import VideoWriter
+
+
+def streams(data: bytes) -> str:
+    """
+    Description of the streams of a video, as told by ffmpeg.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = Path(directory, "video.mp4")
+        filepath.write_bytes(data)
+        process = subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-i", str(filepath)],
+            capture_output=True,
+        )
+    return process.stderr.decode()
+
+
+def video_with_sound(duration: int = 1, extension: str = "mp4") -> bytes:
+    """
+    Encode a video of a test pattern with a tone.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = Path(directory, f"video.{extension}")
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error"]
+            + ["-f", "lavfi", "-i", "testsrc=size=64x48:rate=25"]
+            + ["-f", "lavfi", "-i", "sine=frequency=440"]
+            + ["-t", f"{duration}", "-pix_fmt", "yuv420p"]
+            + [str(filepath)],
+            check=True,
+        )
+        return filepath.read_bytes()
+
+
+class TestVideoWriter(unittest.TestCase):
+    """
+    Test `mustachizer.tools.video_writer.VideoWriter`.
+    """
+
+    def test_frames(self):
+        frames = moving_square(12, size=(63, 47))
+        stream = io.BytesIO()
+        with VideoWriter(stream, (63, 47), fps=25) as writer:
+            for frame in frames:
+                writer.write(Image.fromarray(frame))
+        self.assertEqual(writer.frames, 12)
+
+        data = stream.getvalue()
+        self.assertTrue(is_video(data[:12]))
+        self.assertIn("h264", streams(data))
+        self.assertNotIn("Audio", streams(data))
+
+        # Padded to an even size
+        with VideoReader(data, fps=25) as video:
+            self.assertEqual(video.size, (64, 48))
+            decoded = list(video)
+        self.assertEqual(len(decoded), 12)
+        for frame, source in zip(decoded, frames):
+            difference = numpy.abs(frame[:47, :63].astype(int) - source).mean()
+            self.assertLess(difference, 8)
+
+    def test_audio(self):
+        source = video_with_sound()
+        stream = io.BytesIO()
+        with VideoReader(source, fps=25) as video:
+            with VideoWriter(stream, video.size, fps=25, audio=source) as writer:
+                for frame in video:
+                    writer.write(Image.fromarray(frame))
+        self.assertIn("Audio: aac", streams(stream.getvalue()))
+
+        # A source without sound
+        silent = io.BytesIO()
+        source = encode_video(moving_square(5))
+        with VideoWriter(silent, (64, 48), audio=source) as writer:
+            writer.write(Image.new("RGB", (64, 48)))
+        self.assertNotIn("Audio", streams(silent.getvalue()))
+
+        # Sound of a WebM, encoded again
+        webm = video_with_sound(extension="webm")
+        stream = io.BytesIO()
+        with VideoWriter(stream, (64, 48), audio=webm) as writer:
+            writer.write(Image.new("RGB", (64, 48)))
+        self.assertIn("Audio: aac", streams(stream.getvalue()))
+
+    def test_audio_index_last(self):
+        # Bigger than what ffmpeg reads from a pipe before needing the index
+        source = video_with_sound(duration=10)
+        self.assertGreater(source.find(b"moov"), source.find(b"mdat"))
+        stream = io.BytesIO()
+        with VideoReader(source, fps=25) as video:
+            with VideoWriter(stream, video.size, fps=25, audio=source) as writer:
+                for frame in video:
+                    writer.write(Image.fromarray(frame))
+        self.assertEqual((writer.frames, writer.written), (250, 250))
+        self.assertIn("Audio: aac", streams(stream.getvalue()))
+        with VideoReader(stream.getvalue(), fps=25) as video:
+            self.assertEqual(len(list(video)), 250)
+
+        # Index left last, the audio can't be read but the video is written whole
+        stream = io.BytesIO()
+        with patch(
+            "mustachizer.tools.video_writer.move_index_first", lambda data: data
+        ), self.assertLogs("stachlog", "WARNING"):
+            with VideoWriter(stream, (64, 48), fps=25, audio=source) as writer:
+                for _ in range(250):
+                    writer.write(Image.new("RGB", (64, 48)))
+        self.assertEqual(writer.written, 250)
+
+    def test_aborted(self):
+        stream = io.BytesIO()
+        with self.assertRaises(ValueError):
+            with VideoWriter(stream, (64, 48)) as writer:
+                writer.write(Image.new("RGB", (64, 48)))
+                raise ValueError()
+        self.assertIsNotNone(writer._process.returncode)
+
+        # Frames of the wrong size
+        with self.assertRaises(RuntimeError):
+            writer = VideoWriter(io.BytesIO(), (0, 0))
+            writer.write(Image.new("RGB", (64, 48)))
+            writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
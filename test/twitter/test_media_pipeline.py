@@ -0,0 +1,142 @@
+import threading
+import time
+import unittest
+
+from mustachizer.errors import NoFaceFoundError
+from mustachizer.twitter.media_pipeline import MediaPipeline, PipelineStage
+
+
+class SlowStage:
+    """
+    Stage sleeping on each media, counting how many run at the same time.
+    """
+
+    def __init__(self, duration: float = 0.05):
+        self.duration = duration
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, media, data):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        # Later medias finish first
+        time.sleep(self.duration / (1 + media["index"]))
+        with self._lock:
+            self.running -= 1
+        if media.get("face") is False:
+            raise NoFaceFoundError("No face found in media.")
+        return f"{data or ''}{media['name']}"
+
+
+class TestMediaPipeline(unittest.TestCase):
+    """
+    Test `mustachizer.twitter.media_pipeline.MediaPipeline`.
+    """
+
+    def setUp(self):
+        self.replies = []
+        self.errors = []
+
+    def reply(self, context, results, errors):
+        self.replies.append((context, results))
+        self.errors.append((context, [type(error) for error in errors]))
+
+    def medias(self, mention: int, count: int) -> list:
+        return [
+            {"name": f"{mention}.{index}", "index": index + mention, "type": "photo"}
+            for index in range(count)
+        ]
+
+    def test_order(self):
+        download = SlowStage()
+        convert = SlowStage()
+        stages = [
+            PipelineStage("download", download, workers=4),
+            PipelineStage(
+                "convert",
+                lambda media, data: f"{data}->gif",
+                accepts=lambda media: media["type"] == "animated_gif",
+            ),
+            PipelineStage("mustachize", convert, workers=2),
+        ]
+        with MediaPipeline(stages, self.reply, max_queued=2) as pipeline:
+            for mention in range(4):
+                pipeline.submit(mention, self.medias(mention, 3))
+            pipeline.submit(4, [{"name": "4.0", "index": 0, "type": "animated_gif"}])
+            pipeline.submit(5, [])
+
+        # Replies in the order of the mentions, results in the order of medias
+        self.assertEqual([context for context, _ in self.replies], list(range(6)))
+        self.assertEqual(self.replies[1][1], ["1.01.0", "1.11.1", "1.21.2"])
+        self.assertEqual(self.replies[4][1], ["4.0->gif4.0"])
+        self.assertEqual(self.replies[5][1], [])
+
+        # Stages run side by side, within their number of workers
+        self.assertGreater(download.max_running, 1)
+        self.assertLessEqual(download.max_running, 4)
+        self.assertLessEqual(convert.max_running, 2)
+
+    def test_errors(self):
+        def fail(media, data):
+            if media["name"] == "0.1":
+                raise ValueError("Unexpected")
+            return media["name"]
+
+        stages = [
+            PipelineStage("download", fail, workers=2),
+            PipelineStage("mustachize", SlowStage(0.01)),
+        ]
+        pipeline = MediaPipeline(
+            stages, self.reply, expected_errors=(NoFaceFoundError,)
+        )
+        pipeline.start()
+        with self.assertLogs("stachlog", "ERROR"):
+            pipeline.submit(0, self.medias(0, 3))
+            pipeline.join()
+        with self.assertLogs("stachlog", "WARNING"):
+            pipeline.start()
+            pipeline.submit(1, [{"name": "1.0", "index": 0, "face": False}])
+            pipeline.join()
+
+        # Medias failing are left out of the reply, with their errors given
+        self.assertEqual(self.replies, [(0, ["0.00.0", "0.20.2"]), (1, [])])
+        self.assertEqual(self.errors, [(0, [ValueError]), (1, [NoFaceFoundError])])
+
+    def test_reply_failing(self):
+        def reply(context, results, errors):
+            if context == 0:
+                raise RuntimeError("Reply failed")
+            self.replies.append((context, results))
+
+        stages = [PipelineStage("download", lambda media, data: media["name"])]
+        with self.assertLogs("stachlog", "ERROR"):
+            with MediaPipeline(stages, reply) as pipeline:
+                pipeline.submit(0, self.medias(0, 1))
+                pipeline.submit(1, self.medias(1, 1))
+        self.assertEqual(self.replies, [(1, ["1.0"])])
+
+    def test_depths(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def block(media, data):
+            started.set()
+            release.wait()
+
+        stages = [
+            PipelineStage("download", block),
+            PipelineStage("upload", lambda media, data: data),
+        ]
+        with MediaPipeline(stages, self.reply, max_queued=4) as pipeline:
+            pipeline.submit(0, self.medias(0, 3))
+            started.wait()
+            # A media is being downloaded, the others wait for their turn
+            self.assertEqual(pipeline.depths(), {"download": 2, "upload": 0})
+            release.set()
+        self.assertEqual(pipeline.depths(), {"download": 0, "upload": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
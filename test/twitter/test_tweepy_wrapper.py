@@ -140,9 +140,16 @@ class TestBotTwitter(unittest.TestCase):
                 medias=[{"type": "animated_gif"}, {"type": "animated_gif"}]
             )
 
-        # reply_to_status KO: video provided
-        with self.assertRaises(NotImplementedError):
-            self.tweepy_wrapper.reply_to_status(medias=[{"type": "video"}])
+        # reply_to_status OK: video
+        self.tweepy_wrapper.reply_to_status(
+            medias=[{"type": "video", "buffer": "video_buffer"}]
+        )
+
+        # reply_to_status KO: video provided multiple times
+        with self.assertRaises(MultipleUploadError):
+            self.tweepy_wrapper.reply_to_status(
+                medias=[{"type": "video"}, {"type": "video"}]
+            )
 
         # reply_to_status KO: mixed type provided
         with self.assertRaises(MixedMediasError):
@@ -155,6 +162,59 @@ class TestBotTwitter(unittest.TestCase):
         with self.assertRaises(TweetNotReachable):
             self.tweepy_wrapper.reply_to_status()
 
+    def test_upload_media(self):
+        self.tweepy_wrapper.api = Mock()
+        self.tweepy_wrapper.api.media_upload.return_value.media_id_string = "photo_id"
+        self.tweepy_wrapper.api.chunked_upload.return_value.media_id_string = "gif_id"
+
+        # upload_media OK: photo
+        media_id = self.tweepy_wrapper.upload_media(
+            {"type": "photo", "buffer": "photo_buffer"}
+        )
+        self.assertEqual(media_id, "photo_id")
+
+        # upload_media OK: gif
+        media_id = self.tweepy_wrapper.upload_media(
+            {"type": "animated_gif", "buffer": "animated_gif_buffer"}
+        )
+        self.assertEqual(media_id, "gif_id")
+
+        # upload_media OK: video
+        media_id = self.tweepy_wrapper.upload_media(
+            {"type": "video", "buffer": "video_buffer"}
+        )
+        self.assertEqual(media_id, "gif_id")
+        self.tweepy_wrapper.api.chunked_upload.assert_called_with(
+            filename="",
+            file="video_buffer",
+            file_type="video/mp4",
+            media_category="tweet_video",
+            wait_for_async_finalize=True,
+        )
+
+        # upload_media KO: bad type provided
+        with self.assertRaises(MediaTypeError):
+            self.tweepy_wrapper.upload_media({"type": "badtype", "buffer": ""})
+
+    def test_post_reply(self):
+        self.tweepy_wrapper.api = Mock()
+
+        # post_reply OK
+        self.tweepy_wrapper.post_reply(
+            media_ids=["media_id"], msg="message", status_id="status_id"
+        )
+        self.tweepy_wrapper.api.update_status.assert_called_with(
+            status="message",
+            media_ids=["media_id"],
+            in_reply_to_status_id="status_id",
+            auto_populate_reply_metadata=True,
+        )
+
+        # post_reply KO: Forbidden
+        self.tweepy_wrapper.api.update_status.side_effect = Forbidden(TWEEPY_RESPONSE)
+        with self.assertRaises(TweetNotReachable):
+            self.tweepy_wrapper.post_reply()
+
     def test_properties(self):
         self.tweepy_wrapper.info = {
             "name": "tweepy_name",
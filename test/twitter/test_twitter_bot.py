@@ -1,16 +1,25 @@
 import datetime
 import logging
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 from dateutil.tz import tzutc
 
+from mustachizer.cache import ResultCache
 from mustachizer.errors import ImageIncorrectError, NoFaceFoundError
 from mustachizer.logging import ConfigureLogger
 from mustachizer.mustache_applicator import MustacheApplicator
-from mustachizer.twitter.errors import TwitterConnectionError, TwitterTokenError
+from mustachizer.twitter.errors import (
+    MediaUploadError,
+    MultipleUploadError,
+    TweetNotReachable,
+    TwitterConnectionError,
+    TwitterTokenError,
+)
 from mustachizer.twitter.tweepy_wrapper import TweepyWrapper
 from mustachizer.twitter.twitter_bot import BotTwitter
 from mustachizer.utilities.sentence_provider import SentenceProvider
@@ -74,6 +83,22 @@ class TestBotTwitter(unittest.TestCase):
         ), self.assertRaises(SystemExit):
             BotTwitter()
 
+        # Wrapper given, the credentials file is not needed
+        tweepy_wrapper = Mock()
+        with patch.object(TweepyWrapper, "__init__", patched_TweepyWrapper):
+            bot = BotTwitter(tweepy_wrapper=tweepy_wrapper)
+        self.assertIs(bot.tweepy_wrapper, tweepy_wrapper)
+
+        # Faces of animations are detected on every frame unless tracked, and
+        # at full resolution unless downscaled
+        self.assertIsNone(self.twitter_bot.mustachizer.face_tracker)
+        self.assertIsNone(self.twitter_bot.mustachizer.face_finder.detection_width)
+        bot = BotTwitter(
+            tracking=True, detection_width=1024, tweepy_wrapper=tweepy_wrapper
+        )
+        self.assertIsNotNone(bot.mustachizer.face_tracker)
+        self.assertEqual(bot.mustachizer.face_finder.detection_width, 1024)
+
     def test_run(self):
         """
         Test run method.
@@ -94,19 +119,22 @@ class TestBotTwitter(unittest.TestCase):
             )
             self.twitter_bot.run()
 
-    @patch.object(BotTwitter, "mustachize_medias")
+    @patch.object(BotTwitter, "mustachize_media")
+    @patch.object(BotTwitter, "download_media")
     @patch.object(BotTwitter, "get_tweet_containing_medias")
     def test_process_mentions(
-        self, patch_get_tweet_containing_medias, patch_mustachize_medias
+        self, patch_get_tweet_containing_medias, patch_download, patch_mustachize
     ):
         mentions = [
             {"created_at": "Sat Dec 25 16:14:02 +0000 2100", "id_str": "This is id"}
         ]
+        post_reply = self.twitter_bot.tweepy_wrapper.post_reply
 
         # No media to mustachize
         patch_get_tweet_containing_medias.return_value = {}
         with self.assertLogs("stachlog", "INFO"):
             self.twitter_bot.process_mentions(mentions=mentions)
+        post_reply.assert_not_called()
 
         # Last datetime has been updated
         self.assertEqual(
@@ -115,22 +143,100 @@ class TestBotTwitter(unittest.TestCase):
         )
 
         # Tweet containing medias
+        medias = []
+        for index in range(3):
+            media = dict(self.media_template, type="photo")
+            media["media_url_https"] = f"photo/url/{index}"
+            medias.append(media)
         patch_get_tweet_containing_medias.return_value = {
-            "extended_entities": {"media": {}}
+            "extended_entities": {"media": medias}
         }
+        patch_download.side_effect = lambda url: url.encode()
+        patch_mustachize.side_effect = lambda data: BytesIO(data)
+        self.twitter_bot.tweepy_wrapper.upload_media.side_effect = lambda media: (
+            media["buffer"].getvalue().decode().replace("url", "id")
+        )
 
-        # No media mustachized
-        patch_mustachize_medias.return_value = []
+        # Medias mustachized, in the order of the tweet
         self.twitter_bot.process_mentions(mentions=mentions)
+        post_reply.assert_called_once()
+        self.assertEqual(
+            post_reply.call_args.kwargs["media_ids"],
+            ["photo/id/0", "photo/id/1", "photo/id/2"],
+        )
+        self.assertEqual(post_reply.call_args.kwargs["status_id"], "This is id")
 
-        # Medias mustachized
-        patch_mustachize_medias.return_value = [{"mustachized_media": "something"}]
-        self.twitter_bot.process_mentions(mentions=mentions)
+        # No media mustachized
+        patch_mustachize.side_effect = NoFaceFoundError()
+        with self.assertLogs("stachlog", "WARNING"):
+            self.twitter_bot.process_mentions(mentions=mentions)
+        post_reply.assert_called_with(
+            media_ids=[],
+            msg="No face found. Can't mustachize :(",
+            status_id="This is id",
+        )
+
+        # No media uploaded, not because of faces
+        post_reply.reset_mock()
+        patch_mustachize.side_effect = lambda data: BytesIO(data)
+        upload_media = self.twitter_bot.tweepy_wrapper.upload_media
+        upload_media.side_effect = MediaUploadError()
+        with self.assertLogs("stachlog", "ERROR") as logs:
+            self.twitter_bot.process_mentions(mentions=mentions)
+        post_reply.assert_not_called()
+        self.assertIn("This is id not replied to", logs.output[-1])
+        upload_media.side_effect = None
+        patch_mustachize.side_effect = NoFaceFoundError()
 
-        # Mustachization of media not implemented
-        patch_mustachize_medias.side_effect = NotImplementedError
+        # Reply failed
+        post_reply.side_effect = TweetNotReachable()
         with self.assertLogs("stachlog", "ERROR"):
             self.twitter_bot.process_mentions(mentions=mentions)
+        post_reply.side_effect = None
+
+        # Medias can't be posted together
+        post_reply.reset_mock()
+        check_medias = self.twitter_bot.tweepy_wrapper.check_medias
+        check_medias.side_effect = MultipleUploadError()
+        with self.assertLogs("stachlog", "ERROR"):
+            self.twitter_bot.process_mentions(mentions=mentions)
+        post_reply.assert_not_called()
+
+    def test_process_mentions_order(self):
+        # Medias of the first mentions take longer to upload
+        mentions = [
+            {
+                "created_at": "Sat Dec 25 16:14:02 +0000 2100",
+                "id_str": f"{index}",
+                "entities": {"media": {}},
+                "extended_entities": {
+                    "media": [{"type": "photo", "media_url_https": f"{index}"}]
+                },
+            }
+            for index in range(6)
+        ]
+
+        def upload_media(media):
+            index = int(media["buffer"].getvalue())
+            time.sleep(0.01 * (6 - index))
+            return f"{index}"
+
+        self.twitter_bot.upload_workers = 3
+        self.twitter_bot.tweepy_wrapper.upload_media.side_effect = upload_media
+        with patch.object(
+            BotTwitter, "download_media", side_effect=lambda url: url.encode()
+        ), patch.object(
+            BotTwitter, "mustachize_media", side_effect=lambda data: BytesIO(data)
+        ):
+            self.twitter_bot.process_mentions(mentions=mentions)
+
+        calls = self.twitter_bot.tweepy_wrapper.post_reply.call_args_list
+        self.assertEqual(
+            [call.kwargs["status_id"] for call in calls], [f"{i}" for i in range(6)]
+        )
+        self.assertEqual(
+            [call.kwargs["media_ids"] for call in calls], [[f"{i}"] for i in range(6)]
+        )
 
     def test_get_tweet_containing_medias(self):
         # Tweet is a reply to a status
@@ -170,77 +276,100 @@ class TestBotTwitter(unittest.TestCase):
         )
         self.assertEqual(return_tweet, self.tweet_template)
 
-    @patch("mustachizer.twitter.twitter_bot.open")
     @patch("mustachizer.twitter.twitter_bot.urlopen")
-    def test_download_media_from_url(self, patch_urlopen, patch_open):
-        patch_urlopen.return_value = IMG_STREAM
-
-        # Download photo
-        file = self.twitter_bot.download_media_from_url(url="url", media_type="photo")
-        self.assertEqual(file, IMG_STREAM.read())
+    def test_download_media(self, patch_urlopen):
+        patch_urlopen.return_value.read.return_value = b"media"
+        file = self.twitter_bot.download_media(url="url")
+        patch_urlopen.assert_called_with("url")
+        self.assertEqual(file, b"media")
+
+    @patch.object(BotTwitter, "mustachize_media")
+    @patch.object(BotTwitter, "download_media")
+    def test_create_pipeline(self, patch_download_media, patch_mustachize_media):
+        # Mock stream media downloaded
+        patch_download_media.return_value = IMG_STREAM.read()
+        patch_mustachize_media.return_value = BytesIO(b"mustachized")
+        upload_media = self.twitter_bot.tweepy_wrapper.upload_media
+        upload_media.side_effect = lambda media: f"{media['type']}_id"
 
-        tmp_folder_test = Path("this/is/tmp/folder")
-        # Download animated gif OK
-        with patch(
-            "mustachizer.twitter.twitter_bot.VideoFileClip"
-        ) as patch_VideoFileClip:
-            file = self.twitter_bot.download_media_from_url(
-                url="url",
-                media_type="animated_gif",
-                tmp_folder=tmp_folder_test,
+        replies = []
+        with patch.object(
+            BotTwitter, "reply", side_effect=lambda *reply: replies.append(reply)
+        ):
+            # Medias are downloaded from their url and uploaded with their type
+            with self.twitter_bot.create_pipeline() as pipeline:
+                for media_type in ["video", "animated_gif", "photo"]:
+                    media = dict(self.media_template, type=media_type)
+                    pipeline.submit(media_type, [media])
+            self.assertEqual(
+                [call.args[0] for call in patch_download_media.call_args_list],
+                ["animated_gif/url", "animated_gif/url", "photo/url"],
             )
-            patch_VideoFileClip.assert_called_with(
-                filename="this/is/tmp/folder/video_to_gif",
-                audio=False,
+            self.assertEqual(
+                replies,
+                [
+                    ("video", ["video_id"], []),
+                    ("animated_gif", ["animated_gif_id"], []),
+                    ("photo", ["photo_id"], []),
+                ],
             )
 
-        # Download animated gif KO: wrong temporary files folder
-        file = self.twitter_bot.download_media_from_url(
-            url="url",
-            media_type="animated_gif",
-            tmp_folder=tmp_folder_test,
-        )
-        self.assertIsInstance(file, BytesIO)
-
-    @patch.object(BotTwitter, "download_media_from_url")
-    def test_mustachize_medias(self, patch_download_media_from_url):
-        # Mock stream media downloaded
-        patch_download_media_from_url.return_value = IMG_STREAM.read()
-
-        # Media is video
-        with self.assertRaises(NotImplementedError):
-            self.media_template["type"] = "video"
-            self.twitter_bot.mustachize_medias(medias=[self.media_template])
-
-        # Mock MustacheApplicator for next tests
-        self.twitter_bot.mustachizer = Mock()
-
-        # Media is animated_gif
-        self.media_template["type"] = "animated_gif"
-        medias = self.twitter_bot.mustachize_medias(medias=[self.media_template])
-        patch_download_media_from_url.assert_called_with(
-            url="animated_gif/url",
-            media_type="animated_gif",
-        )
-        self.assertIsInstance(medias, list)
-
-        # Media is photo
+            # Medias not mustachized are left out of the reply, with their error
+            for error in [NoFaceFoundError(), ImageIncorrectError()]:
+                replies.clear()
+                patch_mustachize_media.side_effect = error
+                with self.assertLogs("stachlog", "WARNING"):
+                    with self.twitter_bot.create_pipeline() as pipeline:
+                        pipeline.submit("photo", [self.media_template])
+                self.assertEqual(replies, [("photo", [], [error])])
+
+    def test_media_url(self):
+        # Photo
         self.media_template["type"] = "photo"
-        self.twitter_bot.mustachize_medias(medias=[self.media_template])
-        patch_download_media_from_url.assert_called_with(
-            url="photo/url",
-            media_type="photo",
-        )
+        self.assertEqual(self.twitter_bot.media_url(self.media_template), "photo/url")
+
+        # Video, the MP4 of the highest bitrate
+        self.media_template["type"] = "video"
+        self.media_template["video_info"]["variants"] = [
+            {"content_type": "video/mp4", "bitrate": 256000, "url": "low/url"},
+            {"content_type": "application/x-mpegURL", "url": "playlist/url"},
+            {"content_type": "video/mp4", "bitrate": 832000, "url": "high/url"},
+        ]
+        self.assertEqual(self.twitter_bot.media_url(self.media_template), "high/url")
 
-        # NoFaceFoundError
-        self.twitter_bot.mustachizer.mustachize.side_effect = NoFaceFoundError()
-        with self.assertLogs("stachlog", "WARNING"):
-            self.twitter_bot.mustachize_medias(medias=[self.media_template])
+    def test_mustachized_type(self):
+        self.media_template["type"] = "animated_gif"
+        for data, expected in [
+            (b"GIF89a\x10\x00\x10\x00\x00\x00\x00", "animated_gif"),
+            (b"\x00\x00\x00\x1cftypiso5\x00\x00", "video"),
+        ]:
+            self.assertEqual(
+                self.twitter_bot.mustachized_type(self.media_template, BytesIO(data)),
+                expected,
+            )
 
-        # ImageIncorrectError
-        self.twitter_bot.mustachizer.mustachize.side_effect = ImageIncorrectError()
-        with self.assertLogs("stachlog", "WARNING"):
-            self.twitter_bot.mustachize_medias(medias=[self.media_template])
+    @patch("mustachizer.twitter.twitter_bot._mustachize_data_in_worker")
+    def test_mustachize_media(self, patch_mustachize_data_in_worker):
+        # In the current process
+        self.twitter_bot.mustachizer = Mock()
+        self.twitter_bot.mustachize_media(b"media")
+        self.twitter_bot.mustachizer.mustachize.assert_called_once()
+
+        # On the pool, cached in the current process
+        self.twitter_bot.mustachizer.cache = ResultCache()
+        self.twitter_bot._executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.twitter_bot.close)
+        patch_mustachize_data_in_worker.side_effect = lambda data, *_: data[::-1]
+        for _ in range(2):
+            media = self.twitter_bot.mustachize_media(b"media")
+            self.assertEqual(media.getvalue(), b"aidem")
+        self.assertEqual(patch_mustachize_data_in_worker.call_count, 1)
+
+        patch_mustachize_data_in_worker.side_effect = NoFaceFoundError()
+        for _ in range(2):
+            with self.assertRaises(NoFaceFoundError):
+                self.twitter_bot.mustachize_media(b"no face")
+        self.assertEqual(patch_mustachize_data_in_worker.call_count, 2)
 
     def test_get_tweet_object(self):
         tweet_object = self.twitter_bot.get_tweet_object(id="id")